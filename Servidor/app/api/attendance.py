@@ -7,10 +7,13 @@ from typing import List, Optional
 from app.core.schemas import BaseResponse, AttendanceVerifyRequest, BatchAttendanceRequest
 from app.services.attendance_service import AttendanceService
 from app.core.logger import logger
+from app.core.exceptions import FaceNotDetectedException
 from app.core.config import get_settings
 import httpx
 import asyncio
-from app.db.supabase_client import get_supabase
+from app.db.supabase_client import get_async_supabase
+from app.db.crud import get_attendance_crud
+from app.db.attendance_roster import get_attendance_rosters
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 attendance_service = AttendanceService()
 
@@ -102,6 +105,56 @@ async def verify_attendance(
         )
 
 
+@router.post(
+    "/verify-with-emotion",
+    response_model=BaseResponse,
+    summary="Verify attendance and analyze emotion",
+    description="Mark attendance and record an emotion event from a single frame (one face detection)"
+)
+async def verify_attendance_with_emotion(
+    class_id: str = Form(...),
+    image: UploadFile = File(...)
+):
+    """
+    Verify student attendance and record their emotion in one request
+    
+    - **class_id**: Unique identifier for the class session
+    - **image**: Image file containing student's face
+    """
+    try:
+        import base64
+        image_bytes = await image.read()
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        
+        result = await attendance_service.verify_attendance_with_emotion(
+            image_base64=image_base64,
+            class_id=class_id
+        )
+        
+        if not result["success"]:
+            return BaseResponse(
+                success=False,
+                message=result["message"],
+                data=result
+            )
+        
+        # Llamar Edge Function para enviar notificación (sin esperar)
+        asyncio.create_task(enviar_notificacion_asistencia())
+        
+        return BaseResponse(
+            success=True,
+            message="Attendance verified and emotion recorded" if result.get("emotion_saved") else "Attendance verified successfully",
+            data=result
+        )
+    
+    except Exception as e:
+        logger.error(f"Attendance + emotion verification error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Verification failed: {str(e)}"
+        )
+
+
 @router.post(
     "/batch-verify",
     response_model=BaseResponse,
@@ -150,6 +203,64 @@ async def batch_verify_attendance(request: BatchAttendanceRequest):
         )
 
 
+@router.post(
+    "/group-verify",
+    response_model=BaseResponse,
+    summary="Verify attendance from a group photo",
+    description="Recognize every face in one classroom photo and mark attendance for all of them"
+)
+async def group_verify_attendance(
+    class_id: str = Form(...),
+    image: UploadFile = File(...)
+):
+    """
+    Group-photo attendance: one wide classroom image instead of one per student
+    
+    - **class_id**: Unique identifier for the class session
+    - **image**: Image file containing the students' faces
+    """
+    settings = get_settings()
+    if not settings.ENABLE_MULTI_FACE_DETECTION:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Multi-face detection is disabled"
+        )
+    
+    try:
+        import base64
+        image_bytes = await image.read()
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        
+        result = await attendance_service.verify_group_photo(
+            image_base64=image_base64,
+            class_id=class_id
+        )
+        
+        if any(not s["already_registered"] for s in result["students_identified"]):
+            # Llamar Edge Function para enviar notificación (sin esperar)
+            asyncio.create_task(enviar_notificacion_asistencia())
+        
+        return BaseResponse(
+            success=True,
+            message=f"Identified {len(result['students_identified'])} of {result['faces_detected']} faces",
+            data=result
+        )
+    
+    except FaceNotDetectedException as e:
+        logger.warning(f"Group photo: {str(e)}")
+        return BaseResponse(
+            success=False,
+            message=str(e),
+            data={"class_id": class_id, "faces_detected": 0}
+        )
+    except Exception as e:
+        logger.error(f"Group photo verification error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Verification failed: {str(e)}"
+        )
+
+
 @router.get(
     "/class/{class_id}",
     response_model=BaseResponse,
@@ -163,12 +274,12 @@ async def get_class_attendance(class_id: str):
     - **class_id**: The class session identifier
     """
     try:
-        from app.db.supabase_client import get_supabase
+        from app.db.supabase_client import get_async_supabase
         
-        client = get_supabase()
+        client = get_async_supabase()
         
         # Get attendance records with student info (using select with foreign key)
-        response = client.table("attendance")\
+        response = await client.table("attendance")\
             .select("*, students(student_id, name, email)")\
             .eq("class_id", class_id)\
             .order("timestamp", desc=True)\
@@ -201,6 +312,36 @@ async def get_class_attendance(class_id: str):
         )
 
 
+@router.get(
+    "/class/{class_id}/roster",
+    response_model=BaseResponse,
+    summary="Get live class roster",
+    description="Enrolled students who have not marked attendance yet, served from the in-memory roster"
+)
+async def get_class_roster(class_id: str):
+    """
+    Who's missing in a class: enrolled, marked and missing students
+    
+    - **class_id**: Class id as stored in the attendance records
+    """
+    try:
+        roster = await get_attendance_rosters().get(class_id)
+        summary = roster.summary()
+        
+        return BaseResponse(
+            success=True,
+            message=f"{summary['missing_count']} of {summary['enrolled']} enrolled students missing",
+            data=summary
+        )
+    
+    except Exception as e:
+        logger.error(f"Error retrieving class roster: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.get(
     "/report/{class_id}",
     response_model=BaseResponse,
@@ -249,10 +390,10 @@ async def get_student_attendance_history(
     - **offset**: Pagination offset
     """
     try:
-        from app.db.supabase_client import get_supabase
+        from app.db.supabase_client import get_async_supabase
         
-        client = get_supabase()
-        response = client.table("attendance")\
+        client = get_async_supabase()
+        response = await client.table("attendance")\
             .select("*")\
             .eq("student_id", student_id)\
             .order("timestamp", desc=True)\
@@ -291,10 +432,10 @@ async def delete_attendance_record(record_id: int):
     - **record_id**: The ID of the attendance record to delete
     """
     try:
-        from app.db.supabase_client import get_supabase
+        from app.db.supabase_client import get_async_supabase
         
-        client = get_supabase()
-        response = client.table("attendance").delete().eq("id", record_id).execute()
+        client = get_async_supabase()
+        response = await client.table("attendance").delete().eq("id", record_id).execute()
         
         if not response.data:
             raise HTTPException(
@@ -302,6 +443,8 @@ async def delete_attendance_record(record_id: int):
                 detail=f"Attendance record {record_id} not found"
             )
         
+        get_attendance_rosters().discard(response.data[0])
+        
         return BaseResponse(
             success=True,
             message="Attendance record deleted",
@@ -343,9 +486,7 @@ async def register_manual_attendance(request: ManualAttendanceRequest):
     - **period**: Class period/hour number (1, 2, 3, etc.)
     """
     try:
-        from datetime import datetime
-        
-        client = get_supabase()
+        client = get_async_supabase()
         
         # Validate status
         valid_statuses = ['present', 'late', 'absent']
@@ -356,7 +497,7 @@ async def register_manual_attendance(request: ManualAttendanceRequest):
             )
         
         # Verify student exists
-        student_response = client.table("students")\
+        student_response = await client.table("students")\
             .select("student_id, name")\
             .eq("student_id", request.student_id)\
             .execute()
@@ -369,67 +510,40 @@ async def register_manual_attendance(request: ManualAttendanceRequest):
         
         student_name = student_response.data[0]['name']
         
-        # Check if attendance already exists for this student and class
-        existing = client.table("attendance")\
-            .select("id")\
-            .eq("class_id", request.class_id)\
-            .eq("student_id", request.student_id)\
-            .execute()
-        
-        now = datetime.now().isoformat()
+        # Insert or update in one atomic upsert keyed on (student_id, class_id, period)
+        attendance_record = await get_attendance_crud().mark_attendance(
+            student_id=request.student_id,
+            class_id=request.class_id,
+            status=request.status,
+            confidence=1.0,
+            period=request.period,
+            verification_method="manual",
+            overwrite=True
+        )
         
-        if existing.data:
-            # Update existing record - only update status field which we know exists
-            update_data = {"status": request.status}
-            
-            update_response = client.table("attendance")\
-                .update(update_data)\
-                .eq("id", existing.data[0]['id'])\
-                .execute()
-            
+        if attendance_record["already_registered"]:
             logger.info(f"Updated manual attendance: {request.student_id} -> {request.status}")
-            
-            return BaseResponse(
-                success=True,
-                message=f"Attendance updated for {student_name}",
-                data={
-                    "student_id": request.student_id,
-                    "student_name": student_name,
-                    "status": request.status,
-                    "period": request.period,
-                    "action": "updated"
-                }
-            )
+            action = "updated"
+            message = f"Attendance updated for {student_name}"
         else:
-            # Insert new record with only basic fields that we know exist
-            insert_data = {
-                "class_id": request.class_id,
-                "student_id": request.student_id,
-                "status": request.status,
-                "timestamp": now,
-                "confidence": 1.0
-            }
-            
-            insert_response = client.table("attendance")\
-                .insert(insert_data)\
-                .execute()
-            
             logger.info(f"Registered manual attendance: {request.student_id} -> {request.status}")
+            action = "created"
+            message = f"Attendance registered for {student_name}"
             
             # Trigger notification (async, non-blocking)
             asyncio.create_task(enviar_notificacion_asistencia())
-            
-            return BaseResponse(
-                success=True,
-                message=f"Attendance registered for {student_name}",
-                data={
-                    "student_id": request.student_id,
-                    "student_name": student_name,
-                    "status": request.status,
-                    "period": request.period,
-                    "action": "created"
-                }
-            )
+        
+        return BaseResponse(
+            success=True,
+            message=message,
+            data={
+                "student_id": request.student_id,
+                "student_name": student_name,
+                "status": request.status,
+                "period": request.period,
+                "action": action
+            }
+        )
     
     except HTTPException:
         raise
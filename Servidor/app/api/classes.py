@@ -7,7 +7,11 @@ from typing import Optional, List
 from datetime import datetime
 import pytz
 from app.core.schemas import BaseResponse
-from app.db.supabase_client import get_supabase
+from app.db.supabase_client import get_async_supabase
+from app.db.session_index import get_active_session_index, fetch_active_sessions
+from app.db.crud import invalidate_class_session
+from app.db.attendance_roster import get_attendance_rosters
+from app.core.config import settings
 from app.core.logger import logger
 from pydantic import BaseModel, Field
 
@@ -115,6 +119,11 @@ class ClassUpdateRequest(BaseModel):
     metadata: Optional[dict] = None
 
 
+class ClassBulkDeleteRequest(BaseModel):
+    """Request schema for deleting several class sessions"""
+    class_ids: List[str] = Field(..., min_length=1, max_length=1000, description="Class identifiers to delete")
+
+
 class ClassResponse(BaseModel):
     """Response schema for class session"""
     id: int
@@ -156,7 +165,7 @@ async def create_class_simple(request: ClassCreateSimpleRequest):
         from datetime import datetime
         import uuid
         
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Generate unique class_id
         class_id = f"CLASS-{uuid.uuid4().hex[:8].upper()}"
@@ -224,7 +233,7 @@ async def create_class_simple(request: ClassCreateSimpleRequest):
             "metadata": metadata_dict if metadata_dict else None
         }
         
-        result = supabase.table("class_sessions").insert(class_data).execute()
+        result = await supabase.table("class_sessions").insert(class_data).execute()
         
         if not result.data:
             raise HTTPException(
@@ -232,6 +241,8 @@ async def create_class_simple(request: ClassCreateSimpleRequest):
                 detail="Failed to create class session"
             )
         
+        get_active_session_index().invalidate()
+        invalidate_class_session(class_id)
         logger.info(f"Class session created: {class_id}")
         
         return {
@@ -278,10 +289,10 @@ async def create_class(request: ClassCreateRequest):
     - **metadata**: Additional information as JSON object (optional)
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Check if class_id already exists
-        existing = supabase.table("class_sessions").select("class_id").eq("class_id", request.class_id).execute()
+        existing = await supabase.table("class_sessions").select("class_id").eq("class_id", request.class_id).execute()
         
         if existing.data:
             raise HTTPException(
@@ -340,7 +351,7 @@ async def create_class(request: ClassCreateRequest):
             "metadata": metadata if metadata else None
         }
         
-        result = supabase.table("class_sessions").insert(class_data).execute()
+        result = await supabase.table("class_sessions").insert(class_data).execute()
         
         if not result.data:
             raise HTTPException(
@@ -348,6 +359,8 @@ async def create_class(request: ClassCreateRequest):
                 detail="Failed to create class session"
             )
         
+        get_active_session_index().invalidate()
+        invalidate_class_session(request.class_id)
         logger.info(f"Class session created: {request.class_id}")
         
         return BaseResponse(
@@ -377,51 +390,13 @@ async def get_active_classes():
     Get all active class sessions (sessions where current time is between start_time and end_time)
     """
     try:
-        supabase = get_supabase()
-        
-        # Obtener todas las clases
-        result = supabase.table("class_sessions")\
-            .select("*")\
-            .order("start_time", desc=True)\
-            .execute()
-        
-        # Filtrar clases activas basándose en la hora actual de Ecuador
         now_ecuador = get_ecuador_time()
-        active_classes = []
         
-        for class_session in result.data:
-            try:
-                start_time = parse_datetime(class_session['start_time'])
-                end_time = parse_datetime(class_session['end_time']) if class_session.get('end_time') else None
-                
-                if start_time is None:
-                    continue
-                
-                # Convertir a hora de Ecuador
-                start_time_ecuador = to_ecuador_time(start_time)
-                
-                # Extraer course_id y teacher_id del metadata si existen
-                metadata = class_session.get('metadata', {}) or {}
-                if isinstance(metadata, dict):
-                    if 'course_id' in metadata:
-                        class_session['course_id'] = metadata['course_id']
-                    if 'teacher_id' in metadata:
-                        class_session['teacher_id'] = metadata['teacher_id']
-                
-                # Una clase está activa si:
-                # 1. Ya comenzó (start_time <= now)
-                # 2. No tiene end_time (indefinida) O aún no ha terminado (now < end_time)
-                if end_time:
-                    end_time_ecuador = to_ecuador_time(end_time)
-                    if start_time_ecuador <= now_ecuador < end_time_ecuador:
-                        active_classes.append(class_session)
-                else:
-                    # Sin end_time = clase activa indefinidamente hasta que se finalice
-                    if start_time_ecuador <= now_ecuador:
-                        active_classes.append(class_session)
-            except Exception:
-                # Skip invalid sessions
-                continue
+        # Índice en memoria de las sesiones de hoy; con 0 segundos se filtra en SQL
+        if settings.ACTIVE_CLASS_INDEX_SECONDS > 0:
+            active_classes = await get_active_session_index().get_active(now_ecuador)
+        else:
+            active_classes = await fetch_active_sessions(get_async_supabase(), now_ecuador)
         
         return BaseResponse(
             success=True,
@@ -454,11 +429,10 @@ async def end_class(class_id: str):
     - **class_id**: The unique identifier of the class to end
     """
     try:
-        from datetime import datetime
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Check if class exists
-        existing = supabase.table("class_sessions").select("*").eq("class_id", class_id).execute()
+        existing = await supabase.table("class_sessions").select("*").eq("class_id", class_id).execute()
         
         if not existing.data:
             raise HTTPException(
@@ -468,17 +442,19 @@ async def end_class(class_id: str):
         
         class_data = existing.data[0]
         
-        # Obtener hora actual (local)
-        now = datetime.now()
-        now_str = now.strftime("%Y-%m-%dT%H:%M:%S")
+        # Hora actual en Ecuador, con offset como en create_class (el servidor corre en UTC)
+        now = get_ecuador_time()
+        now_str = now.isoformat()
         
         # Verificar si la clase ya terminó según su end_time original
         original_end_time_str = class_data.get('end_time')
         if original_end_time_str:
             try:
                 original_end_time = datetime.fromisoformat(original_end_time_str.replace('Z', '+00:00'))
-                # Comparar sin zona horaria
-                if original_end_time.replace(tzinfo=None) <= now:
+                # Sin zona horaria es hora de Ecuador
+                if original_end_time.tzinfo is None:
+                    original_end_time = ECUADOR_TZ.localize(original_end_time)
+                if original_end_time <= now:
                     return BaseResponse(
                         success=True,
                         message=f"Class session '{class_id}' was already ended",
@@ -488,11 +464,14 @@ async def end_class(class_id: str):
                 pass  # Si hay error parseando, continuar para actualizar
         
         # Actualizar end_time a la hora actual
-        result = supabase.table("class_sessions")\
+        result = await supabase.table("class_sessions")\
             .update({"end_time": now_str})\
             .eq("class_id", class_id)\
             .execute()
         
+        get_active_session_index().invalidate()
+        invalidate_class_session(class_id)
+        get_attendance_rosters().invalidate(class_id)
         logger.info(f"Class session manually ended at {now_str}: {class_id}")
         
         return BaseResponse(
@@ -528,9 +507,9 @@ async def get_class(class_id: str):
     - **class_id**: The unique identifier of the class
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
-        result = supabase.table("class_sessions").select("*").eq("class_id", class_id).execute()
+        result = await supabase.table("class_sessions").select("*").eq("class_id", class_id).execute()
         
         if not result.data:
             raise HTTPException(
@@ -575,7 +554,7 @@ async def list_classes(
     - **status_filter**: Filter by status - "active" or "finished" (optional)
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         query = supabase.table("class_sessions").select("*")
         
@@ -584,7 +563,7 @@ async def list_classes(
         
         query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
         
-        result = query.execute()
+        result = await query.execute()
         
         # Clasificar clases por estado basándose en la hora actual de Ecuador
         now_ecuador = get_ecuador_time()
@@ -685,10 +664,10 @@ async def update_class(class_id: str, request: ClassUpdateRequest):
     - Only provided fields will be updated
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Check if class exists
-        existing = supabase.table("class_sessions").select("id").eq("class_id", class_id).execute()
+        existing = await supabase.table("class_sessions").select("id").eq("class_id", class_id).execute()
         
         if not existing.data:
             raise HTTPException(
@@ -717,8 +696,11 @@ async def update_class(class_id: str, request: ClassUpdateRequest):
                 detail="No fields provided for update"
             )
         
-        result = supabase.table("class_sessions").update(update_data).eq("class_id", class_id).execute()
+        result = await supabase.table("class_sessions").update(update_data).eq("class_id", class_id).execute()
         
+        get_active_session_index().invalidate()
+        invalidate_class_session(class_id)
+        get_attendance_rosters().invalidate(class_id)
         logger.info(f"Class session updated: {class_id}")
         
         return BaseResponse(
@@ -751,31 +733,27 @@ async def delete_class(class_id: str):
     - ⚠️ WARNING: This will also delete all attendance and emotion records for this class
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
-        # Check if class exists
-        existing = supabase.table("class_sessions").select("id").eq("class_id", class_id).execute()
+        # Hijos y sesión se borran en una sola transacción (migración 011)
+        result = await supabase.rpc("delete_class_cascade", {"p_class_id": class_id}).execute()
+        counts = result.data[0] if result.data else {}
         
-        if not existing.data:
+        if not counts.get("classes_deleted"):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Class with ID '{class_id}' not found"
             )
         
-        # Delete related records first (if you want cascade delete)
-        # Note: If you have ON DELETE CASCADE in DB, this is automatic
-        supabase.table("attendance").delete().eq("class_id", class_id).execute()
-        supabase.table("emotion_events").delete().eq("class_id", class_id).execute()
-        
-        # Delete class session
-        result = supabase.table("class_sessions").delete().eq("class_id", class_id).execute()
-        
+        get_active_session_index().invalidate()
+        invalidate_class_session(class_id)
+        get_attendance_rosters().invalidate(class_id)
         logger.info(f"Class session deleted: {class_id}")
         
         return BaseResponse(
             success=True,
             message=f"Class session '{class_id}' deleted successfully",
-            data={"class_id": class_id, "deleted": True}
+            data={"class_id": class_id, "deleted": True, **counts}
         )
         
     except HTTPException:
@@ -788,6 +766,46 @@ async def delete_class(class_id: str):
         )
 
 
+@router.post(
+    "/bulk-delete",
+    response_model=BaseResponse,
+    summary="Delete several class sessions",
+    description="Delete a list of class sessions and all related records in one transaction"
+)
+async def bulk_delete_classes(request: ClassBulkDeleteRequest):
+    """
+    Delete several class sessions at once (e.g. semester cleanup)
+    
+    - **class_ids**: Class identifiers to delete; unknown ids are ignored
+    - ⚠️ WARNING: This will also delete all attendance and emotion records for these classes
+    """
+    try:
+        supabase = get_async_supabase()
+        class_ids = list(dict.fromkeys(request.class_ids))
+        
+        result = await supabase.rpc("delete_classes_cascade", {"p_class_ids": class_ids}).execute()
+        counts = result.data[0] if result.data else {}
+        
+        get_active_session_index().invalidate()
+        for deleted_id in class_ids:
+            invalidate_class_session(deleted_id)
+            get_attendance_rosters().invalidate(deleted_id)
+        logger.info(f"Class sessions bulk deleted: {counts.get('classes_deleted', 0)}/{len(class_ids)}")
+        
+        return BaseResponse(
+            success=True,
+            message=f"Deleted {counts.get('classes_deleted', 0)} of {len(class_ids)} class sessions",
+            data={"requested": len(class_ids), **counts}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error bulk deleting classes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error deleting classes: {str(e)}"
+        )
+
+
 @router.get(
     "/{class_id}/stats",
     response_model=BaseResponse,
@@ -802,10 +820,10 @@ async def get_class_stats(class_id: str):
     - Returns attendance rate, emotion analysis, and engagement metrics
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Get class info
-        class_result = supabase.table("class_sessions").select("*").eq("class_id", class_id).execute()
+        class_result = await supabase.table("class_sessions").select("*").eq("class_id", class_id).execute()
         
         if not class_result.data:
             raise HTTPException(
@@ -816,19 +834,16 @@ async def get_class_stats(class_id: str):
         class_data = class_result.data[0]
         
         # Get attendance records
-        attendance_result = supabase.table("attendance").select("*").eq("class_id", class_id).execute()
+        attendance_result = await supabase.table("attendance").select("*").eq("class_id", class_id).execute()
         attendance_count = len(attendance_result.data)
         
-        # Get emotion events
-        emotions_result = supabase.table("emotion_events").select("dominant_emotion, confidence").eq("class_id", class_id).execute()
-        emotions_count = len(emotions_result.data)
-        
-        # Calculate emotion distribution
-        emotion_distribution = {}
-        if emotions_result.data:
-            for event in emotions_result.data:
-                emotion = event["dominant_emotion"]
-                emotion_distribution[emotion] = emotion_distribution.get(emotion, 0) + 1
+        # Emotion distribution from the per-minute rollup
+        emotions_result = await supabase.rpc("get_class_emotion_summary", {"p_class_id": class_id}).execute()
+        emotion_distribution = {
+            row["dominant_emotion"]: row["event_count"]
+            for row in (emotions_result.data or [])
+        }
+        emotions_count = sum(emotion_distribution.values())
         
         # Calculate engagement score (% of positive emotions)
         positive_emotions = ["happy", "surprise"]
@@ -8,6 +8,7 @@ from datetime import datetime
 from app.core.schemas import BaseResponse
 from app.services.face_service import EmotionAnalysisService, ImageProcessingService
 from app.db.crud import EmotionEventCRUD
+from app.db.emotion_scores import score_dicts, mean_scores
 from app.core.logger import logger
 
 router = APIRouter(prefix="/emotions", tags=["Emotion Analysis"])
@@ -47,7 +48,7 @@ async def analyze_emotion(
             )
         
         # Analyze emotion
-        emotion_result = emotion_service.analyze_emotion(img)
+        emotion_result = await emotion_service.analyze_emotion_async(img)
         
         # Format response for frontend
         emotions_list = [{
@@ -61,18 +62,19 @@ async def analyze_emotion(
         # (student_id must exist in students table due to foreign key constraint)
         db_save_success = False
         db_save_error = None
+        queued = False
         if class_id and student_id:
             try:
-                logger.info(f"💾 Guardando emoción en BD: student_id={student_id}, class_id={class_id}, emotion={emotion_result['dominant_emotion']}")
-                await emotion_crud.record_emotion(
+                # Se encola y se inserta por lotes en segundo plano (write-behind)
+                queued = await emotion_crud.enqueue_emotion(
                     student_id=student_id,
                     class_id=class_id,
                     dominant_emotion=emotion_result["dominant_emotion"],
                     confidence=emotion_result["confidence"],
                     emotion_scores=emotion_result["all_emotions"]
                 )
-                db_save_success = True
-                logger.info(f"✅ Emoción guardada exitosamente en BD")
+                # Encolada = aún no está en la base de datos
+                db_save_success = not queued
             except Exception as db_error:
                 db_save_error = str(db_error)
                 logger.error(f"❌ Failed to save emotion to database: {db_save_error}")
@@ -87,6 +89,7 @@ async def analyze_emotion(
                 "emotions": emotions_list,
                 "raw_data": emotion_result,
                 "saved_to_db": db_save_success,
+                "queued": queued,
                 "db_error": db_save_error
             }
         )
@@ -174,31 +177,26 @@ async def get_class_emotion_summary(
     - **end_time**: Optional end time filter
     """
     try:
-        # Get emotion events
-        emotions = await emotion_crud.get_class_emotions(
+        # Totales por emoción desde el rollup por minuto (unas pocas filas)
+        summary = await emotion_crud.get_class_summary(
             class_id=class_id,
             start_time=start_time,
             end_time=end_time
         )
         
-        if not emotions:
+        emotion_counts = {row["dominant_emotion"]: row["event_count"] for row in summary}
+        total_events = sum(emotion_counts.values())
+        
+        if not total_events:
             return BaseResponse(
                 success=True,
                 message="No emotion data found",
                 data={"class_id": class_id, "total_events": 0}
             )
         
-        # Calculate statistics
-        emotion_counts = {}
-        total_confidence = 0.0
-        
-        for event in emotions:
-            emotion = event["dominant_emotion"]
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-            total_confidence += event["confidence"]
+        total_confidence = sum(row["confidence_sum"] for row in summary)
         
         # Calculate percentages
-        total_events = len(emotions)
         emotion_percentages = {
             emotion: (count / total_events) * 100
             for emotion, count in emotion_counts.items()
@@ -248,19 +246,17 @@ async def get_class_emotion_logs(class_id: str):
     - **class_id**: Class session identifier
     """
     try:
-        from app.db.supabase_client import get_supabase
-        
-        client = get_supabase()
-        response = client.table("emotion_events")\
-            .select("*")\
-            .eq("class_id", class_id)\
-            .order("detected_at", desc=True)\
-            .execute()
+        logs, scores = await emotion_crud.get_class_score_matrix(class_id)
+        for log, emotion_scores in zip(logs, score_dicts(scores)):
+            log["emotion_scores"] = emotion_scores
         
         return BaseResponse(
             success=True,
-            message=f"Found {len(response.data)} emotion events",
-            data={"logs": response.data}
+            message=f"Found {len(logs)} emotion events",
+            data={
+                "logs": logs,
+                "average_scores": mean_scores(scores)
+            }
         )
     
     except Exception as e:
@@ -271,11 +267,53 @@ async def get_class_emotion_logs(class_id: str):
         )
 
 
+@router.get(
+    "/class/{class_id}/timeline",
+    response_model=BaseResponse,
+    summary="Get class emotion timeline",
+    description="Per-minute emotion counts for a class session"
+)
+async def get_class_emotion_timeline(
+    class_id: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+):
+    """
+    Get the per-minute emotion timeline of a class
+    
+    - **class_id**: Class session identifier
+    - **start_time**: Optional start time filter
+    - **end_time**: Optional end time filter
+    """
+    try:
+        rows = await emotion_crud.get_timeline(
+            class_id=class_id,
+            start_time=start_time,
+            end_time=end_time
+        )
+        
+        return BaseResponse(
+            success=True,
+            message=f"Found {len(rows)} timeline buckets",
+            data={
+                "class_id": class_id,
+                "timeline": [_timeline_bucket(row) for row in rows]
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"Class emotion timeline error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.get(
     "/student-timeline/{student_id}",
     response_model=BaseResponse,
     summary="Get student emotion timeline",
-    description="Get emotion timeline for a specific student in a class"
+    description="Per-minute emotion timeline for a specific student in a class"
 )
 async def get_student_emotion_timeline(
     student_id: str,
@@ -287,27 +325,22 @@ async def get_student_emotion_timeline(
     
     - **student_id**: Student identifier
     - **class_id**: Class session identifier
-    - **limit**: Maximum number of events
+    - **limit**: Maximum number of minute buckets
     """
     try:
-        from app.db.supabase_client import get_supabase
-        
-        client = get_supabase()
-        response = client.table("emotion_events")\
-            .select("*")\
-            .eq("student_id", student_id)\
-            .eq("class_id", class_id)\
-            .order("detected_at", desc=False)\
-            .limit(limit)\
-            .execute()
+        rows = await emotion_crud.get_timeline(
+            class_id=class_id,
+            student_id=student_id,
+            limit=limit
+        )
         
         return BaseResponse(
             success=True,
-            message=f"Found {len(response.data)} emotion events",
+            message=f"Found {len(rows)} timeline buckets",
             data={
                 "student_id": student_id,
                 "class_id": class_id,
-                "timeline": response.data
+                "timeline": [_timeline_bucket(row) for row in rows]
             }
         )
     
@@ -317,3 +350,14 @@ async def get_student_emotion_timeline(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+
+def _timeline_bucket(row: dict) -> dict:
+    """API shape of one rollup row (minute, emotion, count, average confidence)"""
+    count = row["event_count"]
+    return {
+        "timestamp": row["minute"],
+        "emotion": row["dominant_emotion"],
+        "count": count,
+        "average_confidence": round(row["confidence_sum"] / count, 2) if count else None
+    }
@@ -2,22 +2,27 @@
 Smart Classroom AI - Enrollment API Router
 Endpoints for student enrollment
 """
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
-from typing import Optional
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, Query
+from typing import Optional, Tuple
+from datetime import datetime
 from app.core.schemas import (
     BaseResponse, 
     StudentEnrollRequest, 
     StudentEnrollResponse,
     EnrollmentRequest,
-    EnrollmentResponse
+    EnrollmentResponse,
+    StudentBulkDeleteRequest
 )
 from app.services.enrollment_service import EnrollmentService
 from app.services.face_service import get_face_embedding
-from app.db.supabase_client import get_supabase
+from app.db.supabase_client import get_async_supabase
+from app.db.embedding_gallery import get_embedding_gallery, get_course_gallery_cache
+from app.db.attendance_roster import get_attendance_rosters
 from app.core.logger import logger
 from app.core.config import get_settings
 import httpx
 import asyncio
+import base64
 
 router = APIRouter(prefix="/enrollment", tags=["Enrollment"])
 enrollment_service = EnrollmentService()
@@ -210,41 +215,51 @@ async def get_student(student_id: str):
     summary="List all students",
     description="Get list of all enrolled students"
 )
-async def list_students(active_only: bool = True, limit: int = 100, offset: int = 0):
+async def list_students(
+    active_only: bool = True,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
+):
     """
     List all enrolled students
     
     - **active_only**: Filter only active students (default: True)
     - **limit**: Maximum number of results
-    - **offset**: Pagination offset
+    - **offset**: Pagination offset (ignored when a cursor is given)
+    - **cursor**: `next_cursor` from the previous page (keyset pagination)
     """
     try:
         from app.db.crud import StudentCRUD
         student_crud = StudentCRUD()
         
-        students = await student_crud.list_all(active_only=active_only)
-        
-        # Pagination
-        paginated_students = students[offset:offset + limit]
+        try:
+            after = _decode_student_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
         
-        # Remove embeddings but add a flag to indicate if it exists
-        students_info = []
-        for s in paginated_students:
-            student_info = {k: v for k, v in s.items() if k != "face_embedding"}
-            student_info["has_embedding"] = bool(s.get("face_embedding"))
-            students_info.append(student_info)
+        (students_info, next_cursor), total = await asyncio.gather(
+            student_crud.list_page(active_only=active_only, limit=limit, after=after, offset=offset),
+            student_crud.count(active_only=active_only)
+        )
         
         return BaseResponse(
             success=True,
             message=f"Found {len(students_info)} students",
             data={
-                "total": len(students),
+                "total": total,
                 "limit": limit,
                 "offset": offset,
+                "next_cursor": _encode_student_cursor(next_cursor) if next_cursor else None,
                 "students": students_info
             }
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"List students error: {str(e)}")
         raise HTTPException(
@@ -253,6 +268,23 @@ async def list_students(active_only: bool = True, limit: int = 100, offset: int
         )
 
 
+def _encode_student_cursor(position: Tuple[str, int]) -> str:
+    """Opaque cursor for the (enrolled_at, id) keyset"""
+    enrolled_at, student_pk = position
+    return base64.urlsafe_b64encode(f"{enrolled_at}|{student_pk}".encode()).decode()
+
+
+def _decode_student_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of _encode_student_cursor (raises ValueError if malformed)"""
+    try:
+        enrolled_at, student_pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        # Validar el timestamp evita inyectar operadores en el filtro de PostgREST
+        datetime.fromisoformat(enrolled_at.replace('Z', '+00:00'))
+        return enrolled_at, int(student_pk)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
 # ============================================================================
 # ENDPOINT OPTIMIZADO - Usa las funciones nuevas de face_service.py
 # ============================================================================
@@ -286,7 +318,7 @@ async def enroll_student_optimized(payload: EnrollmentRequest):
 
         # PASO 2: Guardar en Supabase (Lógica de Base de Datos)
         # --- CORRECCIÓN CRÍTICA: Mapeamos los datos para que coincidan EXACTAMENTE con tu tabla 'students' ---
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         student_data = {
             "student_id": payload.student_id,           # VARCHAR (UNIQUE, NOT NULL)
@@ -301,11 +333,13 @@ async def enroll_student_optimized(payload: EnrollmentRequest):
         logger.info(f"📤 Insertando en tabla 'students': {student_data['student_id']} - {student_data['name']}")
 
         # Insertamos en la tabla 'students'
-        response = supabase.table("students").insert(student_data).execute()
+        response = await supabase.table("students").insert(student_data).execute()
 
         # Verificar si hubo error en la inserción
         if not response.data:
             raise Exception("Error al insertar en base de datos (posible ID duplicado o error de constraint).")
+        
+        get_embedding_gallery().invalidate()
 
         logger.info(f"✅ Estudiante {payload.student_id} registrado exitosamente en BD")
         logger.info(f"📊 Registro guardado: {response.data[0].get('id', 'N/A')} - {response.data[0].get('name', 'N/A')}")
@@ -354,28 +388,28 @@ async def delete_student(student_id: str):
     - **student_id**: The student_id of the student to delete (e.g., "2020411")
     """
     try:
-        from app.db.supabase_client import get_supabase
+        client = get_async_supabase()
         
-        client = get_supabase()
+        # Asistencias, emociones, inscripciones y estudiante en una sola transacción (migración 011)
+        result = await client.rpc("delete_student_cascade", {"p_student_id": student_id}).execute()
+        counts = result.data[0] if result.data else {}
         
-        # Check if student exists
-        existing = client.table("students").select("id").eq("student_id", student_id).execute()
-        
-        if not existing.data:
+        if not counts.get("students_deleted"):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Student with ID '{student_id}' not found"
             )
         
-        # Delete student
-        result = client.table("students").delete().eq("student_id", student_id).execute()
+        get_embedding_gallery().invalidate()
+        get_course_gallery_cache().invalidate()
+        get_attendance_rosters().invalidate()
         
         logger.info(f"Student {student_id} deleted successfully")
         
         return BaseResponse(
             success=True,
             message=f"Student {student_id} deleted successfully",
-            data={"student_id": student_id}
+            data={"student_id": student_id, **counts}
         )
         
     except HTTPException:
@@ -386,3 +420,42 @@ async def delete_student(student_id: str):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting student: {str(e)}"
         )
+
+
+@router.post(
+    "/students/bulk-delete",
+    response_model=BaseResponse,
+    summary="Delete several students",
+    description="Delete a list of students and all their records in one transaction"
+)
+async def bulk_delete_students(request: StudentBulkDeleteRequest):
+    """
+    Delete several students at once (e.g. semester cleanup)
+    
+    - **student_ids**: Student identifiers to delete; unknown ids are ignored
+    """
+    try:
+        client = get_async_supabase()
+        student_ids = list(dict.fromkeys(request.student_ids))
+        
+        result = await client.rpc("delete_students_cascade", {"p_student_ids": student_ids}).execute()
+        counts = result.data[0] if result.data else {}
+        
+        get_embedding_gallery().invalidate()
+        get_course_gallery_cache().invalidate()
+        get_attendance_rosters().invalidate()
+        
+        logger.info(f"Students bulk deleted: {counts.get('students_deleted', 0)}/{len(student_ids)}")
+        
+        return BaseResponse(
+            success=True,
+            message=f"Deleted {counts.get('students_deleted', 0)} of {len(student_ids)} students",
+            data={"requested": len(student_ids), **counts}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error bulk deleting students: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error deleting students: {str(e)}"
+        )
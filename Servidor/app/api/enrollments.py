@@ -2,18 +2,23 @@
 Smart Classroom AI - Enrollments API Router
 Endpoints for managing student enrollments in courses
 """
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Query
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 from app.core.schemas import BaseResponse
-from app.db.supabase_client import get_supabase
+from app.db.supabase_client import get_async_supabase
+from app.db.embedding_gallery import get_course_gallery_cache
+from app.db.attendance_roster import get_attendance_rosters
 from app.core.logger import logger
 from app.core.config import get_settings
 import httpx
 import asyncio
 router = APIRouter(prefix="/enrollments", tags=["Enrollments"])
 
+# PostgREST devuelve como máximo 1000 filas por petición
+AVAILABLE_PAGE_SIZE = 1000
+
 
 # ============================================================================
 # HELPER FUNCTIONS
@@ -88,10 +93,10 @@ async def enroll_student_in_course(request: EnrollStudentRequest):
     - **course_id**: ID del curso (UUID)
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Verify student exists
-        student_response = supabase.table("students")\
+        student_response = await supabase.table("students")\
             .select("student_id, name")\
             .eq("student_id", request.student_id)\
             .execute()
@@ -105,7 +110,7 @@ async def enroll_student_in_course(request: EnrollStudentRequest):
         student = student_response.data[0]
         
         # Check if already enrolled
-        existing = supabase.table("enrollments")\
+        existing = await supabase.table("enrollments")\
             .select("id")\
             .eq("student_id", request.student_id)\
             .eq("course_id", request.course_id)\
@@ -124,7 +129,7 @@ async def enroll_student_in_course(request: EnrollStudentRequest):
             "enrolled_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("enrollments").insert(enrollment_data).execute()
+        result = await supabase.table("enrollments").insert(enrollment_data).execute()
         
         if not result.data:
             raise HTTPException(
@@ -134,6 +139,10 @@ async def enroll_student_in_course(request: EnrollStudentRequest):
         
         logger.info(f"✅ Estudiante {request.student_id} inscrito en curso {request.course_id}")
         
+        # La galería de reconocimiento del curso cambió
+        get_course_gallery_cache().invalidate(request.course_id)
+        get_attendance_rosters().invalidate_course(request.course_id)
+        
         # Llamar Edge Function para enviar notificación (sin esperar)
         asyncio.create_task(enviar_notificacion_inscripcion())
         
@@ -170,10 +179,10 @@ async def unenroll_student_from_course(course_id: str, student_id: str):
     - **student_id**: Cédula del estudiante
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Check if enrollment exists
-        existing = supabase.table("enrollments")\
+        existing = await supabase.table("enrollments")\
             .select("id")\
             .eq("student_id", student_id)\
             .eq("course_id", course_id)\
@@ -186,7 +195,7 @@ async def unenroll_student_from_course(course_id: str, student_id: str):
             )
         
         # Delete enrollment
-        supabase.table("enrollments")\
+        await supabase.table("enrollments")\
             .delete()\
             .eq("student_id", student_id)\
             .eq("course_id", course_id)\
@@ -194,6 +203,10 @@ async def unenroll_student_from_course(course_id: str, student_id: str):
         
         logger.info(f"✅ Estudiante {student_id} desinscrito del curso {course_id}")
         
+        # La galería de reconocimiento del curso cambió
+        get_course_gallery_cache().invalidate(course_id)
+        get_attendance_rosters().invalidate_course(course_id)
+        
         return BaseResponse(
             success=True,
             message="Estudiante desinscrito exitosamente",
@@ -223,10 +236,10 @@ async def get_course_students(course_id: str):
     - **course_id**: ID del curso (UUID)
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Get enrollments with student data
-        response = supabase.table("enrollments")\
+        response = await supabase.table("enrollments")\
             .select("*, students(student_id, name, email, photo_url, is_active)")\
             .eq("course_id", course_id)\
             .execute()
@@ -277,10 +290,10 @@ async def get_student_courses(student_id: str):
     - **student_id**: Cédula del estudiante
     """
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
         # Get enrollments with course data
-        response = supabase.table("enrollments")\
+        response = await supabase.table("enrollments")\
             .select("*, courses(id, course_name, course_code, description)")\
             .eq("student_id", student_id)\
             .execute()
@@ -323,45 +336,63 @@ async def get_student_courses(student_id: str):
     summary="Listar estudiantes disponibles para inscribir",
     description="Obtiene los estudiantes que NO están inscritos en un curso"
 )
-async def get_available_students(course_id: str):
+async def get_available_students(
+    course_id: str,
+    search: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
     """
     Obtener estudiantes que pueden ser inscritos en un curso
-    (todos los estudiantes menos los ya inscritos)
+    (estudiantes activos sin inscripción en el curso)
     
     - **course_id**: ID del curso (UUID)
+    - **search**: Prefijo de nombre o cédula
+    - **limit**: Máximo de resultados (sin límite = todos)
+    - **offset**: Desplazamiento de paginación
     """
     try:
-        supabase = get_supabase()
-        
-        # Get all students
-        all_students_response = supabase.table("students")\
-            .select("student_id, name, email, photo_url")\
-            .eq("is_active", True)\
-            .execute()
-        
-        all_students = {s["student_id"]: s for s in (all_students_response.data or [])}
-        
-        # Get enrolled students
-        enrolled_response = supabase.table("enrollments")\
-            .select("student_id")\
-            .eq("course_id", course_id)\
-            .execute()
-        
-        enrolled_ids = {e["student_id"] for e in (enrolled_response.data or [])}
-        
-        # Filter available students
-        available_students = [
-            student for student_id, student in all_students.items()
-            if student_id not in enrolled_ids
-        ]
+        supabase = get_async_supabase()
+        
+        async def fetch_page(page_offset: int, page_limit: int) -> List[dict]:
+            # Anti-join en la base de datos (NOT EXISTS), ver migración 009
+            response = await supabase.rpc("get_available_students", {
+                "p_course_id": course_id,
+                "p_search": search,
+                "p_limit": page_limit,
+                "p_offset": page_offset
+            }).execute()
+            return response.data or []
+        
+        async def fetch_all() -> List[dict]:
+            rows = []
+            page_offset = offset
+            while True:
+                page = await fetch_page(page_offset, AVAILABLE_PAGE_SIZE)
+                rows.extend(page)
+                if len(page) < AVAILABLE_PAGE_SIZE:
+                    return rows
+                page_offset += AVAILABLE_PAGE_SIZE
+        
+        # El total no depende de la página pedida (migración 017)
+        count_response, rows = await asyncio.gather(
+            supabase.rpc("count_available_students", {
+                "p_course_id": course_id,
+                "p_search": search
+            }).execute(),
+            fetch_page(offset, limit) if limit is not None else fetch_all()
+        )
+        total = count_response.data or 0
         
         return BaseResponse(
             success=True,
-            message=f"Hay {len(available_students)} estudiantes disponibles para inscribir",
+            message=f"Hay {total} estudiantes disponibles para inscribir",
             data={
                 "course_id": course_id,
-                "total": len(available_students),
-                "students": available_students
+                "total": total,
+                "limit": limit,
+                "offset": offset,
+                "students": rows
             }
         )
         
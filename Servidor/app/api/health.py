@@ -7,6 +7,14 @@ from datetime import datetime
 from app.core.schemas import BaseResponse, HealthCheckResponse
 from app.core.config import settings
 from app.db.supabase_client import SupabaseClient
+from app.services.face_service import inference_executor
+from app.db.emotion_buffer import get_emotion_buffer
+from app.db.emotion_retention import get_emotion_retention
+from app.db.crud import class_session_cache
+from app.db.attendance_roster import get_attendance_rosters
+from app.services.qr_service import qr_token_cache
+from app.services.code_stream import get_code_broadcaster
+from app.api.statistics import dashboard_cache
 from app.core.logger import logger
 
 router = APIRouter(tags=["Health"])
@@ -64,6 +72,86 @@ async def health_check():
     )
 
 
+@router.get(
+    "/health/inference",
+    response_model=BaseResponse,
+    summary="Inference pool status",
+    description="Queue depth and per-task latency of the DeepFace inference pool"
+)
+async def inference_status():
+    """Inference pool metrics (pending tasks, queue depth, latency percentiles)"""
+    return BaseResponse(
+        success=True,
+        message="Inference pool status",
+        data=inference_executor.stats()
+    )
+
+
+@router.get(
+    "/health/emotion-buffer",
+    response_model=BaseResponse,
+    summary="Emotion write buffer status",
+    description="Queue depth, backpressure and flush metrics of the emotion_events write-behind buffer"
+)
+async def emotion_buffer_status():
+    """Emotion buffer metrics (pending rows, rejected enqueues, batch sizes, flush latency)"""
+    return BaseResponse(
+        success=True,
+        message="Emotion buffer status",
+        data=get_emotion_buffer().stats()
+    )
+
+
+@router.get(
+    "/health/emotion-retention",
+    response_model=BaseResponse,
+    summary="Emotion events maintenance status",
+    description="emotion_events partitions and the archive/drop runs of the maintenance task"
+)
+async def emotion_retention_status():
+    """Emotion maintenance metrics (partitions, last run, archived rows)"""
+    return BaseResponse(
+        success=True,
+        message="Emotion maintenance status",
+        data=get_emotion_retention().stats()
+    )
+
+
+@router.get(
+    "/health/code-streams",
+    response_model=BaseResponse,
+    summary="Rotating code stream status",
+    description="Open Server-Sent Events connections and rotations pushed by the code scheduler"
+)
+async def code_stream_status():
+    """Rotating code stream metrics (classes, connections, events sent)"""
+    return BaseResponse(
+        success=True,
+        message="Code stream status",
+        data=get_code_broadcaster().stats()
+    )
+
+
+@router.get(
+    "/health/caches",
+    response_model=BaseResponse,
+    summary="In-process cache status",
+    description="Size and hit/miss counters of the class session, QR token, roster and dashboard caches"
+)
+async def cache_status():
+    """Cache metrics (entries, TTL, hits, misses, hit rate)"""
+    return BaseResponse(
+        success=True,
+        message="Cache status",
+        data={
+            "class_sessions": class_session_cache.stats(),
+            "qr_tokens": qr_token_cache.stats(),
+            "attendance_rosters": get_attendance_rosters().stats(),
+            "dashboard": dashboard_cache.stats()
+        }
+    )
+
+
 @router.get(
     "/",
     response_model=BaseResponse,
@@ -3,15 +3,17 @@ Smart Classroom AI - QR & Code-based Attendance API
 Endpoints for QR and rotating code attendance verification
 """
 from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel, Field
 
 from app.services.qr_service import QRService, ClassPeriodService, RotatingCodeService
-from app.db.crud import StudentCRUD, AttendanceCRUD
+from app.services.code_stream import get_code_broadcaster
+from app.db.crud import get_student_crud, get_attendance_crud, get_class_session_crud
+from app.db.attendance_roster import get_attendance_rosters
 from app.core.logger import logger
 from app.core.schemas import BaseResponse
-from app.db.supabase_client import get_supabase
+from app.db.supabase_client import get_async_supabase
 
 router = APIRouter(prefix="/qr", tags=["QR Attendance"])
 
@@ -113,6 +115,36 @@ async def get_current_code(class_id: str):
         )
 
 
+@router.get(
+    "/code/{class_id}/stream",
+    summary="Stream rotating codes",
+    description="Server-Sent Events: the current code on connect, then each new code at its slot boundary"
+)
+async def stream_current_code(class_id: str):
+    """
+    Rotating code stream for the teacher screen (replaces polling /qr/code/{class_id})
+    
+    Each `code` event carries the same fields as GET /qr/code/{class_id}
+    """
+    class_info = await get_class_session_crud().get(class_id)
+    if not class_info:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Clase {class_id} no encontrada"
+        )
+    
+    return StreamingResponse(
+        get_code_broadcaster().stream(class_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # GZipMiddleware bufferiza los streams; con Content-Encoding fijado no los toca
+            "Content-Encoding": "identity"
+        }
+    )
+
+
 @router.get(
     "/class/{class_id}/periods",
     response_model=BaseResponse,
@@ -122,20 +154,14 @@ async def get_current_code(class_id: str):
 async def get_class_periods(class_id: str):
     """Get calculated periods for a class"""
     try:
-        supabase = get_supabase()
+        class_info = await get_class_session_crud().get(class_id)
         
-        response = supabase.table("class_sessions")\
-            .select("*")\
-            .eq("class_id", class_id)\
-            .execute()
-        
-        if not response.data:
+        if not class_info:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Clase {class_id} no encontrada"
             )
         
-        class_info = response.data[0]
         start_time = datetime.fromisoformat(class_info['start_time'].replace('Z', '+00:00'))
         end_time = datetime.fromisoformat(class_info['end_time'].replace('Z', '+00:00'))
         
@@ -227,6 +253,11 @@ async def verify_attendance_by_code(request: CodeVerifyRequest):
     
     NO SELFIE REQUIRED - Just cédula + current 6-digit code
     
+    Built for the whole class submitting within seconds: the token, the
+    class info and the enrolled students' names (class roster) are served
+    from memory, so a check-in costs one upsert, which also answers repeated
+    submissions.
+    
     - **token**: QR token from scanned code
     - **cedula**: Student's cédula
     - **code**: Current 6-digit code shown on teacher's screen
@@ -262,20 +293,7 @@ async def verify_attendance_by_code(request: CodeVerifyRequest):
                 }
             )
         
-        # 3. Find student by cédula
-        student_crud = StudentCRUD()
-        student = await student_crud.find_by_id(request.cedula)
-        
-        if not student:
-            return JSONResponse(
-                status_code=status.HTTP_404_NOT_FOUND,
-                content={
-                    "success": False,
-                    "message": f"❌ No se encontró estudiante con cédula {request.cedula}. ¿Estás registrado en el sistema?"
-                }
-            )
-        
-        # 4. Determine attendance status
+        # 3. Determine attendance status
         now = datetime.now(ECUADOR_TZ)
         start_time = datetime.fromisoformat(class_info['start_time'].replace('Z', '+00:00'))
         end_time = datetime.fromisoformat(class_info['end_time'].replace('Z', '+00:00'))
@@ -291,15 +309,45 @@ async def verify_attendance_by_code(request: CodeVerifyRequest):
         # Get numeric ID for attendance (compatible with frontend queries)
         numeric_class_id = str(class_info.get('id', class_id))
         
-        # 5. Check if already registered
-        attendance_crud = AttendanceCRUD()
+        # 4. Roster de la clase en vivo: nombres de los inscritos en memoria
+        metadata = class_info.get('metadata') or {}
+        roster = None
+        try:
+            roster = await get_attendance_rosters().get(
+                numeric_class_id,
+                course_id=metadata.get('course_id') if isinstance(metadata, dict) else None
+            )
+        except Exception as e:
+            logger.warning(f"Could not load roster for {numeric_class_id}: {str(e)}")
+        
+        # 5. Find student by cédula (enrolled students are already in the roster)
+        if roster is not None and request.cedula in roster.enrolled:
+            student = {"student_id": request.cedula, "name": roster.enrolled[request.cedula]}
+        else:
+            student = await get_student_crud().find_by_id(request.cedula)
         
-        existing = await attendance_crud.check_attendance_exists(
+        if not student:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={
+                    "success": False,
+                    "message": f"❌ No se encontró estudiante con cédula {request.cedula}. ¿Estás registrado en el sistema?"
+                }
+            )
+        
+        # 6. Mark attendance in one atomic upsert (using numeric ID for compatibility);
+        # the database answers duplicates
+        attendance_crud = get_attendance_crud()
+        attendance_record = await attendance_crud.mark_attendance(
             student_id=request.cedula,
-            class_id=numeric_class_id
+            class_id=numeric_class_id,
+            status=attendance_status,
+            confidence=1.0,  # Code-based verification = 100% confidence
+            match_distance=0.0,
+            verification_method="qr"
         )
         
-        if existing:
+        if attendance_record.get("already_registered"):
             return JSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
@@ -307,21 +355,12 @@ async def verify_attendance_by_code(request: CodeVerifyRequest):
                     "already_registered": True,
                     "message": f"⚠️ Ya tienes asistencia registrada para esta clase",
                     "student_name": student.get('name'),
-                    "status": existing.get('status'),
-                    "timestamp": existing.get('timestamp'),
+                    "status": attendance_record.get('status'),
+                    "timestamp": attendance_record.get('timestamp'),
                     "period_number": actual_period
                 }
             )
         
-        # 6. Mark attendance (using numeric ID for compatibility)
-        attendance_record = await attendance_crud.mark_attendance(
-            student_id=request.cedula,
-            class_id=numeric_class_id,
-            status=attendance_status,
-            confidence=1.0,  # Code-based verification = 100% confidence
-            match_distance=0.0
-        )
-        
         status_emoji = "✅" if attendance_status == "present" else "⚠️"
         status_text = "Presente" if attendance_status == "present" else "Atrasado"
         
@@ -359,36 +398,41 @@ async def verify_attendance_by_code(request: CodeVerifyRequest):
 async def get_attendance_by_period(class_id: str):
     """Get attendance records grouped by period"""
     try:
-        supabase = get_supabase()
+        supabase = get_async_supabase()
         
-        class_response = supabase.table("class_sessions")\
-            .select("*")\
-            .eq("class_id", class_id)\
-            .execute()
+        class_info = await get_class_session_crud().get(class_id)
         
-        if not class_response.data:
+        if not class_info:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Clase {class_id} no encontrada"
             )
         
-        class_info = class_response.data[0]
         start_time = datetime.fromisoformat(class_info['start_time'].replace('Z', '+00:00'))
         end_time = datetime.fromisoformat(class_info['end_time'].replace('Z', '+00:00'))
         
         period_service = ClassPeriodService()
         periods = period_service.calculate_periods(start_time, end_time)
         
-        result_periods = []
-        for period in periods:
-            period_class_id = f"{class_id}_P{period['period_number']}"
-            
-            attendance_response = supabase.table("attendance")\
+        # Una sola consulta para todos los períodos ({class_id}_P{n}), agrupada en memoria
+        period_class_ids = {
+            f"{class_id}_P{period['period_number']}": period['period_number']
+            for period in periods
+        }
+        records_by_period = {period['period_number']: [] for period in periods}
+        
+        if period_class_ids:
+            attendance_response = await supabase.table("attendance")\
                 .select("*")\
-                .eq("class_id", period_class_id)\
+                .in_("class_id", list(period_class_ids))\
                 .execute()
             
-            records = attendance_response.data if attendance_response.data else []
+            for record in attendance_response.data or []:
+                records_by_period[period_class_ids[record['class_id']]].append(record)
+        
+        result_periods = []
+        for period in periods:
+            records = records_by_period[period['period_number']]
             
             present_count = len([r for r in records if r['status'] == 'present'])
             late_count = len([r for r in records if r['status'] == 'late'])
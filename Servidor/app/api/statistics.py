@@ -3,16 +3,26 @@ Smart Classroom AI - Statistics API Router
 Endpoints for system-wide statistics and analytics
 """
 from fastapi import APIRouter, HTTPException, status
+import asyncio
 from typing import Dict, Any
 from app.core.schemas import BaseResponse
-from app.db.supabase_client import SupabaseClient
+from app.db.supabase_client import get_async_supabase
 from app.core.logger import logger
+from app.core.config import settings
+from app.core.cache import TTLCache
 
 router = APIRouter(prefix="/statistics", tags=["Statistics"])
 
 # Zona horaria de Ecuador (UTC-5)
 ECUADOR_TZ_OFFSET = -5
 
+# Emociones que cuentan como engagement positivo (DeepFace emotions)
+POSITIVE_EMOTIONS = ['happy', 'neutral', 'surprise']
+
+# Snapshot del dashboard (una sola entrada)
+DASHBOARD_CACHE_KEY = "dashboard"
+dashboard_cache = TTLCache(ttl_seconds=settings.DASHBOARD_CACHE_SECONDS, max_entries=1, name="dashboard")
+
 
 @router.get(
     "/dashboard",
@@ -20,80 +30,25 @@ ECUADOR_TZ_OFFSET = -5
     summary="Get dashboard statistics",
     description="Get overall system statistics for the dashboard"
 )
-async def get_dashboard_statistics():
+async def get_dashboard_statistics(refresh: bool = False):
     """
     Get general statistics for the dashboard:
     - Average attendance across all classes
     - Average engagement based on emotions
     - Total students and classes
+    
+    Counts are computed in the database and the result is cached for
+    DASHBOARD_CACHE_SECONDS (use **refresh=true** to bypass the cache).
     """
     try:
-        supabase = SupabaseClient.get_client()
-        
-        # Get all attendance records
-        attendance_response = supabase.table("attendance").select("*").execute()
-        attendance_records = attendance_response.data if attendance_response.data else []
-        
-        # Get all class sessions
-        classes_response = supabase.table("class_sessions").select("*").execute()
-        classes = classes_response.data if classes_response.data else []
-        
-        # Get all students
-        students_response = supabase.table("students").select("*").execute()
-        students = students_response.data if students_response.data else []
-        
-        # Get all emotion events
-        emotions_response = supabase.table("emotion_events").select("*").execute()
-        emotions = emotions_response.data if emotions_response.data else []
-        
-        # Calculate average attendance (capped at 100%)
-        avg_attendance = 0
-        if classes and students:
-            total_students = len(students)
-            total_classes = len(classes)
-            total_possible_attendances = total_students * total_classes
-            
-            if total_possible_attendances > 0:
-                # Count unique student-class combinations to avoid duplicates
-                unique_attendances = set()
-                for record in attendance_records:
-                    key = f"{record.get('student_id')}_{record.get('class_id')}"
-                    unique_attendances.add(key)
-                
-                total_unique_attendances = len(unique_attendances)
-                avg_attendance = round((total_unique_attendances / total_possible_attendances) * 100, 1)
-                # Cap at 100%
-                avg_attendance = min(avg_attendance, 100.0)
-        
-        # Calculate engagement based on emotions
-        avg_engagement = 0
-        if emotions:
-            # Define positive emotions (DeepFace emotions)
-            positive_emotions = ['happy', 'neutral', 'surprise']
-            negative_emotions = ['sad', 'angry', 'fear', 'disgust']
-            
-            # Use 'dominant_emotion' field (correct field name in database)
-            positive_count = sum(1 for e in emotions if e.get('dominant_emotion') in positive_emotions)
-            total_emotions = len(emotions)
-            
-            if total_emotions > 0:
-                avg_engagement = round((positive_count / total_emotions) * 100, 1)
-        
-        # Active classes (those without end_time)
-        active_classes = sum(1 for c in classes if not c.get('end_time'))
+        if refresh:
+            dashboard_cache.invalidate(DASHBOARD_CACHE_KEY)
+        data = await dashboard_cache.get_or_load(DASHBOARD_CACHE_KEY, _compute_dashboard_statistics)
         
         return BaseResponse(
             success=True,
             message="Dashboard statistics retrieved successfully",
-            data={
-                "totalStudents": len(students),
-                "activeClasses": active_classes,
-                "avgAttendance": avg_attendance,
-                "avgEngagement": avg_engagement,
-                "totalClasses": len(classes),
-                "totalAttendances": len(attendance_records),
-                "totalEmotions": len(emotions)
-            }
+            data=data
         )
         
     except Exception as e:
@@ -104,6 +59,46 @@ async def get_dashboard_statistics():
         )
 
 
+async def _compute_dashboard_statistics() -> Dict[str, Any]:
+    """Compute the dashboard snapshot from the get_dashboard_statistics RPC counts"""
+    supabase = get_async_supabase()
+    
+    response = await supabase.rpc(
+        "get_dashboard_statistics",
+        {"p_positive_emotions": POSITIVE_EMOTIONS}
+    ).execute()
+    counts = response.data[0] if response.data else {}
+    
+    total_students = counts.get("total_students") or 0
+    total_classes = counts.get("total_classes") or 0
+    unique_attendances = counts.get("unique_attendances") or 0
+    total_emotions = counts.get("total_emotions") or 0
+    positive_count = counts.get("positive_emotions") or 0
+    
+    # Calculate average attendance (capped at 100%)
+    # Unique student-class combinations to avoid duplicates
+    avg_attendance = 0
+    total_possible_attendances = total_students * total_classes
+    if total_possible_attendances > 0:
+        avg_attendance = round((unique_attendances / total_possible_attendances) * 100, 1)
+        avg_attendance = min(avg_attendance, 100.0)
+    
+    # Calculate engagement based on emotions
+    avg_engagement = 0
+    if total_emotions > 0:
+        avg_engagement = round((positive_count / total_emotions) * 100, 1)
+    
+    return {
+        "totalStudents": total_students,
+        "activeClasses": counts.get("active_classes") or 0,
+        "avgAttendance": avg_attendance,
+        "avgEngagement": avg_engagement,
+        "totalClasses": total_classes,
+        "totalAttendances": counts.get("total_attendances") or 0,
+        "totalEmotions": total_emotions
+    }
+
+
 @router.get(
     "/course/{course_id}",
     response_model=BaseResponse,
@@ -116,15 +111,27 @@ async def get_course_statistics(course_id: str):
     - Average attendance for this course
     - Average engagement for this course
     - Number of classes and students
+    - Per-session breakdown
+    
+    Cost is two queries regardless of how many sessions the course has.
     """
     try:
-        supabase = SupabaseClient.get_client()
-        
-        # Get classes for this course
-        classes_response = supabase.table("class_sessions").select("*").eq("course_id", course_id).execute()
-        classes = classes_response.data if classes_response.data else []
+        supabase = get_async_supabase()
+        
+        # Per-session counts (one GROUP BY query) and enrollment count, concurrently
+        sessions_response, enrollment_response = await asyncio.gather(
+            supabase.rpc(
+                "get_course_session_statistics",
+                {"p_course_id": course_id, "p_positive_emotions": POSITIVE_EMOTIONS}
+            ).execute(),
+            supabase.table("enrollments")\
+                .select("id", count="exact", head=True)\
+                .eq("course_id", course_id)\
+                .execute()
+        )
+        sessions = sessions_response.data if sessions_response.data else []
         
-        if not classes:
+        if not sessions:
             return BaseResponse(
                 success=True,
                 message="No classes found for this course",
@@ -132,44 +139,44 @@ async def get_course_statistics(course_id: str):
                     "avgAttendance": 0,
                     "avgEngagement": 0,
                     "totalClasses": 0,
-                    "totalAttendances": 0
+                    "totalAttendances": 0,
+                    "sessions": []
                 }
             )
         
-        # Get class_ids
-        class_ids = [c['class_id'] for c in classes]
-        
-        # Get attendance for these classes
-        attendance_records = []
-        for class_id in class_ids:
-            att_response = supabase.table("attendance").select("*").eq("class_id", class_id).execute()
-            if att_response.data:
-                attendance_records.extend(att_response.data)
+        # Total students enrolled in the course
+        enrolled_students = enrollment_response.count or 0
         
-        # Get emotions for these classes
-        emotion_records = []
-        for class_id in class_ids:
-            emo_response = supabase.table("emotion_events").select("*").eq("class_id", class_id).execute()
-            if emo_response.data:
-                emotion_records.extend(emo_response.data)
-        
-        # Get total students enrolled in the course
-        enrollment_response = supabase.table("enrollments").select("*").eq("course_id", course_id).execute()
-        enrolled_students = len(enrollment_response.data) if enrollment_response.data else 0
+        total_attendances = sum(s["total_attendances"] for s in sessions)
+        total_emotions = sum(s["total_emotions"] for s in sessions)
+        positive_count = sum(s["positive_emotions"] for s in sessions)
         
         # Calculate average attendance
         avg_attendance = 0
-        if enrolled_students > 0 and classes:
-            total_possible = enrolled_students * len(classes)
-            if total_possible > 0:
-                avg_attendance = round((len(attendance_records) / total_possible) * 100, 1)
+        if enrolled_students > 0:
+            total_possible = enrolled_students * len(sessions)
+            avg_attendance = round((total_attendances / total_possible) * 100, 1)
         
         # Calculate engagement (using correct field 'dominant_emotion')
         avg_engagement = 0
-        if emotion_records:
-            positive_emotions = ['happy', 'neutral', 'surprise']
-            positive_count = sum(1 for e in emotion_records if e.get('dominant_emotion') in positive_emotions)
-            avg_engagement = round((positive_count / len(emotion_records)) * 100, 1)
+        if total_emotions > 0:
+            avg_engagement = round((positive_count / total_emotions) * 100, 1)
+        
+        session_breakdown = [
+            {
+                "classId": s["class_id"],
+                "className": s["class_name"],
+                "startTime": s["start_time"],
+                "endTime": s["end_time"],
+                "attendances": s["total_attendances"],
+                "presentCount": s["present_count"],
+                "lateCount": s["late_count"],
+                "attendanceRate": round((s["total_attendances"] / enrolled_students) * 100, 1) if enrolled_students > 0 else 0,
+                "emotions": s["total_emotions"],
+                "engagement": round((s["positive_emotions"] / s["total_emotions"]) * 100, 1) if s["total_emotions"] > 0 else 0
+            }
+            for s in sessions
+        ]
         
         return BaseResponse(
             success=True,
@@ -177,10 +184,11 @@ async def get_course_statistics(course_id: str):
             data={
                 "avgAttendance": avg_attendance,
                 "avgEngagement": avg_engagement,
-                "totalClasses": len(classes),
-                "totalAttendances": len(attendance_records),
-                "totalEmotions": len(emotion_records),
-                "enrolledStudents": enrolled_students
+                "totalClasses": len(sessions),
+                "totalAttendances": total_attendances,
+                "totalEmotions": total_emotions,
+                "enrolledStudents": enrolled_students,
+                "sessions": session_breakdown
             }
         )
         
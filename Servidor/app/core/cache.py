@@ -0,0 +1,92 @@
+"""
+Smart Classroom AI - In-Process Cache
+TTL cache with hit/miss counters for read-mostly data (snapshots, lookups)
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    In-memory key/value cache whose entries expire after ``ttl_seconds``
+
+    Loads through get_or_load() are serialized per key, so concurrent misses
+    for the same key trigger a single database round trip.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024, name: str = "cache"):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.name = name
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Cached value or _MISSING, without touching the counters"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        return entry[1]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or ``default`` if missing or expired"""
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value, evicting the oldest entries beyond ``max_entries``"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry (or every entry)"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, calling ``loader()`` once on a miss"""
+        value = self._lookup(key)
+        if value is _MISSING:
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                # Otra petición pudo haberlo cargado mientras esperábamos
+                value = self._lookup(key)
+                if value is _MISSING:
+                    self.misses += 1
+                    value = await loader()
+                    self.set(key, value)
+                    self._locks.pop(key, None)
+                    return value
+        self.hits += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
@@ -3,7 +3,7 @@ Smart Classroom AI - Core Configuration
 Load and validate environment variables
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 from functools import lru_cache
 
 
@@ -37,6 +37,9 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     DB_POOL_SIZE: int = 20
     DB_MAX_OVERFLOW: int = 10
+    # "rest" = PostgREST (Supabase client), "postgres" = asyncpg pool on DATABASE_URL
+    DB_BACKEND: str = "rest"
+    DB_STATEMENT_CACHE_SIZE: int = 100
     
     # DeepFace
     FACE_DETECTOR_BACKEND: str = "retinaface"
@@ -63,12 +66,61 @@ class Settings(BaseSettings):
     ENABLE_EMOTION_ANALYSIS: bool = True
     ENABLE_MULTI_FACE_DETECTION: bool = True
     ENABLE_AUTO_REPORTS: bool = True
+    ENABLE_INFERENCE_POOL: bool = True
     
     # Performance
     MAX_WORKERS: int = 4
     REQUEST_TIMEOUT: int = 30
     BATCH_SIZE: int = 10
     
+    # Embedding Gallery (in-memory vector search)
+    ENABLE_EMBEDDING_GALLERY: bool = True
+    GALLERY_REFRESH_SECONDS: int = 300
+    ENABLE_COURSE_GALLERY: bool = True
+    COURSE_GALLERY_GLOBAL_FALLBACK: bool = True
+    
+    # Emotion events write-behind buffer
+    ENABLE_EMOTION_BUFFER: bool = True
+    EMOTION_BUFFER_BATCH_SIZE: int = 200
+    EMOTION_BUFFER_FLUSH_SECONDS: float = 2.0
+    EMOTION_BUFFER_MAX_PENDING: int = 10000
+    
+    # Emotion events maintenance (monthly partitions). Retention is off by
+    # default: months older than EMOTION_RETENTION_MONTHS are archived to
+    # EMOTION_ARCHIVE_DIR as .ndjson.gz and dropped only when both are set.
+    # The archive dir must be persistent storage (e.g. a mounted bucket), never
+    # the container disk.
+    ENABLE_EMOTION_MAINTENANCE: bool = True
+    EMOTION_MAINTENANCE_HOURS: float = 24.0
+    EMOTION_PARTITIONS_AHEAD: int = 2
+    EMOTION_RETENTION_MONTHS: int = 0
+    EMOTION_ARCHIVE_DIR: Optional[str] = None
+    
+    # Statistics
+    DASHBOARD_CACHE_SECONDS: int = 30
+    
+    # Active classes (in-memory index of today's sessions; 0 = query SQL on every request)
+    ACTIVE_CLASS_INDEX_SECONDS: int = 60
+    
+    # Class session lookups on the attendance / QR hot path (0 = no cache)
+    CLASS_SESSION_CACHE_SECONDS: int = 60
+    
+    # Live class rosters (enrolled students + attendance in memory; 0 = rebuilt per request)
+    ATTENDANCE_ROSTER_SECONDS: int = 900
+    
+    # Validated QR tokens kept in memory for /qr/verify-code bursts (0 = no cache)
+    QR_TOKEN_CACHE_SECONDS: int = 300
+    
+    # New QR tokens are HMAC-signed with SECRET_KEY and validated without qr_tokens
+    # (False = random tokens looked up in qr_tokens; both formats are always accepted)
+    QR_SIGNED_TOKENS: bool = True
+    
+    # Keep-alive comment on idle rotating code streams, for proxies (0 = none)
+    CODE_STREAM_HEARTBEAT_SECONDS: int = 30
+    
+    # Lifetime of one rotating code stream; EventSource reconnects (0 = unlimited)
+    CODE_STREAM_MAX_SECONDS: int = 300
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
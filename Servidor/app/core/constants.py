@@ -96,6 +96,13 @@ class DeepFaceAction(str, Enum):
     RACE = "race"
 
 
+# ---- Emotion Score Storage ----
+# Orden fijo de emotion_scores (salida del modelo de emociones de DeepFace)
+EMOTION_SCORE_ORDER = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+# Porcentajes 0-100 guardados como SMALLINT en centésimas (0-10000)
+EMOTION_SCORE_SCALE = 100
+
+
 # ---- File Upload Limits ----
 MAX_IMAGE_SIZE_MB = 10
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
@@ -61,6 +61,11 @@ class StudentEnrollResponse(BaseModel):
     created_at: datetime
 
 
+class StudentBulkDeleteRequest(BaseModel):
+    """Request schema for deleting several students"""
+    student_ids: List[str] = Field(..., min_length=1, max_length=1000, description="Student identifiers to delete")
+
+
 class StudentInfo(BaseModel):
     """Student information schema"""
     id: int
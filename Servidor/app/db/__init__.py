@@ -1,14 +1,73 @@
 """Database module - Supabase client and CRUD operations"""
-from app.db.supabase_client import get_supabase, SupabaseClient
-from app.db.crud import StudentCRUD, AttendanceCRUD, EmotionEventCRUD
+from app.db.supabase_client import (
+    get_supabase,
+    get_async_supabase,
+    SupabaseClient,
+    AsyncSupabaseClient
+)
+from app.db.crud import (
+    StudentCRUD,
+    AttendanceCRUD,
+    EmotionEventCRUD,
+    ClassSessionCRUD,
+    get_student_crud,
+    get_attendance_crud,
+    get_class_session_crud,
+    class_session_cache,
+    invalidate_class_session
+)
+from app.db.postgres import PostgresPool, get_postgres_pool
+from app.db.embedding_gallery import (
+    EmbeddingGallery,
+    CourseGalleryCache,
+    get_embedding_gallery,
+    get_course_gallery_cache
+)
+from app.db.emotion_buffer import EmotionEventBuffer, get_emotion_buffer
+from app.db.attendance_roster import (
+    ClassRoster,
+    AttendanceRosterRegistry,
+    get_attendance_rosters
+)
+from app.db.emotion_retention import EmotionRetentionTask, get_emotion_retention
+from app.db.emotion_scores import encode_emotion_scores, decode_emotion_scores
+from app.db.session_index import (
+    ActiveSessionIndex,
+    get_active_session_index
+)
 from app.db.models import Student, Attendance, EmotionEvent, ClassSession
 
 __all__ = [
     "get_supabase",
+    "get_async_supabase",
     "SupabaseClient",
+    "AsyncSupabaseClient",
     "StudentCRUD",
     "AttendanceCRUD",
     "EmotionEventCRUD",
+    "ClassSessionCRUD",
+    "get_student_crud",
+    "get_attendance_crud",
+    "get_class_session_crud",
+    "class_session_cache",
+    "invalidate_class_session",
+    "PostgresPool",
+    "get_postgres_pool",
+    "EmbeddingGallery",
+    "CourseGalleryCache",
+    "get_embedding_gallery",
+    "get_course_gallery_cache",
+    "EmotionEventBuffer",
+    "get_emotion_buffer",
+    "ClassRoster",
+    "AttendanceRosterRegistry",
+    "get_attendance_rosters",
+    "EmotionRetentionTask",
+    "get_emotion_retention",
+    "encode_emotion_scores",
+    "decode_emotion_scores",
+    "ActiveSessionIndex",
+    "get_active_session_index",
     "Student",
     "Attendance",
     "EmotionEvent",
@@ -0,0 +1,315 @@
+"""
+Smart Classroom AI - Live Class Attendance Roster
+In-memory enrolled students and attendance state of the classes in progress
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.logger import logger
+
+
+# Tamaño de página de las consultas de carga (límite de filas de PostgREST)
+ROSTER_PAGE_SIZE = 1000
+
+# Estados que cuentan como "ya marcó asistencia"
+MARKED_STATUSES = ("present", "late")
+
+
+class ClassRoster:
+    """
+    Attendance state of one class: enrolled students plus every attendance
+    record, indexed by (student_id, period)
+
+    Lookups are O(1) dict/set operations; the roster is kept in sync by
+    AttendanceCRUD (every mark goes through apply()) and by the manual
+    attendance endpoints of this process. It backs the live "who's missing"
+    view only: duplicates are always decided by the database.
+    """
+
+    def __init__(
+        self,
+        class_id: str,
+        course_id: Optional[str],
+        enrolled: Dict[str, Optional[str]],
+        records: List[Dict[str, Any]]
+    ):
+        self.class_id = class_id
+        self.course_id = course_id
+        self.enrolled = enrolled  # student_id -> name
+        self.loaded_at = time.monotonic()
+        self._records: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._keys_by_id: Dict[Any, Tuple[str, int]] = {}
+        self._marked: Dict[str, Set[int]] = {}
+        for record in records:
+            self.apply(record)
+
+    def get_record(self, student_id: str, period: int = 1) -> Optional[Dict[str, Any]]:
+        """Attendance record of a student in one period, if any"""
+        return self._records.get((student_id, period))
+
+    def is_marked(self, student_id: str) -> bool:
+        """True if the student is present or late in any period"""
+        return student_id in self._marked
+
+    @property
+    def marked(self) -> Set[str]:
+        return set(self._marked)
+
+    def status(self, student_id: str) -> Optional[str]:
+        """Status of the student's latest period, None if there is no record"""
+        periods = [period for sid, period in self._records if sid == student_id]
+        if not periods:
+            return None
+        return self._records[(student_id, max(periods))].get("status")
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        """Insert or replace an attendance record"""
+        key = (record["student_id"], record.get("period") or 1)
+        row = {k: v for k, v in record.items() if k != "already_registered"}
+        self._records[key] = row
+        if row.get("id") is not None:
+            self._keys_by_id[row["id"]] = key
+        self._update_marked(key)
+
+    def remove(self, record: Dict[str, Any]) -> bool:
+        """Drop a deleted attendance record (matched by id, else by student and period)"""
+        key = self._keys_by_id.pop(record.get("id"), None)
+        if key is None:
+            key = (record.get("student_id"), record.get("period") or 1)
+        if self._records.pop(key, None) is None:
+            return False
+        self._update_marked(key)
+        return True
+
+    def _update_marked(self, key: Tuple[str, int]) -> None:
+        student_id, period = key
+        record = self._records.get(key)
+        periods = self._marked.setdefault(student_id, set())
+        if record is not None and record.get("status") in MARKED_STATUSES:
+            periods.add(period)
+        else:
+            periods.discard(period)
+        if not periods:
+            del self._marked[student_id]
+
+    def missing(self) -> List[Dict[str, Any]]:
+        """Enrolled students with no present/late record, by name"""
+        students = [
+            {"student_id": student_id, "name": name, "status": self.status(student_id)}
+            for student_id, name in self.enrolled.items()
+            if student_id not in self._marked
+        ]
+        return sorted(students, key=lambda s: (s["name"] or "", s["student_id"]))
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts and the missing list for the live class view"""
+        marked_enrolled = sum(1 for student_id in self._marked if student_id in self.enrolled)
+        return {
+            "class_id": self.class_id,
+            "course_id": self.course_id,
+            "enrolled": len(self.enrolled),
+            "marked": len(self._marked),
+            "marked_not_enrolled": len(self._marked) - marked_enrolled,
+            "missing_count": len(self.enrolled) - marked_enrolled,
+            "missing": self.missing(),
+            "records": len(self._records)
+        }
+
+
+class AttendanceRosterRegistry:
+    """
+    Rosters of the classes being attended right now
+
+    A roster is built the first time a class needs one (the "who's missing"
+    view, or the enrolled-name lookup of a code check-in: one enrollments
+    query and one attendance query) and kept for ATTENDANCE_ROSTER_SECONDS,
+    after which the next use rebuilds it. Face verification never builds
+    one. AttendanceCRUD only
+    updates rosters that are already loaded (or being built: writes that
+    land during a build are replayed on the new roster), so edits to old
+    classes never build one. An invalidation during a build discards the
+    result, as in ActiveSessionIndex.
+    """
+
+    def __init__(self, client: Optional[AsyncClient] = None, ttl_seconds: Optional[int] = None):
+        self._client = client
+        self.ttl_seconds = settings.ATTENDANCE_ROSTER_SECONDS if ttl_seconds is None else ttl_seconds
+        self._rosters: Dict[str, ClassRoster] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._building: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        self._generation = 0
+
+        # Metrics
+        self.builds = 0
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            from app.db.supabase_client import get_async_supabase
+            self._client = get_async_supabase()
+        return self._client
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def peek(self, class_id: str) -> Optional[ClassRoster]:
+        """Loaded, unexpired roster of a class (never queries the database)"""
+        roster = self._rosters.get(class_id)
+        if roster is None:
+            return None
+        if time.monotonic() - roster.loaded_at > self.ttl_seconds:
+            del self._rosters[class_id]
+            return None
+        return roster
+
+    async def get(self, class_id: str, course_id: Optional[str] = None) -> ClassRoster:
+        """
+        Roster of a class, building it on first use
+
+        Args:
+            class_id: Class id as stored in attendance.class_id
+            course_id: Course of the class; looked up from the class session if omitted
+        """
+        roster = self.peek(class_id)
+        if roster is not None:
+            return roster
+
+        lock = self._locks.setdefault(class_id, asyncio.Lock())
+        async with lock:
+            roster = self.peek(class_id)
+            if roster is None:
+                generation = self._generation
+                self._building[class_id] = []
+                try:
+                    roster = await self._build(class_id, course_id)
+                finally:
+                    writes = self._building.pop(class_id, [])
+                # Escrituras que llegaron mientras se consultaba la base
+                for action, record in writes:
+                    if action == "apply":
+                        roster.apply(record)
+                    else:
+                        roster.remove(record)
+                if self.enabled and self._generation == generation:
+                    self._rosters[class_id] = roster
+            self._locks.pop(class_id, None)
+            return roster
+
+    async def _build(self, class_id: str, course_id: Optional[str]) -> ClassRoster:
+        if course_id is None:
+            from app.db.crud import get_class_session_crud
+            session = await get_class_session_crud().get(class_id)
+            metadata = (session or {}).get("metadata") or {}
+            course_id = metadata.get("course_id") if isinstance(metadata, dict) else None
+
+        enrolled, records = await asyncio.gather(
+            self._fetch_enrolled(course_id),
+            self._fetch_records(class_id)
+        )
+        self.builds += 1
+        roster = ClassRoster(class_id, course_id, enrolled, records)
+        logger.info(
+            f"📋 Roster {class_id}: {len(enrolled)} enrolled, {len(roster.marked)} already marked"
+        )
+        return roster
+
+    async def _fetch_enrolled(self, course_id: Optional[str]) -> Dict[str, Optional[str]]:
+        """student_id -> name of the students enrolled in a course"""
+        enrolled: Dict[str, Optional[str]] = {}
+        if not course_id:
+            return enrolled
+        start = 0
+        while True:
+            response = await self.client.table("enrollments")\
+                .select("student_id, students(name)")\
+                .eq("course_id", course_id)\
+                .order("id")\
+                .range(start, start + ROSTER_PAGE_SIZE - 1)\
+                .execute()
+            page = response.data or []
+            for row in page:
+                enrolled[row["student_id"]] = (row.get("students") or {}).get("name")
+            if len(page) < ROSTER_PAGE_SIZE:
+                break
+            start += ROSTER_PAGE_SIZE
+        return enrolled
+
+    async def _fetch_records(self, class_id: str) -> List[Dict[str, Any]]:
+        """Every attendance row of a class"""
+        records: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            response = await self.client.table("attendance")\
+                .select("*")\
+                .eq("class_id", class_id)\
+                .order("id")\
+                .range(start, start + ROSTER_PAGE_SIZE - 1)\
+                .execute()
+            page = response.data or []
+            records.extend(page)
+            if len(page) < ROSTER_PAGE_SIZE:
+                break
+            start += ROSTER_PAGE_SIZE
+        return records
+
+    def record(self, record: Dict[str, Any]) -> None:
+        """Apply a written attendance record to its class roster, if loaded or being built"""
+        if record.get("student_id"):
+            self._track("apply", record)
+
+    def discard(self, record: Dict[str, Any]) -> None:
+        """Remove a deleted attendance record from its class roster, if loaded or being built"""
+        self._track("remove", record)
+
+    def _track(self, action: str, record: Dict[str, Any]) -> None:
+        class_id = str(record.get("class_id"))
+        roster = self.peek(class_id)
+        if roster is not None:
+            if action == "apply":
+                roster.apply(record)
+            else:
+                roster.remove(record)
+        elif class_id in self._building:
+            self._building[class_id].append((action, record))
+
+    def invalidate(self, class_id: Optional[str] = None) -> None:
+        """Drop one class's roster (or all of them)"""
+        self._generation += 1
+        if class_id is None:
+            self._rosters.clear()
+        else:
+            self._rosters.pop(class_id, None)
+
+    def invalidate_course(self, course_id: str) -> None:
+        """Drop the rosters of a course's classes (after enroll / unenroll)"""
+        self._generation += 1
+        for class_id in [cid for cid, roster in self._rosters.items() if roster.course_id == course_id]:
+            del self._rosters[class_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Loaded rosters and builds"""
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "loaded": len(self._rosters),
+            "building": len(self._building),
+            "builds": self.builds
+        }
+
+
+# ============================================================================
+# INSTANCIA GLOBAL
+# ============================================================================
+
+_rosters: Optional[AttendanceRosterRegistry] = None
+
+
+def get_attendance_rosters() -> AttendanceRosterRegistry:
+    """Get the process-wide attendance roster registry (Singleton)"""
+    global _rosters
+    if _rosters is None:
+        _rosters = AttendanceRosterRegistry()
+    return _rosters
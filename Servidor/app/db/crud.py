@@ -4,11 +4,16 @@ Abstraction layer for database interactions with pgvector
 """
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
-import json
 import numpy as np
-from supabase import Client
-from app.db.supabase_client import get_supabase
+from supabase import AsyncClient
+from app.db.supabase_client import get_async_supabase
+from app.db.embedding_gallery import get_embedding_gallery, get_course_gallery_cache
+from app.db.emotion_buffer import get_emotion_buffer
+from app.db.attendance_roster import get_attendance_rosters
+from app.db.emotion_scores import encode_emotion_scores, decode_emotion_scores
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.cache import TTLCache
 from app.core.exceptions import (
     StudentNotFoundException,
     DuplicateStudentException,
@@ -16,11 +21,16 @@ from app.core.exceptions import (
 )
 
 
+# Columnas del listado de estudiantes: nunca incluye face_embedding;
+# has_embedding es una columna calculada en la base (migración 008)
+STUDENT_LIST_COLUMNS = "id, student_id, name, email, photo_url, metadata, enrolled_at, is_active, has_embedding"
+
+
 class StudentCRUD:
     """CRUD operations for Student entity"""
     
-    def __init__(self, client: Optional[Client] = None):
-        self.client = client or get_supabase()
+    def __init__(self, client: Optional[AsyncClient] = None):
+        self.client = client or get_async_supabase()
     
     async def create(
         self,
@@ -51,7 +61,7 @@ class StudentCRUD:
         """
         try:
             # Check if student already exists
-            existing = self.client.table("students").select("id").eq("student_id", student_id).execute()
+            existing = await self.client.table("students").select("id").eq("student_id", student_id).execute()
             if existing.data:
                 raise DuplicateStudentException(student_id)
             
@@ -74,7 +84,8 @@ class StudentCRUD:
             }
             
             # Insert
-            response = self.client.table("students").insert(data).execute()
+            response = await self.client.table("students").insert(data).execute()
+            get_embedding_gallery().invalidate()
             logger.info(f"Student {student_id} enrolled successfully")
             return response.data[0]
         
@@ -87,7 +98,7 @@ class StudentCRUD:
     async def find_by_id(self, student_id: str) -> Optional[Dict[str, Any]]:
         """Find student by student_id"""
         try:
-            response = self.client.table("students").select("*").eq("student_id", student_id).execute()
+            response = await self.client.table("students").select("*").eq("student_id", student_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Failed to find student {student_id}: {str(e)}")
@@ -97,26 +108,127 @@ class StudentCRUD:
         self,
         embedding: List[float],
         threshold: float = 0.6,
-        limit: int = 1
+        limit: int = 1,
+        course_id: Optional[str] = None
     ) -> List[Tuple[Dict[str, Any], float]]:
         """
-        Find students by facial embedding similarity using pgvector
+        Find students by facial embedding similarity
+        
+        Searches the in-memory embedding gallery first and falls back to the
+        pgvector RPC if the gallery is disabled or cannot be used.
         
         Args:
             embedding: Query embedding vector
             threshold: Maximum distance threshold
             limit: Maximum number of results
+            course_id: Search only the students enrolled in this course first
         
         Returns:
             List of (student_record, distance) tuples
         """
+        results = await self._search_galleries([embedding], threshold, limit, course_id)
+        if results is not None:
+            return results[0]
+        
+        return await self._find_by_embedding_rpc(embedding, threshold, limit)
+    
+    async def find_by_embeddings(
+        self,
+        embeddings: List[List[float]],
+        threshold: float = 0.6,
+        limit: int = 1,
+        course_id: Optional[str] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Find candidate students for several face embeddings at once
+        
+        With the gallery enabled all queries are answered with a single
+        matrix product; otherwise each embedding goes through the RPC.
+        
+        Args:
+            embeddings: Query embedding vectors (list or (m, dim) array)
+            threshold: Maximum distance threshold
+            limit: Maximum number of candidates per embedding
+            course_id: Search only the students enrolled in this course first
+        
+        Returns:
+            One list of (student_record, distance) tuples per embedding
+        """
+        if len(embeddings) == 0:
+            return []
+        
+        results = await self._search_galleries(embeddings, threshold, limit, course_id)
+        if results is not None:
+            return results
+        
+        return await self._find_by_embeddings_rpc(embeddings, threshold, limit)
+    
+    async def _search_galleries(
+        self,
+        embeddings: List[List[float]],
+        threshold: float,
+        limit: int,
+        course_id: Optional[str]
+    ) -> Optional[List[List[Tuple[Dict[str, Any], float]]]]:
+        """
+        Search the in-memory galleries, course roster first when a course is given
+        
+        Faces still unmatched after searching all students go to the RPC:
+        another instance may have enrolled the student since the last
+        gallery refresh.
+        
+        Returns:
+            Per-embedding results, or None if the galleries cannot be used
+        """
+        if not settings.ENABLE_EMBEDDING_GALLERY:
+            return None
+        try:
+            gallery = get_embedding_gallery()
+            await gallery.ensure_loaded()
+            
+            if not (course_id and settings.ENABLE_COURSE_GALLERY):
+                results = gallery.search_many(embeddings, threshold=threshold, limit=limit)
+                logger.info(f"🔎 Gallery search of {len(embeddings)} face(s) over {gallery.size} students")
+                searched_all = True
+            else:
+                course_gallery = await get_course_gallery_cache().get(course_id)
+                results = course_gallery.search_many(embeddings, threshold=threshold, limit=limit)
+                logger.info(f"🔎 Course {course_id} gallery search of {len(embeddings)} face(s) over {course_gallery.size} students")
+                
+                searched_all = settings.COURSE_GALLERY_GLOBAL_FALLBACK
+                missing = [i for i, matches in enumerate(results) if not matches]
+                if missing and searched_all:
+                    logger.info(f"🔎 {len(missing)} face(s) not in course roster, searching all {gallery.size} students")
+                    fallback = gallery.search_many(np.asarray(embeddings, dtype=np.float32)[missing], threshold=threshold, limit=limit)
+                    for i, matches in zip(missing, fallback):
+                        results[i] = matches
+        except Exception as e:
+            logger.warning(f"Gallery search unavailable, falling back to RPC: {str(e)}")
+            return None
+        
+        # Los fallos son raros: solo esos rostros consultan la base de datos
+        missing = [i for i, matches in enumerate(results) if not matches]
+        if missing and searched_all:
+            logger.info(f"🔎 {len(missing)} face(s) not in the gallery, searching the database")
+            fallback = await self._find_by_embeddings_rpc(np.asarray(embeddings, dtype=np.float32)[missing], threshold, limit)
+            for i, matches in zip(missing, fallback):
+                results[i] = matches
+        return results
+    
+    async def _find_by_embedding_rpc(
+        self,
+        embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Similarity search through the match_students_by_embedding pgvector RPC"""
         try:
             logger.warning(f"🔎 Calling match_students_by_embedding with threshold={threshold}, limit={limit}")
             logger.warning(f"🔎 Embedding dimension: {len(embedding)}")
             
             # Using pgvector's <-> operator for Euclidean distance
             # Note: Supabase Python client might need RPC call for this
-            rpc_result = self.client.rpc(
+            rpc_result = await self.client.rpc(
                 'match_students_by_embedding',
                 {
                     'query_embedding': embedding,
@@ -139,24 +251,97 @@ class StudentCRUD:
             logger.error(f"Failed to search by embedding: {str(e)}")
             return []
     
+    async def _find_by_embeddings_rpc(
+        self,
+        embeddings: List[List[float]],
+        threshold: float,
+        limit: int
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """One match_students_by_embedding RPC call per embedding"""
+        return [
+            await self._find_by_embedding_rpc([float(x) for x in embedding], threshold, limit)
+            for embedding in embeddings
+        ]
+    
     async def list_all(self, active_only: bool = True) -> List[Dict[str, Any]]:
         """List all students"""
         try:
             query = self.client.table("students").select("*")
             if active_only:
                 query = query.eq("is_active", True)
-            response = query.execute()
+            response = await query.execute()
             return response.data
         except Exception as e:
             logger.error(f"Failed to list students: {str(e)}")
             return []
     
+    async def list_page(
+        self,
+        active_only: bool = True,
+        limit: int = 100,
+        after: Optional[Tuple[str, int]] = None,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+        """
+        List one page of students ordered by (enrolled_at, id), without embeddings
+        
+        Args:
+            active_only: Filter only active students
+            limit: Page size
+            after: Keyset cursor (enrolled_at, id) of the last row of the previous page
+            offset: Row offset, only used when no cursor is given
+        
+        Returns:
+            (students, cursor of the next page or None if this is the last one)
+        """
+        try:
+            query = self.client.table("students")\
+                .select(STUDENT_LIST_COLUMNS)\
+                .order("enrolled_at")\
+                .order("id")
+            if active_only:
+                query = query.eq("is_active", True)
+            
+            # Se pide una fila extra para saber si hay página siguiente
+            if after is not None:
+                enrolled_at, last_id = after
+                query = query.or_(
+                    f'enrolled_at.gt."{enrolled_at}",and(enrolled_at.eq."{enrolled_at}",id.gt.{int(last_id)})'
+                ).limit(limit + 1)
+            else:
+                query = query.range(offset, offset + limit)
+            
+            response = await query.execute()
+            rows = response.data or []
+            
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = (rows[-1]["enrolled_at"], rows[-1]["id"])
+            return rows, next_cursor
+        except Exception as e:
+            logger.error(f"Failed to list students page: {str(e)}")
+            raise DatabaseConnectionException(f"List failed: {str(e)}")
+    
+    async def count(self, active_only: bool = True) -> int:
+        """Count students without transferring any rows"""
+        try:
+            query = self.client.table("students").select("id", count="exact", head=True)
+            if active_only:
+                query = query.eq("is_active", True)
+            response = await query.execute()
+            return response.count or 0
+        except Exception as e:
+            logger.error(f"Failed to count students: {str(e)}")
+            raise DatabaseConnectionException(f"Count failed: {str(e)}")
+    
     async def update(self, student_id: str, **kwargs) -> Dict[str, Any]:
         """Update student record"""
         try:
-            response = self.client.table("students").update(kwargs).eq("student_id", student_id).execute()
+            response = await self.client.table("students").update(kwargs).eq("student_id", student_id).execute()
             if not response.data:
                 raise StudentNotFoundException(student_id)
+            get_embedding_gallery().invalidate()
             return response.data[0]
         except StudentNotFoundException:
             raise
@@ -178,8 +363,8 @@ class StudentCRUD:
 class AttendanceCRUD:
     """CRUD operations for Attendance records"""
     
-    def __init__(self, client: Optional[Client] = None):
-        self.client = client or get_supabase()
+    def __init__(self, client: Optional[AsyncClient] = None):
+        self.client = client or get_async_supabase()
     
     async def check_attendance_exists(
         self,
@@ -197,7 +382,7 @@ class AttendanceCRUD:
             Existing attendance record if found, None otherwise
         """
         try:
-            response = self.client.table("attendance")\
+            response = await self.client.table("attendance")\
                 .select("*")\
                 .eq("student_id", student_id)\
                 .eq("class_id", class_id)\
@@ -216,42 +401,163 @@ class AttendanceCRUD:
         class_id: str,
         status: str = "present",
         confidence: Optional[float] = None,
-        match_distance: Optional[float] = None
+        match_distance: Optional[float] = None,
+        period: int = 1,
+        verification_method: str = "facial",
+        overwrite: bool = False
     ) -> Dict[str, Any]:
-        """Mark attendance for a student (only once per class)"""
+        """
+        Mark attendance for a student (only once per class and period)
+        
+        One upsert_attendance RPC inserts the row or returns the existing
+        one; the unique index on (student_id, class_id, period) arbitrates
+        concurrent submissions. With overwrite=True an existing row gets the
+        new status instead (manual attendance). Every written row is applied
+        to the class roster, which is never used to answer duplicates: it
+        lives in one process and would miss deletes served by another one.
+        
+        Returns:
+            Attendance record with "already_registered"
+        """
+        result = await self._upsert_attendance(
+            student_id, class_id, status, confidence, match_distance, period, verification_method, overwrite
+        )
+        get_attendance_rosters().record(result)
+        
+        if result["already_registered"]:
+            logger.info(f"Attendance already exists for {student_id} in {class_id} (period {period})")
+        else:
+            logger.info(f"Attendance marked for {student_id} in {class_id} (period {period})")
+        return result
+    
+    async def _upsert_attendance(
+        self,
+        student_id: str,
+        class_id: str,
+        status: str,
+        confidence: Optional[float],
+        match_distance: Optional[float],
+        period: int,
+        verification_method: str,
+        overwrite: bool
+    ) -> Dict[str, Any]:
+        """upsert_attendance RPC: the inserted or existing row, with already_registered"""
         try:
-            # Check if attendance already exists for this student in this class
-            existing_attendance = await self.check_attendance_exists(student_id, class_id)
-            
-            if existing_attendance:
-                logger.info(f"Attendance already exists for {student_id} in {class_id}")
-                # Return the existing record with a flag indicating it was already registered
-                existing_attendance["already_registered"] = True
-                return existing_attendance
-            
-            data = {
-                "student_id": student_id,
-                "class_id": class_id,
-                "status": status,
-                "confidence": confidence,
-                "match_distance": match_distance,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            response = await self.client.rpc(
+                "upsert_attendance",
+                {
+                    "p_student_id": student_id,
+                    "p_class_id": class_id,
+                    "p_period": period,
+                    "p_status": status,
+                    "p_confidence": confidence,
+                    "p_match_distance": match_distance,
+                    "p_verification_method": verification_method,
+                    "p_overwrite": overwrite
+                }
+            ).execute()
             
-            response = self.client.table("attendance").insert(data).execute()
-            logger.info(f"Attendance marked for {student_id} in {class_id}")
-            result = response.data[0]
-            result["already_registered"] = False
+            item = response.data[0]
+            result = item["row_data"]
+            result["already_registered"] = item["already_registered"]
             return result
         
         except Exception as e:
             logger.error(f"Failed to mark attendance: {str(e)}")
             raise DatabaseConnectionException(f"Attendance marking failed: {str(e)}")
     
+    async def mark_attendance_bulk(
+        self,
+        class_id: str,
+        entries: List[Dict[str, Any]],
+        period: int = 1,
+        verification_method: str = "facial"
+    ) -> List[Dict[str, Any]]:
+        """
+        Mark attendance for several students of one class
+        
+        Every entry goes to the database in one bulk upsert; the written
+        rows are applied to the class roster.
+        
+        Args:
+            class_id: Class session identifier
+            entries: Dicts with student_id, status, confidence and match_distance
+            period: Class period the attendance belongs to
+            verification_method: 'facial', 'qr' or 'manual'
+        
+        Returns:
+            One attendance record per entry (same order), each with "already_registered"
+        """
+        if not entries:
+            return []
+        
+        written = await self._upsert_attendance_bulk(class_id, entries, period, verification_method)
+        rosters = get_attendance_rosters()
+        for record in written:
+            rosters.record(record)
+        return written
+    
+    async def _upsert_attendance_bulk(
+        self,
+        class_id: str,
+        entries: List[Dict[str, Any]],
+        period: int,
+        verification_method: str
+    ) -> List[Dict[str, Any]]:
+        """
+        One insert that skips (student_id, class_id, period) conflicts; the
+        rows that already existed are fetched with a second query only when
+        there are any
+        """
+        try:
+            timestamp = datetime.utcnow().isoformat()
+            rows = [
+                {
+                    "student_id": entry["student_id"],
+                    "class_id": class_id,
+                    "period": period,
+                    "status": entry.get("status", "present"),
+                    "confidence": entry.get("confidence"),
+                    "match_distance": entry.get("match_distance"),
+                    "verification_method": verification_method,
+                    "timestamp": timestamp
+                }
+                for entry in entries
+            ]
+            response = await self.client.table("attendance")\
+                .upsert(rows, on_conflict="student_id,class_id,period", ignore_duplicates=True)\
+                .execute()
+            inserted = {row["student_id"]: row for row in (response.data or [])}
+            
+            existing = {}
+            missing = [entry["student_id"] for entry in entries if entry["student_id"] not in inserted]
+            if missing:
+                response = await self.client.table("attendance")\
+                    .select("*")\
+                    .eq("class_id", class_id)\
+                    .eq("period", period)\
+                    .in_("student_id", missing)\
+                    .execute()
+                existing = {row["student_id"]: row for row in (response.data or [])}
+            logger.info(f"Bulk attendance for {class_id}: {len(inserted)} new, {len(existing)} already registered")
+            
+            records = []
+            for entry in entries:
+                student_id = entry["student_id"]
+                if student_id in inserted:
+                    records.append({**inserted[student_id], "already_registered": False})
+                else:
+                    records.append({**existing.get(student_id, {}), "already_registered": True})
+            return records
+        
+        except Exception as e:
+            logger.error(f"Failed to mark bulk attendance: {str(e)}")
+            raise DatabaseConnectionException(f"Bulk attendance marking failed: {str(e)}")
+    
     async def get_class_attendance(self, class_id: str) -> List[Dict[str, Any]]:
         """Get all attendance records for a class"""
         try:
-            response = self.client.table("attendance").select("*").eq("class_id", class_id).execute()
+            response = await self.client.table("attendance").select("*").eq("class_id", class_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Failed to get attendance for {class_id}: {str(e)}")
@@ -261,8 +567,8 @@ class AttendanceCRUD:
 class EmotionEventCRUD:
     """CRUD operations for Emotion events"""
     
-    def __init__(self, client: Optional[Client] = None):
-        self.client = client or get_supabase()
+    def __init__(self, client: Optional[AsyncClient] = None):
+        self.client = client or get_async_supabase()
     
     async def record_emotion(
         self,
@@ -274,22 +580,61 @@ class EmotionEventCRUD:
     ) -> Dict[str, Any]:
         """Record emotion detection event"""
         try:
-            data = {
-                "student_id": student_id,
-                "class_id": class_id,
-                "dominant_emotion": dominant_emotion,
-                "confidence": confidence,
-                "emotion_scores": json.dumps(emotion_scores) if emotion_scores else None,
-                "detected_at": datetime.utcnow().isoformat()
-            }
+            data = self._build_row(student_id, class_id, dominant_emotion, confidence, emotion_scores)
             
-            response = self.client.table("emotion_events").insert(data).execute()
+            response = await self.client.table("emotion_events").insert(data).execute()
             return response.data[0]
         
         except Exception as e:
             logger.error(f"Failed to record emotion: {str(e)}")
             raise DatabaseConnectionException(f"Emotion recording failed: {str(e)}")
     
+    async def enqueue_emotion(
+        self,
+        student_id: str,
+        class_id: str,
+        dominant_emotion: str,
+        confidence: float,
+        emotion_scores: Optional[Dict[str, float]] = None
+    ) -> bool:
+        """
+        Record an emotion event through the write-behind buffer
+        
+        The row is inserted later together with others; if the buffer is
+        disabled or full it is inserted right away instead.
+        
+        Returns:
+            True if queued, False if written directly
+        """
+        data = self._build_row(student_id, class_id, dominant_emotion, confidence, emotion_scores)
+        if get_emotion_buffer().enqueue(data):
+            return True
+        
+        try:
+            await self.client.table("emotion_events").insert(data, returning="minimal").execute()
+            return False
+        except Exception as e:
+            logger.error(f"Failed to record emotion: {str(e)}")
+            raise DatabaseConnectionException(f"Emotion recording failed: {str(e)}")
+    
+    @staticmethod
+    def _build_row(
+        student_id: str,
+        class_id: str,
+        dominant_emotion: str,
+        confidence: float,
+        emotion_scores: Optional[Dict[str, float]]
+    ) -> Dict[str, Any]:
+        """emotion_events row for one detection"""
+        return {
+            "student_id": student_id,
+            "class_id": class_id,
+            "dominant_emotion": dominant_emotion,
+            "confidence": confidence,
+            "emotion_scores": encode_emotion_scores(emotion_scores),
+            "detected_at": datetime.utcnow().isoformat()
+        }
+    
     async def get_class_emotions(
         self,
         class_id: str,
@@ -305,8 +650,164 @@ class EmotionEventCRUD:
             if end_time:
                 query = query.lte("detected_at", end_time.isoformat())
             
-            response = query.execute()
+            response = await query.execute()
             return response.data
         except Exception as e:
             logger.error(f"Failed to get emotions for {class_id}: {str(e)}")
             return []
+    
+    async def get_class_score_matrix(
+        self,
+        class_id: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """
+        Emotion events of a class, newest first, with their scores decoded
+        
+        Returns:
+            (rows without emotion_scores, (n, 7) float32 matrix in EMOTION_SCORE_ORDER)
+        """
+        try:
+            query = self.client.table("emotion_events").select("*").eq("class_id", class_id)
+            
+            if start_time:
+                query = query.gte("detected_at", start_time.isoformat())
+            if end_time:
+                query = query.lte("detected_at", end_time.isoformat())
+            
+            response = await query.order("detected_at", desc=True).execute()
+            rows = response.data or []
+            matrix = decode_emotion_scores([row.pop("emotion_scores", None) for row in rows])
+            return rows, matrix
+        except Exception as e:
+            logger.error(f"Failed to get emotion scores for {class_id}: {str(e)}")
+            raise DatabaseConnectionException(f"Emotion query failed: {str(e)}")
+
+    async def get_class_summary(
+        self,
+        class_id: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Per-emotion totals of a class from the per-minute rollup
+        
+        Returns:
+            Rows with dominant_emotion, event_count and confidence_sum
+        """
+        try:
+            response = await self.client.rpc("get_class_emotion_summary", {
+                "p_class_id": class_id,
+                "p_start": start_time.isoformat() if start_time else None,
+                "p_end": end_time.isoformat() if end_time else None
+            }).execute()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Failed to get emotion summary for {class_id}: {str(e)}")
+            raise DatabaseConnectionException(f"Emotion summary failed: {str(e)}")
+    
+    async def get_timeline(
+        self,
+        class_id: str,
+        student_id: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Per-minute, per-emotion counts of a class (or one student) from the rollup
+        
+        Returns:
+            Rows with minute, dominant_emotion, event_count and confidence_sum, oldest first
+        """
+        try:
+            query = self.client.rpc("get_emotion_timeline", {
+                "p_class_id": class_id,
+                "p_student_id": student_id,
+                "p_start": start_time.isoformat() if start_time else None,
+                "p_end": end_time.isoformat() if end_time else None
+            })
+            if limit:
+                query = query.limit(limit)
+            response = await query.execute()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Failed to get emotion timeline for {class_id}: {str(e)}")
+            raise DatabaseConnectionException(f"Emotion timeline failed: {str(e)}")
+
+
+# Filas de class_sessions por class_id, compartidas por todos los servicios;
+# /classes las invalida al crear, actualizar, finalizar o eliminar una clase
+class_session_cache = TTLCache(
+    ttl_seconds=settings.CLASS_SESSION_CACHE_SECONDS,
+    max_entries=2048,
+    name="class_sessions"
+)
+
+
+def invalidate_class_session(class_id: Optional[str] = None) -> None:
+    """Drop one cached class session (or all of them) after a write"""
+    class_session_cache.invalidate(class_id)
+
+
+class ClassSessionCRUD:
+    """Read operations for Class sessions"""
+    
+    def __init__(self, client: Optional[AsyncClient] = None):
+        self.client = client or get_async_supabase()
+    
+    async def get(self, class_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a class session row by class_id
+        
+        Reads through class_session_cache (CLASS_SESSION_CACHE_SECONDS, 0 = no
+        cache). The returned row is shared: callers must not modify it.
+        """
+        try:
+            if settings.CLASS_SESSION_CACHE_SECONDS <= 0:
+                return await self._fetch(class_id)
+            return await class_session_cache.get_or_load(class_id, lambda: self._fetch(class_id))
+        except Exception as e:
+            logger.error(f"Failed to get class session {class_id}: {str(e)}")
+            return None
+    
+    async def _fetch(self, class_id: str) -> Optional[Dict[str, Any]]:
+        """Class session row straight from the database (errors propagate, so they are not cached)"""
+        response = await self.client.table("class_sessions")\
+            .select("*")\
+            .eq("class_id", class_id)\
+            .execute()
+        return response.data[0] if response.data else None
+
+
+# ============================================================================
+# SELECCIÓN DE BACKEND (DB_BACKEND: "rest" = PostgREST, "postgres" = asyncpg)
+# ============================================================================
+
+def _use_postgres() -> bool:
+    return settings.DB_BACKEND == "postgres"
+
+
+def get_student_crud() -> StudentCRUD:
+    """StudentCRUD for the configured database backend"""
+    if _use_postgres():
+        from app.db.pg_crud import PgStudentCRUD
+        return PgStudentCRUD()
+    return StudentCRUD()
+
+
+def get_attendance_crud() -> AttendanceCRUD:
+    """AttendanceCRUD for the configured database backend"""
+    if _use_postgres():
+        from app.db.pg_crud import PgAttendanceCRUD
+        return PgAttendanceCRUD()
+    return AttendanceCRUD()
+
+
+def get_class_session_crud() -> ClassSessionCRUD:
+    """ClassSessionCRUD for the configured database backend"""
+    if _use_postgres():
+        from app.db.pg_crud import PgClassSessionCRUD
+        return PgClassSessionCRUD()
+    return ClassSessionCRUD()
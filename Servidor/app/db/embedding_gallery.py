@@ -0,0 +1,372 @@
+"""
+Smart Classroom AI - In-Memory Embedding Gallery
+Vectorized face matching against all active students without a pgvector round trip
+"""
+import asyncio
+import json
+import time
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.constants import DistanceMetric
+
+
+# PostgREST devuelve como máximo 1000 filas por petición
+GALLERY_PAGE_SIZE = 1000
+
+
+def parse_embedding(value: Any) -> Optional[np.ndarray]:
+    """
+    Convert a face_embedding column value into a float32 vector
+
+    pgvector columns come back from PostgREST as strings ("[0.1,0.2,...]"),
+    but lists are accepted too so rows built in Python work the same way.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    vector = np.asarray(value, dtype=np.float32)
+    if vector.ndim != 1 or vector.size == 0:
+        return None
+    return vector
+
+
+class EmbeddingGallery:
+    """
+    Contiguous float32 matrix of student embeddings plus a parallel id array
+
+    A query is answered with one matrix-vector product over the whole gallery,
+    so verifying a student costs microseconds instead of a network round trip.
+    """
+
+    def __init__(self, client: Optional[AsyncClient] = None, metric: Optional[str] = None):
+        self._client = client
+        self.metric = metric or settings.DISTANCE_METRIC
+        self.refresh_seconds = settings.GALLERY_REFRESH_SECONDS
+
+        self._ids: np.ndarray = np.empty(0, dtype=object)
+        self._matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._norms: np.ndarray = np.empty(0, dtype=np.float32)
+        self._students: List[Dict[str, Any]] = []
+
+        self._loaded_at: Optional[float] = None
+        self._dirty = True
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        # Se incrementa en cada carga; las sub-galerías por curso lo usan para detectar recargas
+        self.version = 0
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            from app.db.supabase_client import get_async_supabase
+            self._client = get_async_supabase()
+        return self._client
+
+    @property
+    def size(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dimension(self) -> int:
+        return self._matrix.shape[1] if self._matrix.ndim == 2 else 0
+
+    def is_stale(self) -> bool:
+        """Check whether the gallery must be rebuilt before the next search"""
+        if self._dirty or self._loaded_at is None:
+            return True
+        return (time.monotonic() - self._loaded_at) > self.refresh_seconds
+
+    def invalidate(self) -> None:
+        """Mark the gallery for reload (call after enroll, photo update or delete)"""
+        self._dirty = True
+        self._generation += 1
+
+    def load(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Build the gallery from student rows (each including face_embedding)
+
+        Rows without a usable embedding, or whose dimension differs from the
+        majority, are skipped.
+
+        Returns:
+            Number of students loaded
+        """
+        vectors = []
+        students = []
+        for row in rows:
+            try:
+                vector = parse_embedding(row.get("face_embedding"))
+            except (ValueError, TypeError):
+                vector = None
+            if vector is None:
+                continue
+            vectors.append(vector)
+            students.append({k: v for k, v in row.items() if k != "face_embedding"})
+
+        if vectors:
+            dims = [v.size for v in vectors]
+            dimension = max(set(dims), key=dims.count)
+            keep = [i for i, d in enumerate(dims) if d == dimension]
+            if len(keep) != len(vectors):
+                logger.warning(f"Gallery: skipped {len(vectors) - len(keep)} embeddings with dimension != {dimension}")
+            matrix = np.ascontiguousarray(np.stack([vectors[i] for i in keep]), dtype=np.float32)
+            students = [students[i] for i in keep]
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+
+        norms = np.linalg.norm(matrix, axis=1) if matrix.size else np.empty(0, dtype=np.float32)
+        if self.metric in (DistanceMetric.COSINE.value, DistanceMetric.EUCLIDEAN_L2.value) and matrix.size:
+            # Pre-normalize so cosine / euclidean_l2 reduce to a single dot product
+            matrix = np.ascontiguousarray(matrix / np.maximum(norms, 1e-12)[:, None], dtype=np.float32)
+            norms = np.ones(len(matrix), dtype=np.float32)
+        else:
+            # Squared norms for the ||x||² - 2x·q + ||q||² expansion
+            norms = (norms.astype(np.float32) ** 2)
+
+        self._matrix = matrix
+        self._norms = norms
+        self._students = students
+        self._ids = np.array([s.get("student_id") for s in students], dtype=object)
+        self._loaded_at = time.monotonic()
+        self._dirty = False
+        self.version += 1
+        return len(students)
+
+    def subset(self, student_ids: Iterable[str]) -> "EmbeddingGallery":
+        """
+        Build a gallery restricted to the given students from the rows already in memory
+
+        No database access: rows are sliced out of this gallery's matrix.
+        """
+        wanted = set(student_ids)
+        indices = np.array([i for i, sid in enumerate(self._ids) if sid in wanted], dtype=np.intp)
+
+        sub = EmbeddingGallery(client=self._client, metric=self.metric)
+        if indices.size:
+            sub._matrix = np.ascontiguousarray(self._matrix[indices])
+            sub._norms = self._norms[indices]
+        sub._ids = self._ids[indices]
+        sub._students = [self._students[i] for i in indices]
+        sub._loaded_at = time.monotonic()
+        sub._dirty = False
+        sub.version = self.version
+        return sub
+
+    async def refresh(self) -> int:
+        """Reload all active students' embeddings from the database"""
+        generation = self._generation
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            response = await self.client.table("students")\
+                .select("*")\
+                .eq("is_active", True)\
+                .order("id")\
+                .range(start, start + GALLERY_PAGE_SIZE - 1)\
+                .execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < GALLERY_PAGE_SIZE:
+                break
+            start += GALLERY_PAGE_SIZE
+
+        loaded = self.load(rows)
+        if self._generation != generation:
+            # Invalidada mientras se consultaba: la próxima búsqueda recarga
+            self._dirty = True
+        logger.info(f"🧠 Embedding gallery loaded: {loaded} students, dim={self.dimension}, metric={self.metric}")
+        return loaded
+
+    async def ensure_loaded(self) -> None:
+        """Reload the gallery if it is empty, invalidated or older than the TTL"""
+        if not self.is_stale():
+            return
+        async with self._lock:
+            if self.is_stale():
+                await self.refresh()
+
+    def distance_matrix(self, embeddings: Any) -> np.ndarray:
+        """
+        Distance from each query to every student in the gallery
+        
+        Args:
+            embeddings: One embedding or an (m, dim) matrix of embeddings
+        
+        Returns:
+            (m, n_students) distance matrix computed with a single matrix product
+        """
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if queries.ndim != 2 or queries.shape[1] != self.dimension:
+            raise ValueError(f"Query dimension {queries.shape[-1]} does not match gallery dimension {self.dimension}")
+
+        if self.metric in (DistanceMetric.COSINE.value, DistanceMetric.EUCLIDEAN_L2.value):
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1), 1e-12)[:, None]
+            dots = queries @ self._matrix.T
+            if self.metric == DistanceMetric.COSINE.value:
+                return 1.0 - dots
+            return np.sqrt(np.maximum(2.0 - 2.0 * dots, 0.0))
+
+        squared = self._norms[None, :] - 2.0 * (queries @ self._matrix.T) + np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def distances(self, embedding: List[float]) -> np.ndarray:
+        """Distance from one query to every student in the gallery"""
+        return self.distance_matrix(embedding)[0]
+
+    def _top_k(self, distances: np.ndarray, threshold: float, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Closest students under the threshold for one row of distances"""
+        candidates = np.flatnonzero(distances < threshold)
+        if candidates.size > limit:
+            candidates = candidates[np.argpartition(distances[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(dict(self._students[i]), float(distances[i])) for i in candidates]
+
+    def search(
+        self,
+        embedding: List[float],
+        threshold: float = 0.6,
+        limit: int = 1
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Find the closest students to an embedding
+
+        Args:
+            embedding: Query embedding vector
+            threshold: Maximum distance threshold
+            limit: Maximum number of results
+
+        Returns:
+            List of (student_record, distance) tuples, closest first
+        """
+        if self.size == 0 or limit <= 0:
+            return []
+        return self._top_k(self.distances(embedding), threshold, limit)
+
+    def search_many(
+        self,
+        embeddings: List[List[float]],
+        threshold: float = 0.6,
+        limit: int = 1
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Find the closest students for several embeddings at once
+
+        Returns:
+            One search() result list per query embedding
+        """
+        if len(embeddings) == 0:
+            return []
+        if self.size == 0 or limit <= 0:
+            return [[] for _ in embeddings]
+        matrix = self.distance_matrix(embeddings)
+        return [self._top_k(row, threshold, limit) for row in matrix]
+
+
+class CourseGalleryCache:
+    """
+    Per-course sub-galleries with only the students enrolled in that course
+
+    Sub-galleries are sliced from the global gallery, so building one costs a
+    single enrollments query. They are rebuilt when the course is invalidated
+    (enroll / unenroll) or when the global gallery reloads. A sub-gallery
+    whose course was invalidated while it was being built is used once and
+    not cached.
+    """
+
+    def __init__(self, gallery: Optional[EmbeddingGallery] = None, client: Optional[AsyncClient] = None):
+        self._gallery = gallery
+        self._client = client
+        self._courses: Dict[str, EmbeddingGallery] = {}
+        self._generations: Dict[str, int] = {}
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def gallery(self) -> EmbeddingGallery:
+        if self._gallery is None:
+            self._gallery = get_embedding_gallery()
+        return self._gallery
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            from app.db.supabase_client import get_async_supabase
+            self._client = get_async_supabase()
+        return self._client
+
+    def invalidate(self, course_id: Optional[str] = None) -> None:
+        """Drop one course's sub-gallery (or all of them)"""
+        if course_id is None:
+            self._generation += 1
+            self._courses.clear()
+        else:
+            self._generations[course_id] = self._generations.get(course_id, 0) + 1
+            self._courses.pop(course_id, None)
+
+    def _course_generation(self, course_id: str) -> Tuple[int, int]:
+        return self._generation, self._generations.get(course_id, 0)
+
+    async def _fetch_enrolled_ids(self, course_id: str) -> List[str]:
+        """Student ids enrolled in a course"""
+        student_ids: List[str] = []
+        start = 0
+        while True:
+            response = await self.client.table("enrollments")\
+                .select("student_id")\
+                .eq("course_id", course_id)\
+                .order("id")\
+                .range(start, start + GALLERY_PAGE_SIZE - 1)\
+                .execute()
+            page = response.data or []
+            student_ids.extend(row["student_id"] for row in page)
+            if len(page) < GALLERY_PAGE_SIZE:
+                break
+            start += GALLERY_PAGE_SIZE
+        return student_ids
+
+    async def get(self, course_id: str) -> EmbeddingGallery:
+        """Get the sub-gallery of a course, building it if missing or outdated"""
+        await self.gallery.ensure_loaded()
+        cached = self._courses.get(course_id)
+        if cached is not None and cached.version == self.gallery.version:
+            return cached
+
+        async with self._lock:
+            cached = self._courses.get(course_id)
+            if cached is not None and cached.version == self.gallery.version:
+                return cached
+            generation = self._course_generation(course_id)
+            student_ids = await self._fetch_enrolled_ids(course_id)
+            sub = self.gallery.subset(student_ids)
+            if self._course_generation(course_id) == generation:
+                self._courses[course_id] = sub
+            logger.info(f"🧠 Course gallery {course_id}: {sub.size}/{len(student_ids)} enrolled students with embeddings")
+            return sub
+
+
+# ============================================================================
+# INSTANCIA GLOBAL
+# ============================================================================
+
+_gallery: Optional[EmbeddingGallery] = None
+_course_galleries: Optional[CourseGalleryCache] = None
+
+
+def get_embedding_gallery() -> EmbeddingGallery:
+    """Get the process-wide embedding gallery (Singleton)"""
+    global _gallery
+    if _gallery is None:
+        _gallery = EmbeddingGallery()
+    return _gallery
+
+
+def get_course_gallery_cache() -> CourseGalleryCache:
+    """Get the process-wide per-course gallery cache (Singleton)"""
+    global _course_galleries
+    if _course_galleries is None:
+        _course_galleries = CourseGalleryCache()
+    return _course_galleries
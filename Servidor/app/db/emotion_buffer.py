@@ -0,0 +1,274 @@
+"""
+Smart Classroom AI - Emotion Event Write-Behind Buffer
+Batches emotion_events rows in memory and writes them as multi-row inserts
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import numpy as np
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.logger import logger
+
+
+def _is_data_error(error: Exception) -> bool:
+    """
+    True if the database rejected the row itself (SQLSTATE class 22 data
+    exception or 23 integrity violation, e.g. an unknown student_id).
+    Retrying such a row cannot succeed; any other error (timeout, connection,
+    5xx) means the row should be kept and retried.
+    """
+    code = str(getattr(error, "code", "") or "")
+    return code[:2] in ("22", "23")
+
+
+class EmotionEventBuffer:
+    """
+    In-process write-behind queue for emotion_events
+
+    Requests enqueue rows and return immediately. A background task flushes
+    them with one INSERT per batch when ``batch_size`` rows are pending or
+    ``flush_seconds`` have passed, and stop() drains whatever is left.
+    Batches that fail because the database is unreachable go back to the
+    front of the queue; only rows the database rejects are dropped.
+    Once ``max_pending`` rows are waiting, enqueue() refuses new rows so the
+    caller falls back to a direct insert (backpressure instead of unbounded
+    memory).
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncClient] = None,
+        batch_size: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        latency_window: int = 256
+    ):
+        self._client = client
+        self.batch_size = batch_size or settings.EMOTION_BUFFER_BATCH_SIZE
+        self.flush_seconds = flush_seconds or settings.EMOTION_BUFFER_FLUSH_SECONDS
+        self.max_pending = max_pending or settings.EMOTION_BUFFER_MAX_PENDING
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+        # Metrics
+        self._enqueued = 0
+        self._rejected = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._high_water = 0
+        self._batch_sizes = deque(maxlen=latency_window)
+        self._flush_latencies = deque(maxlen=latency_window)
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            from app.db.supabase_client import get_async_supabase
+            self._client = get_async_supabase()
+        return self._client
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ENABLE_EMOTION_BUFFER
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start the background flush task (needs a running event loop)"""
+        if not self.enabled or self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"📝 Emotion buffer started (batch={self.batch_size}, "
+            f"every {self.flush_seconds}s, max_pending={self.max_pending})"
+        )
+
+    async def stop(self) -> None:
+        """
+        Stop the flush task and write every pending row (call at shutdown)
+
+        The task is not cancelled: it finishes the flush in progress and
+        exits, then the remaining rows are drained here.
+        """
+        self._stopping = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        try:
+            while self._pending:
+                await self.flush()
+        except Exception as e:
+            logger.error(f"Emotion buffer could not drain {len(self._pending)} rows at shutdown: {str(e)}")
+        logger.info(f"Emotion buffer stopped ({self._written} rows written, {self._dropped} dropped)")
+
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """
+        Queue one emotion_events row for insertion
+
+        Returns:
+            False if the buffer is disabled or full; the caller must write the row itself
+        """
+        if not self.enabled or self._stopping:
+            return False
+        if not self.running:
+            self.start()
+        if len(self._pending) >= self.max_pending:
+            self._rejected += 1
+            return False
+
+        self._pending.append(row)
+        self._enqueued += 1
+        self._high_water = max(self._high_water, len(self._pending))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def _run(self) -> None:
+        """
+        Flush on size (wakeup event) or time threshold, whichever comes first
+
+        A failed flush (database unreachable) is retried on the next
+        interval, so an outage does not turn into a busy loop.
+        """
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while self._pending:
+                    await self.flush()
+                    if len(self._pending) < self.batch_size:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Emotion buffer flush loop error: {str(e)}")
+
+    async def flush(self) -> int:
+        """
+        Write up to ``batch_size`` pending rows in a single INSERT
+
+        If the database rejects the batch (e.g. one row violates the student
+        foreign key) the rows are retried one by one and only the rejected
+        ones are dropped. On any other error, or if the flush is cancelled,
+        the unwritten rows go back to the front of the queue and the error
+        is raised.
+
+        Returns:
+            Number of rows written
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch: List[Dict[str, Any]] = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popleft())
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            self._flushes += 1
+            try:
+                await self.client.table("emotion_events").insert(batch, returning="minimal").execute()
+                written = len(batch)
+                self._written += written
+            except asyncio.CancelledError:
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                self._failed_flushes += 1
+                if not _is_data_error(e):
+                    self._requeue(batch)
+                    logger.warning(f"Emotion batch insert of {len(batch)} rows failed, kept for retry: {str(e)}")
+                    raise
+                logger.warning(f"Emotion batch insert of {len(batch)} rows failed, retrying row by row: {str(e)}")
+                written = await self._insert_rows(batch)
+
+            self._batch_sizes.append(len(batch))
+            self._flush_latencies.append(time.perf_counter() - start)
+            return written
+
+    async def _insert_rows(self, batch: List[Dict[str, Any]]) -> int:
+        """Insert a rejected batch row by row, dropping only the rows the database rejects"""
+        written = 0
+        for index, row in enumerate(batch):
+            try:
+                await self.client.table("emotion_events").insert(row, returning="minimal").execute()
+                written += 1
+                self._written += 1
+            except asyncio.CancelledError:
+                self._requeue(batch[index:])
+                raise
+            except Exception as row_error:
+                if not _is_data_error(row_error):
+                    self._requeue(batch[index:])
+                    raise
+                self._dropped += 1
+                logger.error(
+                    f"Dropped emotion event for {row.get('student_id')} in {row.get('class_id')}: {str(row_error)}"
+                )
+        return written
+
+    def _requeue(self, rows: List[Dict[str, Any]]) -> None:
+        """Put unwritten rows back at the front of the queue, in their original order"""
+        self._pending.extendleft(reversed(rows))
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, backpressure and flush latency metrics"""
+        latencies = np.array(self._flush_latencies, dtype=np.float64)
+        has_samples = latencies.size > 0
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "utilization": round(len(self._pending) / self.max_pending, 3) if self.max_pending else None,
+            "high_water": self._high_water,
+            "enqueued": self._enqueued,
+            "rejected": self._rejected,
+            "written": self._written,
+            "dropped": self._dropped,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "avg_batch_size": round(float(np.mean(self._batch_sizes)), 1) if self._batch_sizes else None,
+            "flush_latency_ms": {
+                "samples": int(latencies.size),
+                "avg": round(float(latencies.mean()) * 1000, 1) if has_samples else None,
+                "p95": round(float(np.percentile(latencies, 95)) * 1000, 1) if has_samples else None,
+                "max": round(float(latencies.max()) * 1000, 1) if has_samples else None
+            }
+        }
+
+
+# ============================================================================
+# INSTANCIA GLOBAL
+# ============================================================================
+
+_emotion_buffer: Optional[EmotionEventBuffer] = None
+
+
+def get_emotion_buffer() -> EmotionEventBuffer:
+    """Get the process-wide emotion event buffer (Singleton)"""
+    global _emotion_buffer
+    if _emotion_buffer is None:
+        _emotion_buffer = EmotionEventBuffer()
+    return _emotion_buffer
@@ -0,0 +1,327 @@
+"""
+Smart Classroom AI - Emotion Events Maintenance
+Keeps the monthly emotion_events partitions ahead of time and archives/drops
+the months older than the retention period
+"""
+import asyncio
+import gzip
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.logger import logger
+
+
+# Duración del lease de mantenimiento (se renueva antes de cada partición)
+LEASE_SECONDS = 3600
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Partition bound as returned by PostgREST ('2026-03-01T00:00:00')"""
+    return datetime.fromisoformat(value.replace("Z", "").replace(" ", "T"))
+
+
+def _partition_name(table_name: str) -> str:
+    """emotion_events_detached_p202603 -> emotion_events_p202603"""
+    return table_name.replace("emotion_events_detached_p", "emotion_events_p")
+
+
+def retention_cutoff(now: datetime, retention_months: int) -> datetime:
+    """First instant that must be kept: start of the current month minus the retention"""
+    month_index = now.year * 12 + (now.month - 1) - retention_months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+class EmotionRetentionTask:
+    """
+    Periodic maintenance of the partitioned emotion_events table
+
+    Every run:
+    1. creates the partitions of the next ``months_ahead`` months (and of
+       the months with rows in the DEFAULT partition)
+    2. detaches each month that ended before the retention cutoff
+       (detach_emotion_partition re-summarizes it into emotion_minute_rollup
+       first), so no row can reach it any more
+    3. exports every detached month to ``<archive_dir>/<partition>.ndjson.gz``
+       and drops it only if the table still has the archived row count.
+       Months detached by an interrupted run are picked up here too.
+
+    Steps 2 and 3 only run when both the retention and the archive dir are
+    configured, and only on the instance holding the
+    emotion_maintenance_lease (migration 015).
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncClient] = None,
+        retention_months: Optional[int] = None,
+        months_ahead: Optional[int] = None,
+        archive_dir: Optional[str] = None,
+        interval_hours: Optional[float] = None,
+        page_size: int = 1000
+    ):
+        self._client = client
+        self.retention_months = settings.EMOTION_RETENTION_MONTHS if retention_months is None else retention_months
+        self.months_ahead = settings.EMOTION_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+        self.archive_dir = archive_dir or settings.EMOTION_ARCHIVE_DIR
+        self.interval_hours = interval_hours or settings.EMOTION_MAINTENANCE_HOURS
+        self.page_size = page_size
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._task: Optional[asyncio.Task] = None
+        self._run_lock: Optional[asyncio.Lock] = None
+
+        # Metrics
+        self._runs = 0
+        self._failed_runs = 0
+        self._partitions_created = 0
+        self._partitions_dropped = 0
+        self._rows_archived = 0
+        self._last_run: Optional[datetime] = None
+        self._last_duration: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._partitions: List[Dict[str, Any]] = []
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            from app.db.supabase_client import get_async_supabase
+            self._client = get_async_supabase()
+        return self._client
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ENABLE_EMOTION_MAINTENANCE
+
+    @property
+    def retention_enabled(self) -> bool:
+        """Old months are only dropped with a retention and an explicit archive dir"""
+        return self.retention_months > 0 and bool(self.archive_dir)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the periodic maintenance task (needs a running event loop)"""
+        if not self.enabled or self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"🗄️ Emotion maintenance started (every {self.interval_hours}h, "
+            f"retention={self.retention_months if self.retention_enabled else 'off'} months)"
+        )
+        if self.retention_months > 0 and not self.archive_dir:
+            logger.warning("EMOTION_RETENTION_MONTHS is set but EMOTION_ARCHIVE_DIR is not; no month will be dropped")
+
+    async def stop(self) -> None:
+        """Cancel the maintenance task (an interrupted archive is left as a .tmp file)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Emotion maintenance error: {str(e)}")
+            await asyncio.sleep(self.interval_hours * 3600)
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Run one maintenance pass
+
+        Returns:
+            Partitions created, archived and dropped in this run
+        """
+        if self._run_lock is None:
+            self._run_lock = asyncio.Lock()
+        async with self._run_lock:
+            now = now or datetime.utcnow()
+            start = time.perf_counter()
+            self._runs += 1
+            result = {"created": 0, "dropped": [], "skipped": []}
+            try:
+                response = await self.client.rpc(
+                    "ensure_emotion_partitions",
+                    {"p_months_ahead": self.months_ahead}
+                ).execute()
+                result["created"] = response.data or 0
+                self._partitions_created += result["created"]
+
+                response = await self.client.rpc("list_emotion_partitions", {}).execute()
+                self._partitions = response.data or []
+
+                if self.retention_enabled:
+                    if await self._acquire_lease():
+                        try:
+                            await self._retire_expired(now, result)
+                        finally:
+                            await self._release_lease()
+                    else:
+                        logger.info("Emotion maintenance lease held by another instance; skipping archive/drop")
+
+                if result["dropped"]:
+                    dropped = set(result["dropped"])
+                    self._partitions = [p for p in self._partitions if p["partition_name"] not in dropped]
+
+                self._last_error = None
+                logger.info(
+                    f"Emotion maintenance: {result['created']} partitions created, "
+                    f"{len(result['dropped'])} archived and dropped"
+                )
+                return result
+
+            except Exception as e:
+                self._failed_runs += 1
+                self._last_error = str(e)
+                raise
+            finally:
+                self._last_run = now
+                self._last_duration = time.perf_counter() - start
+
+    async def _acquire_lease(self) -> bool:
+        """Take or renew the cluster-wide lease (one instance archives and drops)"""
+        response = await self.client.rpc(
+            "acquire_emotion_maintenance_lease",
+            {"p_holder": self.holder, "p_seconds": LEASE_SECONDS}
+        ).execute()
+        return bool(response.data)
+
+    async def _release_lease(self) -> None:
+        try:
+            await self.client.rpc("release_emotion_maintenance_lease", {"p_holder": self.holder}).execute()
+        except Exception as e:
+            # Caduca sola tras LEASE_SECONDS
+            logger.warning(f"Could not release the emotion maintenance lease: {str(e)}")
+
+    async def _retire_expired(self, now: datetime, result: Dict[str, Any]) -> None:
+        """Detach the months past the retention, then archive and drop every detached month"""
+        cutoff = retention_cutoff(now, self.retention_months)
+        for partition in self._partitions:
+            if _parse_timestamp(partition["range_end"]) > cutoff:
+                continue
+            if not await self._acquire_lease():
+                return
+            await self.client.rpc(
+                "detach_emotion_partition",
+                {"p_partition_name": partition["partition_name"]}
+            ).execute()
+
+        response = await self.client.rpc("list_detached_emotion_partitions", {}).execute()
+        for detached in response.data or []:
+            name = _partition_name(detached["table_name"])
+            if await self._acquire_lease() and await self._archive_and_drop(detached):
+                result["dropped"].append(name)
+            else:
+                result["skipped"].append(name)
+
+    async def _archive_and_drop(self, detached: Dict[str, Any]) -> bool:
+        """Export one detached month and drop it only if every row made it to the archive"""
+        table_name = detached["table_name"]
+        expected = detached["row_count"]
+
+        archived = await self.archive_partition(table_name)
+        if archived != expected:
+            logger.warning(
+                f"Archive of {table_name} has {archived} rows but the table has {expected}; not dropping it"
+            )
+            return False
+
+        response = await self.client.rpc(
+            "drop_detached_emotion_partition",
+            {"p_table_name": table_name, "p_expected_rows": archived}
+        ).execute()
+        if not response.data:
+            logger.warning(f"{table_name} changed or was already dropped; kept the archive, not dropping it")
+            return False
+
+        self._partitions_dropped += 1
+        logger.info(f"🗄️ Archived and dropped {_partition_name(table_name)} ({archived} rows)")
+        return True
+
+    async def archive_partition(self, table_name: str) -> int:
+        """
+        Write the raw rows of one detached month to <archive_dir>/<partition>.ndjson.gz
+
+        Rows are read in id order with keyset pagination and written to a
+        temporary file (unique per process) that is renamed into place once
+        complete.
+
+        Returns:
+            Number of rows archived
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{_partition_name(table_name)}.ndjson.gz")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        rows_written = 0
+        last_id = 0
+        archive = await asyncio.to_thread(gzip.open, tmp_path, "wt", encoding="utf-8")
+        try:
+            while True:
+                response = await self.client.rpc(
+                    "read_detached_emotion_rows",
+                    {"p_table_name": table_name, "p_after_id": last_id, "p_limit": self.page_size}
+                ).execute()
+                rows = response.data or []
+                if not rows:
+                    break
+                lines = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+                await asyncio.to_thread(archive.write, lines)
+                rows_written += len(rows)
+                last_id = rows[-1]["id"]
+                if len(rows) < self.page_size:
+                    break
+        finally:
+            await asyncio.to_thread(archive.close)
+
+        os.replace(tmp_path, path)
+        self._rows_archived += rows_written
+        return rows_written
+
+    def stats(self) -> Dict[str, Any]:
+        """Partition sizes and maintenance run metrics"""
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "retention_months": self.retention_months,
+            "retention_enabled": self.retention_enabled,
+            "months_ahead": self.months_ahead,
+            "archive_dir": self.archive_dir,
+            "runs": self._runs,
+            "failed_runs": self._failed_runs,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "last_duration_ms": round(self._last_duration * 1000, 1) if self._last_duration is not None else None,
+            "last_error": self._last_error,
+            "partitions_created": self._partitions_created,
+            "partitions_dropped": self._partitions_dropped,
+            "rows_archived": self._rows_archived,
+            "partitions": self._partitions
+        }
+
+
+# ============================================================================
+# INSTANCIA GLOBAL
+# ============================================================================
+
+_emotion_retention: Optional[EmotionRetentionTask] = None
+
+
+def get_emotion_retention() -> EmotionRetentionTask:
+    """Get the process-wide emotion events maintenance task (Singleton)"""
+    global _emotion_retention
+    if _emotion_retention is None:
+        _emotion_retention = EmotionRetentionTask()
+    return _emotion_retention
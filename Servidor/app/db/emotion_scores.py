@@ -0,0 +1,89 @@
+"""
+Smart Classroom AI - Emotion Score Codec
+emotion_events.emotion_scores as a fixed-order SMALLINT[7] (hundredths of a percent)
+"""
+import json
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from app.core.constants import EMOTION_SCORE_ORDER, EMOTION_SCORE_SCALE
+
+EMOTION_SCORE_SIZE = len(EMOTION_SCORE_ORDER)
+_SCORE_INDEX = {label: i for i, label in enumerate(EMOTION_SCORE_ORDER)}
+_MAX_SCORE = 100 * EMOTION_SCORE_SCALE
+
+
+def encode_emotion_scores(emotion_scores: Optional[Dict[str, float]]) -> Optional[List[int]]:
+    """
+    Pack DeepFace's {emotion: percent} dict into the stored SMALLINT[7]
+
+    Missing emotions are stored as 0; unknown keys are ignored.
+    """
+    if not emotion_scores:
+        return None
+    packed = [0] * EMOTION_SCORE_SIZE
+    for label, score in emotion_scores.items():
+        i = _SCORE_INDEX.get(label)
+        if i is not None and score is not None:
+            packed[i] = min(max(int(round(float(score) * EMOTION_SCORE_SCALE)), 0), _MAX_SCORE)
+    return packed
+
+
+def _legacy_vector(value: Any) -> Optional[List[int]]:
+    """Scores still stored as a JSON object (rows written before migration 013)"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    if isinstance(value, dict):
+        return encode_emotion_scores(value)
+    return None
+
+
+def decode_emotion_scores(values: Sequence[Any]) -> np.ndarray:
+    """
+    Decode a result set's emotion_scores column into an (n, 7) float32 matrix
+
+    Columns follow EMOTION_SCORE_ORDER and hold percentages (0-100). Rows
+    without scores are NaN, so np.nanmean() and friends skip them.
+    """
+    matrix = np.full((len(values), EMOTION_SCORE_SIZE), np.nan, dtype=np.float32)
+    if not len(values):
+        return matrix
+
+    packed_rows = []
+    packed_values = []
+    for i, value in enumerate(values):
+        if isinstance(value, (list, tuple)) and len(value) == EMOTION_SCORE_SIZE:
+            packed_rows.append(i)
+            packed_values.append(value)
+        elif value is not None:
+            legacy = _legacy_vector(value)
+            if legacy is not None:
+                packed_rows.append(i)
+                packed_values.append(legacy)
+
+    if packed_rows:
+        matrix[packed_rows] = np.asarray(packed_values, dtype=np.float32) / EMOTION_SCORE_SCALE
+    return matrix
+
+
+def score_dicts(matrix: np.ndarray) -> List[Optional[Dict[str, float]]]:
+    """Rows of a decoded matrix back to {emotion: percent} dicts (None for NaN rows)"""
+    return [
+        None if np.isnan(row[0]) else {
+            label: round(value, 2) for label, value in zip(EMOTION_SCORE_ORDER, row.tolist())
+        }
+        for row in matrix
+    ]
+
+
+def mean_scores(matrix: np.ndarray) -> Optional[Dict[str, float]]:
+    """Average percentage per emotion over the rows that have scores"""
+    scored = matrix[~np.isnan(matrix[:, 0])] if matrix.size else matrix
+    if not len(scored):
+        return None
+    return {
+        label: round(float(value), 2)
+        for label, value in zip(EMOTION_SCORE_ORDER, scored.mean(axis=0))
+    }
@@ -69,7 +69,7 @@ CREATE TABLE IF NOT EXISTS emotion_events (
     class_id VARCHAR(100) NOT NULL,
     dominant_emotion VARCHAR(20) NOT NULL,
     confidence FLOAT NOT NULL,
-    emotion_scores TEXT,
+    emotion_scores SMALLINT[] CHECK (emotion_scores IS NULL OR cardinality(emotion_scores) = 7),
     detected_at TIMESTAMP DEFAULT NOW() NOT NULL,
     
     CONSTRAINT emotion_type_check CHECK (
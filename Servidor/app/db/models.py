@@ -2,7 +2,8 @@
 Smart Classroom AI - Database Models
 SQLAlchemy ORM models with pgvector support
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, Boolean, DateTime, Text, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
@@ -54,12 +55,18 @@ class Attendance(Base):
     confidence = Column(Float, nullable=True)
     match_distance = Column(Float, nullable=True)  # Euclidean distance from reference embedding
     
+    # Period / verification (migrations 004 and 005)
+    period = Column(Integer, nullable=False, default=1, index=True)
+    verification_method = Column(String(20), default="facial")  # facial, qr, manual
+    updated_at = Column(DateTime, nullable=True)
+    
     # Relationships
     student = relationship("Student", back_populates="attendance_records")
     
     __table_args__ = (
         Index('ix_attendance_class_timestamp', 'class_id', 'timestamp'),
         Index('ix_attendance_student_class', 'student_id', 'class_id'),
+        Index('ix_attendance_unique', 'student_id', 'class_id', 'period', unique=True),
     )
 
 
@@ -75,8 +82,8 @@ class EmotionEvent(Base):
     dominant_emotion = Column(String(20), nullable=False)  # happy, sad, angry, etc.
     confidence = Column(Float, nullable=False)
     
-    # All emotion scores (JSON string: {"happy": 85.2, "sad": 10.3, ...})
-    emotion_scores = Column(Text, nullable=True)
+    # All emotion scores in EMOTION_SCORE_ORDER, hundredths of a percent ([0, 0, 0, 8520, 1030, 0, 450])
+    emotion_scores = Column(ARRAY(SmallInteger), nullable=True)
     
     # Timestamp
     detected_at = Column(DateTime, default=func.now(), nullable=False, index=True)
@@ -0,0 +1,284 @@
+"""
+Smart Classroom AI - Direct Postgres CRUD Backend
+Same interfaces as app.db.crud, with the hot queries sent over the asyncpg pool
+"""
+from typing import List, Optional, Dict, Any, Tuple
+from supabase import AsyncClient
+from app.db.crud import StudentCRUD, AttendanceCRUD, ClassSessionCRUD
+from app.db.postgres import get_postgres_pool
+from app.core.logger import logger
+from app.core.exceptions import DatabaseConnectionException
+
+
+# ============================================================================
+# SENTENCIAS (preparadas y cacheadas por conexión en asyncpg)
+# ============================================================================
+
+# Misma búsqueda que match_students_by_embedding, sin pasar por PostgREST
+MATCH_STUDENTS_SQL = """
+SELECT to_jsonb(s.*) - 'face_embedding' AS student,
+       (s.face_embedding <-> $1::vector)::float8 AS distance
+FROM students s
+WHERE s.is_active = TRUE
+  AND (s.face_embedding <-> $1::vector) < $2
+ORDER BY s.face_embedding <-> $1::vector
+LIMIT $3
+"""
+
+# Varias consultas en un solo viaje: una búsqueda LATERAL por embedding
+MATCH_STUDENTS_MANY_SQL = """
+SELECT q.idx, m.student, m.distance
+FROM unnest($1::text[]) WITH ORDINALITY AS q(embedding, idx)
+CROSS JOIN LATERAL (
+    SELECT to_jsonb(s.*) - 'face_embedding' AS student,
+           (s.face_embedding <-> q.embedding::vector)::float8 AS distance
+    FROM students s
+    WHERE s.is_active = TRUE
+      AND (s.face_embedding <-> q.embedding::vector) < $2
+    ORDER BY s.face_embedding <-> q.embedding::vector
+    LIMIT $3
+) m
+ORDER BY q.idx, m.distance
+"""
+
+FIND_STUDENT_SQL = """
+SELECT to_jsonb(s.*) AS row_data
+FROM students s
+WHERE s.student_id = $1
+"""
+
+UPSERT_ATTENDANCE_SQL = """
+SELECT row_data, already_registered
+FROM upsert_attendance($1, $2, $3, $4, $5, $6, $7, $8)
+"""
+
+# Inserta las nuevas y devuelve las existentes en la misma sentencia
+UPSERT_ATTENDANCE_BULK_SQL = """
+WITH input AS (
+    SELECT *
+    FROM unnest($2::text[], $3::text[], $4::float8[], $5::float8[])
+        AS t(student_id, status, confidence, match_distance)
+),
+inserted AS (
+    INSERT INTO attendance (student_id, class_id, period, status, timestamp, confidence, match_distance, verification_method)
+    SELECT i.student_id, $1::text, $6::int, i.status, NOW(), i.confidence, i.match_distance, $7::text
+    FROM input i
+    ON CONFLICT (student_id, class_id, period) DO NOTHING
+    RETURNING attendance.student_id, to_jsonb(attendance.*) AS row_data
+)
+SELECT i.student_id,
+       COALESCE(n.row_data, to_jsonb(a.*)) AS row_data,
+       n.row_data IS NULL AS already_registered
+FROM input i
+LEFT JOIN inserted n ON n.student_id = i.student_id
+LEFT JOIN attendance a
+       ON n.student_id IS NULL
+      AND a.student_id = i.student_id
+      AND a.class_id = $1::text
+      AND a.period = $6::int
+"""
+
+CHECK_ATTENDANCE_SQL = """
+SELECT to_jsonb(a.*) AS row_data
+FROM attendance a
+WHERE a.student_id = $1
+  AND a.class_id = $2
+LIMIT 1
+"""
+
+CLASS_ATTENDANCE_SQL = """
+SELECT to_jsonb(a.*) AS row_data
+FROM attendance a
+WHERE a.class_id = $1
+"""
+
+GET_CLASS_SESSION_SQL = """
+SELECT to_jsonb(cs.*) AS row_data
+FROM class_sessions cs
+WHERE cs.class_id = $1
+"""
+
+
+def _vector_literal(embedding: Any) -> str:
+    """pgvector text input ('[x1,x2,...]') for a $n::vector parameter"""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+
+class PgStudentCRUD(StudentCRUD):
+    """StudentCRUD whose lookups and pgvector matching use the asyncpg pool"""
+
+    def __init__(self, client: Optional[AsyncClient] = None, pool: Optional[Any] = None):
+        super().__init__(client)
+        self._pool = pool
+
+    async def _get_pool(self) -> Any:
+        if self._pool is None:
+            self._pool = await get_postgres_pool()
+        return self._pool
+
+    async def find_by_id(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """Find student by student_id"""
+        try:
+            pool = await self._get_pool()
+            return await pool.fetchval(FIND_STUDENT_SQL, student_id)
+        except Exception as e:
+            logger.error(f"Failed to find student {student_id}: {str(e)}")
+            return None
+
+    async def _find_by_embedding_rpc(
+        self,
+        embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Similarity search with the prepared pgvector query"""
+        try:
+            pool = await self._get_pool()
+            rows = await pool.fetch(MATCH_STUDENTS_SQL, _vector_literal(embedding), float(threshold), limit)
+            return [(row["student"], row["distance"]) for row in rows]
+        except Exception as e:
+            logger.error(f"Failed to search by embedding: {str(e)}")
+            return []
+
+    async def _find_by_embeddings_rpc(
+        self,
+        embeddings: List[List[float]],
+        threshold: float,
+        limit: int
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Similarity search for several embeddings in one round trip"""
+        results: List[List[Tuple[Dict[str, Any], float]]] = [[] for _ in embeddings]
+        try:
+            pool = await self._get_pool()
+            rows = await pool.fetch(
+                MATCH_STUDENTS_MANY_SQL,
+                [_vector_literal(embedding) for embedding in embeddings],
+                float(threshold),
+                limit
+            )
+            for row in rows:
+                results[row["idx"] - 1].append((row["student"], row["distance"]))
+        except Exception as e:
+            logger.error(f"Failed to search by embeddings: {str(e)}")
+        return results
+
+
+class PgAttendanceCRUD(AttendanceCRUD):
+    """AttendanceCRUD whose reads and upserts use the asyncpg pool"""
+
+    def __init__(self, client: Optional[AsyncClient] = None, pool: Optional[Any] = None):
+        super().__init__(client)
+        self._pool = pool
+
+    async def _get_pool(self) -> Any:
+        if self._pool is None:
+            self._pool = await get_postgres_pool()
+        return self._pool
+
+    async def check_attendance_exists(
+        self,
+        student_id: str,
+        class_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Check if attendance already exists for a student in a class"""
+        try:
+            pool = await self._get_pool()
+            return await pool.fetchval(CHECK_ATTENDANCE_SQL, student_id, class_id)
+        except Exception as e:
+            logger.error(f"Failed to check attendance: {str(e)}")
+            return None
+
+    async def _upsert_attendance(
+        self,
+        student_id: str,
+        class_id: str,
+        status: str,
+        confidence: Optional[float],
+        match_distance: Optional[float],
+        period: int,
+        verification_method: str,
+        overwrite: bool
+    ) -> Dict[str, Any]:
+        """Same upsert_attendance function as the REST backend, over the pool"""
+        try:
+            pool = await self._get_pool()
+            item = await pool.fetchrow(
+                UPSERT_ATTENDANCE_SQL,
+                student_id,
+                class_id,
+                period,
+                status,
+                confidence,
+                match_distance,
+                verification_method,
+                overwrite
+            )
+
+            result = item["row_data"]
+            result["already_registered"] = item["already_registered"]
+            return result
+
+        except Exception as e:
+            logger.error(f"Failed to mark attendance: {str(e)}")
+            raise DatabaseConnectionException(f"Attendance marking failed: {str(e)}")
+
+    async def _upsert_attendance_bulk(
+        self,
+        class_id: str,
+        entries: List[Dict[str, Any]],
+        period: int,
+        verification_method: str
+    ) -> List[Dict[str, Any]]:
+        """Insert the new rows and return the existing ones in a single statement"""
+        try:
+            pool = await self._get_pool()
+            rows = await pool.fetch(
+                UPSERT_ATTENDANCE_BULK_SQL,
+                class_id,
+                [entry["student_id"] for entry in entries],
+                [entry.get("status", "present") for entry in entries],
+                [entry.get("confidence") for entry in entries],
+                [entry.get("match_distance") for entry in entries],
+                period,
+                verification_method
+            )
+            by_student = {
+                row["student_id"]: {**(row["row_data"] or {}), "already_registered": row["already_registered"]}
+                for row in rows
+            }
+            new_count = sum(1 for record in by_student.values() if not record["already_registered"])
+            logger.info(f"Bulk attendance for {class_id}: {new_count} new, {len(by_student) - new_count} already registered")
+
+            return [dict(by_student[entry["student_id"]]) for entry in entries]
+
+        except Exception as e:
+            logger.error(f"Failed to mark bulk attendance: {str(e)}")
+            raise DatabaseConnectionException(f"Bulk attendance marking failed: {str(e)}")
+
+    async def get_class_attendance(self, class_id: str) -> List[Dict[str, Any]]:
+        """Get all attendance records for a class"""
+        try:
+            pool = await self._get_pool()
+            rows = await pool.fetch(CLASS_ATTENDANCE_SQL, class_id)
+            return [row["row_data"] for row in rows]
+        except Exception as e:
+            logger.error(f"Failed to get attendance for {class_id}: {str(e)}")
+            return []
+
+
+class PgClassSessionCRUD(ClassSessionCRUD):
+    """ClassSessionCRUD whose cache misses are loaded over the asyncpg pool"""
+
+    def __init__(self, client: Optional[AsyncClient] = None, pool: Optional[Any] = None):
+        super().__init__(client)
+        self._pool = pool
+
+    async def _get_pool(self) -> Any:
+        if self._pool is None:
+            self._pool = await get_postgres_pool()
+        return self._pool
+
+    async def _fetch(self, class_id: str) -> Optional[Dict[str, Any]]:
+        """Class session row straight from the database (errors propagate, so they are not cached)"""
+        pool = await self._get_pool()
+        return await pool.fetchval(GET_CLASS_SESSION_SQL, class_id)
@@ -0,0 +1,89 @@
+"""
+Smart Classroom AI - Direct Postgres Connection Pool
+asyncpg pool on DATABASE_URL for the latency-sensitive queries (DB_BACKEND=postgres)
+"""
+import asyncio
+import json
+from typing import Optional, Any
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.exceptions import DatabaseConnectionException
+
+
+def _asyncpg_dsn(url: str) -> str:
+    """Strip a SQLAlchemy driver suffix (postgresql+asyncpg://) from the URL"""
+    scheme, sep, rest = url.partition("://")
+    return f"{scheme.split('+', 1)[0]}{sep}{rest}"
+
+
+async def _init_connection(conn: Any) -> None:
+    """Decode json/jsonb columns into Python objects, like PostgREST does"""
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name,
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema="pg_catalog"
+        )
+
+
+class PostgresPool:
+    """
+    Singleton asyncpg connection pool
+
+    asyncpg prepares every statement it runs and keeps it in a per-connection
+    cache (DB_STATEMENT_CACHE_SIZE), so the hot queries are parsed and planned
+    once per connection. Behind PgBouncer in transaction mode set the cache
+    size to 0.
+    """
+
+    _pool: Optional[Any] = None
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def get_pool(cls) -> Any:
+        """Get or create the connection pool"""
+        if cls._pool is not None:
+            return cls._pool
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._pool is None:
+                try:
+                    import asyncpg
+
+                    cls._pool = await asyncpg.create_pool(
+                        dsn=_asyncpg_dsn(settings.DATABASE_URL),
+                        min_size=settings.DB_POOL_SIZE,
+                        max_size=settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW,
+                        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+                        command_timeout=settings.REQUEST_TIMEOUT,
+                        init=_init_connection
+                    )
+                    logger.info(
+                        f"✅ Pool de Postgres inicializado "
+                        f"({settings.DB_POOL_SIZE}+{settings.DB_MAX_OVERFLOW} conexiones)"
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Error al inicializar pool de Postgres: {str(e)}")
+                    raise DatabaseConnectionException(f"Postgres connection failed: {str(e)}")
+        return cls._pool
+
+    @classmethod
+    async def close(cls) -> None:
+        """Close every pooled connection (call at shutdown)"""
+        if cls._pool is not None:
+            await cls._pool.close()
+            cls._pool = None
+            logger.info("Pool de Postgres cerrado")
+
+
+async def get_postgres_pool() -> Any:
+    """
+    Get the asyncpg pool (Singleton)
+
+    Example:
+        pool = await get_postgres_pool()
+        row = await pool.fetchrow("SELECT 1")
+    """
+    return await PostgresPool.get_pool()
@@ -0,0 +1,202 @@
+"""
+Smart Classroom AI - Active Class Session Index
+In-memory interval index of today's class sessions for the /classes/active poll
+"""
+import asyncio
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+import pytz
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.logger import logger
+
+
+# Zona horaria de Ecuador (UTC-5): define qué es "hoy"
+ECUADOR_TZ = pytz.timezone('America/Guayaquil')
+
+
+def parse_session_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a class_sessions timestamp into an aware UTC datetime
+
+    Naive values are taken as UTC, the same convention /classes uses.
+    """
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            from dateutil import parser
+            dt = parser.parse(value)
+        except Exception:
+            return None
+    if dt.tzinfo is None:
+        return pytz.utc.localize(dt)
+    return dt.astimezone(pytz.utc)
+
+
+def _with_metadata_fields(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a session row with course_id / teacher_id lifted out of metadata"""
+    row = dict(session)
+    metadata = row.get('metadata') or {}
+    if isinstance(metadata, dict):
+        if 'course_id' in metadata:
+            row['course_id'] = metadata['course_id']
+        if 'teacher_id' in metadata:
+            row['teacher_id'] = metadata['teacher_id']
+    return row
+
+
+async def fetch_active_sessions(client: AsyncClient, now: datetime) -> List[Dict[str, Any]]:
+    """
+    Sessions live at ``now`` (start_time <= now AND (end_time IS NULL OR end_time > now)),
+    filtered in the database on the class_sessions time indexes
+    """
+    now_str = now.astimezone(pytz.utc).isoformat()
+    response = await client.table("class_sessions")\
+        .select("*")\
+        .lte("start_time", now_str)\
+        .or_(f'end_time.is.null,end_time.gt."{now_str}"')\
+        .order("start_time", desc=True)\
+        .execute()
+    return [_with_metadata_fields(row) for row in (response.data or [])]
+
+
+class ActiveSessionIndex:
+    """
+    Today's class sessions sorted by start time
+
+    The index holds every session that can be live at some point of the
+    current Ecuador day (plus open-ended ones started earlier), loaded with
+    one windowed query. Answering "which classes are live now" is then a
+    bisect over the start times and an end-time check on the few that
+    already started. Create / update / end / delete invalidate it; it also
+    reloads after ACTIVE_CLASS_INDEX_SECONDS to pick up changes made by other
+    processes, and when the day changes.
+    """
+
+    def __init__(self, client: Optional[AsyncClient] = None):
+        self._client = client
+        self.refresh_seconds = settings.ACTIVE_CLASS_INDEX_SECONDS
+
+        self._starts: List[datetime] = []
+        self._entries: List[Tuple[Optional[datetime], Dict[str, Any]]] = []
+
+        self._day: Optional[date] = None
+        self._loaded_at: Optional[float] = None
+        self._dirty = True
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            from app.db.supabase_client import get_async_supabase
+            self._client = get_async_supabase()
+        return self._client
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def is_stale(self, now: Optional[datetime] = None) -> bool:
+        """Check whether the index must be reloaded before answering"""
+        if self._dirty or self._loaded_at is None:
+            return True
+        now = now or datetime.now(pytz.utc)
+        if now.astimezone(ECUADOR_TZ).date() != self._day:
+            return True
+        return (time.monotonic() - self._loaded_at) > self.refresh_seconds
+
+    def invalidate(self) -> None:
+        """Mark the index for reload (call after create, update, end or delete)"""
+        self._dirty = True
+        self._generation += 1
+
+    def load(self, rows: List[Dict[str, Any]], day: date) -> int:
+        """
+        Build the index from session rows of ``day``
+
+        Rows without a parseable start_time are skipped.
+
+        Returns:
+            Number of sessions indexed
+        """
+        entries = []
+        for row in rows:
+            start = parse_session_time(row.get('start_time'))
+            if start is None:
+                continue
+            end = parse_session_time(row.get('end_time'))
+            entries.append((start, end, _with_metadata_fields(row)))
+
+        entries.sort(key=lambda entry: entry[0])
+        self._starts = [entry[0] for entry in entries]
+        self._entries = [(entry[1], entry[2]) for entry in entries]
+        self._day = day
+        self._loaded_at = time.monotonic()
+        self._dirty = False
+        return len(entries)
+
+    async def refresh(self, now: Optional[datetime] = None) -> int:
+        """Reload the sessions that overlap the current Ecuador day"""
+        now = now or datetime.now(pytz.utc)
+        day = now.astimezone(ECUADOR_TZ).date()
+        day_start = ECUADOR_TZ.localize(datetime.combine(day, datetime.min.time())).astimezone(pytz.utc)
+        day_end = day_start + timedelta(days=1)
+
+        day_start_str = day_start.isoformat()
+        generation = self._generation
+        response = await self.client.table("class_sessions")\
+            .select("*")\
+            .lt("start_time", day_end.isoformat())\
+            .or_(f'end_time.is.null,end_time.gt."{day_start_str}"')\
+            .execute()
+
+        loaded = self.load(response.data or [], day)
+        if self._generation != generation:
+            # Invalidado mientras se consultaba: la próxima lectura recarga
+            self._dirty = True
+        logger.info(f"🗓️ Active session index loaded: {loaded} sessions for {day}")
+        return loaded
+
+    async def ensure_loaded(self, now: Optional[datetime] = None) -> None:
+        """Reload the index if it is empty, invalidated, outdated or from another day"""
+        if not self.is_stale(now):
+            return
+        async with self._lock:
+            if self.is_stale(now):
+                await self.refresh(now)
+
+    def active_at(self, now: datetime) -> List[Dict[str, Any]]:
+        """Sessions live at ``now``, latest start first"""
+        started = bisect_right(self._starts, now)
+        return [
+            dict(session)
+            for end, session in reversed(self._entries[:started])
+            if end is None or now < end
+        ]
+
+    async def get_active(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Sessions live right now, reloading the index first if needed"""
+        now = now or datetime.now(pytz.utc)
+        await self.ensure_loaded(now)
+        return self.active_at(now)
+
+
+# ============================================================================
+# INSTANCIA GLOBAL
+# ============================================================================
+
+_session_index: Optional[ActiveSessionIndex] = None
+
+
+def get_active_session_index() -> ActiveSessionIndex:
+    """Get the process-wide active session index (Singleton)"""
+    global _session_index
+    if _session_index is None:
+        _session_index = ActiveSessionIndex()
+    return _session_index
@@ -2,7 +2,7 @@
 Smart Classroom AI - Supabase Client
 Wrapper for Supabase connection and operations
 """
-from supabase import create_client, Client
+from supabase import create_client, Client, AsyncClient
 from typing import Optional, List, Dict, Any
 from app.core.config import settings
 from app.core.logger import logger
@@ -53,9 +53,9 @@ class SupabaseClient:
     async def test_connection(cls) -> bool:
         """Test database connection"""
         try:
-            client = cls.get_client()
+            client = AsyncSupabaseClient.get_client()
             # Simple query to test connection (usando el esquema correcto)
-            response = client.table("students").select("id").limit(1).execute()
+            response = await client.table("students").select("id").limit(1).execute()
             logger.info("✅ Test de conexión a Supabase exitoso")
             return True
         except Exception as e:
@@ -63,6 +63,46 @@ class SupabaseClient:
             return False
 
 
+class AsyncSupabaseClient:
+    """
+    Singleton async Supabase client wrapper
+    
+    PostgREST calls go through one shared httpx.AsyncClient (connection pool),
+    so awaiting ``.execute()`` yields to the event loop instead of blocking it.
+    """
+    
+    _instance: Optional[AsyncClient] = None
+    
+    @classmethod
+    def get_client(cls) -> AsyncClient:
+        """Get or create the async Supabase client instance"""
+        if cls._instance is None:
+            try:
+                api_key = settings.SUPABASE_SERVICE_KEY or settings.SUPABASE_KEY
+                
+                # Con la service key no hay sesión de usuario que recuperar,
+                # así que basta el constructor (acreate_client solo añade eso)
+                cls._instance = AsyncClient(
+                    supabase_url=settings.SUPABASE_URL,
+                    supabase_key=api_key
+                )
+                logger.info("✅ Cliente async de Supabase inicializado correctamente")
+            except Exception as e:
+                logger.error(f"❌ Error al inicializar cliente async de Supabase: {str(e)}")
+                raise DatabaseConnectionException(f"Supabase connection failed: {str(e)}")
+        
+        return cls._instance
+    
+    @classmethod
+    async def close(cls) -> None:
+        """Close the shared HTTP connection pool (call at shutdown)"""
+        if cls._instance is not None:
+            if cls._instance._postgrest is not None:
+                await cls._instance._postgrest.aclose()
+            cls._instance = None
+            logger.info("Cliente async de Supabase cerrado")
+
+
 # ============================================================================
 # FUNCIÓN DE CONVENIENCIA (Instancia única global)
 # ============================================================================
@@ -82,6 +122,21 @@ def get_supabase() -> Client:
     return SupabaseClient.get_client()
 
 
+def get_async_supabase() -> AsyncClient:
+    """
+    Get the async Supabase client instance (Singleton)
+    
+    Usar en código async: las consultas deben esperarse con ``await``.
+    
+    Example:
+        from app.db.supabase_client import get_async_supabase
+        
+        supabase = get_async_supabase()
+        response = await supabase.table("students").select("*").execute()
+    """
+    return AsyncSupabaseClient.get_client()
+
+
 # ============================================================================
 # INSTANCIA GLOBAL (Opcional - para importación directa)
 # ============================================================================
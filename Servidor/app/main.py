@@ -14,6 +14,12 @@ from app.core.config import settings
 from app.core.logger import logger
 from app.core.exceptions import SmartClassroomException
 from app.api import enrollment, attendance, emotions, health, classes, statistics, enrollments, qr_attendance
+from app.services.face_service import inference_executor
+from app.db.supabase_client import AsyncSupabaseClient
+from app.db.postgres import PostgresPool
+from app.db.emotion_buffer import get_emotion_buffer
+from app.db.emotion_retention import get_emotion_retention
+from app.services.code_stream import get_code_broadcaster
 
 
 @asynccontextmanager
@@ -30,6 +36,16 @@ async def lifespan(app: FastAPI):
     # Esto permite que Cloud Run inicie el contenedor rápidamente
     logger.info("⚡ Startup rápido - verificaciones diferidas a primera petición")
     
+    # Pool de inferencia: los workers cargan los modelos en segundo plano,
+    # el arranque del contenedor no espera a TensorFlow
+    inference_executor.start()
+    
+    # Escrituras de emociones por lotes en segundo plano
+    get_emotion_buffer().start()
+    
+    # Particiones mensuales de emotion_events y archivado de meses antiguos
+    get_emotion_retention().start()
+    
     logger.info("="*80)
     logger.info("🚀 Application startup complete")
     logger.info("="*80)
@@ -38,6 +54,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
+    inference_executor.shutdown()
+    await get_code_broadcaster().stop()
+    await get_emotion_retention().stop()
+    await get_emotion_buffer().stop()
+    await AsyncSupabaseClient.close()
+    await PostgresPool.close()
     logger.info("Cleanup complete")
 
 
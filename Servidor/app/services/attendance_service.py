@@ -2,11 +2,12 @@
 Smart Classroom AI - Attendance Service
 Business logic for attendance verification and management
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 import numpy as np
-from app.services.face_service import FaceRecognitionService, ImageProcessingService
-from app.db.crud import StudentCRUD, AttendanceCRUD
+from app.services.face_service import FaceRecognitionService, ImageProcessingService, analyze_frame
+from app.db.crud import EmotionEventCRUD, get_student_crud, get_attendance_crud, get_class_session_crud
+from app.core.config import settings
 from app.core.logger import logger
 from app.core.exceptions import StudentNotFoundException, FaceNotDetectedException
 from app.core.constants import AttendanceStatus
@@ -17,6 +18,49 @@ ECUADOR_TZ = timezone(timedelta(hours=-5))
 # Tiempo de tolerancia en minutos antes de marcar como "late"
 LATE_THRESHOLD_MINUTES = 15
 
+# Candidatos por rostro en foto grupal (permite reasignar si el mejor ya fue tomado)
+GROUP_MATCH_CANDIDATES = 5
+
+
+def _assign_faces_to_students(
+    candidates: List[List[Tuple[Dict[str, Any], float]]]
+) -> Tuple[Dict[int, Tuple[Dict[str, Any], float]], int]:
+    """
+    Assign each detected face to at most one student and vice versa
+    
+    Greedy by ascending distance over all (face, candidate) pairs: the closest
+    pair wins and a face whose best student was already taken falls back to
+    its next candidate.
+    
+    Args:
+        candidates: Per-face list of (student_record, distance), closest first
+    
+    Returns:
+        (face index -> (student_record, distance), number of conflicts resolved)
+    """
+    pairs = sorted(
+        (
+            (distance, face_idx, rank, student)
+            for face_idx, face_candidates in enumerate(candidates)
+            for rank, (student, distance) in enumerate(face_candidates)
+        ),
+        key=lambda pair: pair[:3]
+    )
+    
+    assignments: Dict[int, Tuple[Dict[str, Any], float]] = {}
+    taken_students = set()
+    conflicts = 0
+    for distance, face_idx, rank, student in pairs:
+        if face_idx in assignments:
+            continue
+        if student["student_id"] in taken_students:
+            if rank == 0:
+                conflicts += 1
+            continue
+        assignments[face_idx] = (student, distance)
+        taken_students.add(student["student_id"])
+    return assignments, conflicts
+
 
 class AttendanceService:
     """Service for managing attendance verification"""
@@ -24,38 +68,58 @@ class AttendanceService:
     def __init__(self):
         self.face_service = FaceRecognitionService()
         self.image_service = ImageProcessingService()
-        self.student_crud = StudentCRUD()
-        self.attendance_crud = AttendanceCRUD()
+        self.student_crud = get_student_crud()
+        self.attendance_crud = get_attendance_crud()
+        self.class_session_crud = get_class_session_crud()
+        self.emotion_crud = EmotionEventCRUD()
     
-    async def _get_class_start_time(self, class_id: str) -> Optional[datetime]:
+    async def _get_class_session(self, class_id: str) -> Optional[Dict[str, Any]]:
         """
-        Get the start time of a class session
+        Get the start time and metadata of a class session
         
         Args:
             class_id: Class session identifier
         
         Returns:
-            Start time as datetime or None if not found
+            Class session row or None if not found
         """
         try:
-            from app.db.supabase_client import get_supabase
-            client = get_supabase()
-            
-            response = client.table("class_sessions")\
-                .select("start_time")\
-                .eq("class_id", class_id)\
-                .execute()
-            
-            if response.data and len(response.data) > 0:
-                start_time_str = response.data[0].get("start_time")
-                if start_time_str:
-                    # Parse ISO format datetime
-                    return datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-            return None
+            return await self.class_session_crud.get(class_id)
         except Exception as e:
-            logger.error(f"Error getting class start time: {str(e)}")
+            logger.error(f"Error getting class session: {str(e)}")
             return None
     
+    @staticmethod
+    def _session_start_time(session: Optional[Dict[str, Any]]) -> Optional[datetime]:
+        """Parse the start time of a class session row"""
+        start_time_str = (session or {}).get("start_time")
+        if not start_time_str:
+            return None
+        try:
+            # Parse ISO format datetime
+            return datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
+        except ValueError as e:
+            logger.error(f"Error parsing class start time: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _session_course_id(session: Optional[Dict[str, Any]]) -> Optional[str]:
+        """course_id stored in the class session metadata, if any"""
+        metadata = (session or {}).get("metadata") or {}
+        return metadata.get("course_id") if isinstance(metadata, dict) else None
+    
+    async def _get_class_start_time(self, class_id: str) -> Optional[datetime]:
+        """
+        Get the start time of a class session
+        
+        Args:
+            class_id: Class session identifier
+        
+        Returns:
+            Start time as datetime or None if not found
+        """
+        return self._session_start_time(await self._get_class_session(class_id))
+    
     def _determine_attendance_status(self, class_start_time: Optional[datetime]) -> str:
         """
         Determine if attendance should be marked as 'present' or 'late'
@@ -118,78 +182,161 @@ class AttendanceService:
                 raise FaceNotDetectedException("Invalid or too small image")
             
             # Generate embedding
-            embedding = self.face_service.generate_embedding(image)
-            
-            # Search for matching student with LOWER threshold to debug
-            logger.warning(f"🔍 Searching for match with threshold 0.8...")
-            matches = await self.student_crud.find_by_embedding(
-                embedding=embedding,
-                threshold=0.8,  # TEMPORARY: Lower threshold for debugging
-                limit=5  # Get top 5 matches to see distances
-            )
-            
-            logger.warning(f"🔍 Found {len(matches)} potential matches")
-            for i, (student, distance) in enumerate(matches[:3]):
-                confidence = 1.0 - (distance / 1.0)
-                logger.warning(f"  Match #{i+1}: Student {student['student_id']} - Distance: {distance:.4f} - Confidence: {confidence:.2%}")
-            
-            if not matches:
-                logger.warning("❌ No matching student found (threshold=0.8)")
-                return {
-                    "success": False,
-                    "message": "Student not recognized",
-                    "confidence": 0.0
-                }
-            
-            # Get best match
-            student_record, distance = matches[0]
-            confidence = 1.0 - (distance / 1.0)  # Convert distance to confidence
-            
-            # Get class start time and determine if late
-            class_start_time = await self._get_class_start_time(class_id)
-            attendance_status = self._determine_attendance_status(class_start_time)
-            
-            # Mark attendance (will check for duplicates automatically)
-            attendance_record = await self.attendance_crud.mark_attendance(
-                student_id=student_record["student_id"],
-                class_id=class_id,
-                status=attendance_status,
-                confidence=confidence,
-                match_distance=distance
-            )
-            
-            # Check if attendance was already registered
-            already_registered = attendance_record.get("already_registered", False)
-            
-            if already_registered:
-                logger.info(f"Attendance already registered for {student_record['student_id']} in {class_id}")
-                return {
-                    "success": True,
-                    "already_registered": True,
-                    "student_id": student_record["student_id"],
-                    "student_name": student_record["name"],
-                    "status": attendance_record.get("status", AttendanceStatus.PRESENT.value),
-                    "confidence": confidence,
-                    "match_distance": distance,
-                    "timestamp": attendance_record["timestamp"],
-                    "message": f"⚠️ El estudiante {student_record['name']} ya tiene asistencia registrada en esta clase"
-                }
-            
-            # Build status message based on attendance status
-            status_msg = "✅ Presente" if attendance_status == AttendanceStatus.PRESENT.value else "⚠️ Atrasado"
-            logger.info(f"Attendance verified for {student_record['student_id']} - {status_msg} (confidence: {confidence:.2f})")
+            embedding = await self.face_service.generate_embedding_async(image)
             
+            return await self._verify_embedding(embedding, class_id)
+        
+        except FaceNotDetectedException as e:
+            logger.warning(f"Face not detected: {str(e)}")
+            return {
+                "success": False,
+                "message": str(e),
+                "confidence": 0.0
+            }
+        except Exception as e:
+            logger.error(f"Attendance verification failed: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Verification error: {str(e)}",
+                "confidence": 0.0
+            }
+    
+    async def _verify_embedding(
+        self,
+        embedding: List[float],
+        class_id: str
+    ) -> Dict[str, Any]:
+        """
+        Match a face embedding against enrolled students and mark attendance
+        
+        Args:
+            embedding: Face embedding of the student to verify
+            class_id: Class session identifier
+        
+        Returns:
+            Dict with student info, status, and confidence
+        """
+        # Una sola consulta para la hora de inicio y el curso de la clase
+        class_session = await self._get_class_session(class_id)
+        
+        # Search for matching student with LOWER threshold to debug
+        logger.warning(f"🔍 Searching for match with threshold 0.8...")
+        matches = await self.student_crud.find_by_embedding(
+            embedding=embedding,
+            threshold=0.8,  # TEMPORARY: Lower threshold for debugging
+            limit=5,  # Get top 5 matches to see distances
+            course_id=self._session_course_id(class_session)
+        )
+        
+        logger.warning(f"🔍 Found {len(matches)} potential matches")
+        for i, (student, distance) in enumerate(matches[:3]):
+            confidence = 1.0 - (distance / 1.0)
+            logger.warning(f"  Match #{i+1}: Student {student['student_id']} - Distance: {distance:.4f} - Confidence: {confidence:.2%}")
+        
+        if not matches:
+            logger.warning("❌ No matching student found (threshold=0.8)")
+            return {
+                "success": False,
+                "message": "Student not recognized",
+                "confidence": 0.0
+            }
+        
+        # Get best match
+        student_record, distance = matches[0]
+        confidence = 1.0 - (distance / 1.0)  # Convert distance to confidence
+        
+        # Determine if late from the class start time
+        class_start_time = self._session_start_time(class_session)
+        attendance_status = self._determine_attendance_status(class_start_time)
+        
+        # Mark attendance (will check for duplicates automatically)
+        attendance_record = await self.attendance_crud.mark_attendance(
+            student_id=student_record["student_id"],
+            class_id=class_id,
+            status=attendance_status,
+            confidence=confidence,
+            match_distance=distance
+        )
+        
+        # Check if attendance was already registered
+        already_registered = attendance_record.get("already_registered", False)
+        
+        if already_registered:
+            logger.info(f"Attendance already registered for {student_record['student_id']} in {class_id}")
             return {
                 "success": True,
-                "already_registered": False,
+                "already_registered": True,
                 "student_id": student_record["student_id"],
                 "student_name": student_record["name"],
-                "status": attendance_status,
+                "status": attendance_record.get("status", AttendanceStatus.PRESENT.value),
                 "confidence": confidence,
                 "match_distance": distance,
-                "timestamp": attendance_record["timestamp"]
+                "timestamp": attendance_record["timestamp"],
+                "message": f"⚠️ El estudiante {student_record['name']} ya tiene asistencia registrada en esta clase"
             }
         
+        # Build status message based on attendance status
+        status_msg = "✅ Presente" if attendance_status == AttendanceStatus.PRESENT.value else "⚠️ Atrasado"
+        logger.info(f"Attendance verified for {student_record['student_id']} - {status_msg} (confidence: {confidence:.2f})")
+        
+        return {
+            "success": True,
+            "already_registered": False,
+            "student_id": student_record["student_id"],
+            "student_name": student_record["name"],
+            "status": attendance_status,
+            "confidence": confidence,
+            "match_distance": distance,
+            "timestamp": attendance_record["timestamp"]
+        }
+    
+    async def verify_attendance_with_emotion(
+        self,
+        image_base64: str,
+        class_id: str
+    ) -> Dict[str, Any]:
+        """
+        Verify attendance and record the student's emotion from one frame
+        
+        The image is decoded once and the face detected/aligned once; the same
+        crop feeds both the recognition and the emotion model.
+        
+        Args:
+            image_base64: Base64 encoded image
+            class_id: Class session identifier
+        
+        Returns:
+            verify_attendance() result plus "emotion" and "emotion_saved"
+        """
+        try:
+            image = self.image_service.base64_to_image(image_base64)
+            
+            if not self.image_service.validate_image(image):
+                raise FaceNotDetectedException("Invalid or too small image")
+            
+            frame = await analyze_frame(image)
+            result = await self._verify_embedding(frame["embedding"], class_id)
+            
+            emotion = frame["emotion"]
+            result["emotion"] = emotion
+            result["emotion_saved"] = False
+            
+            if result["success"] and emotion:
+                try:
+                    await self.emotion_crud.enqueue_emotion(
+                        student_id=result["student_id"],
+                        class_id=class_id,
+                        dominant_emotion=emotion["dominant_emotion"],
+                        confidence=emotion["confidence"],
+                        emotion_scores=emotion["all_emotions"]
+                    )
+                    result["emotion_saved"] = True
+                except Exception as e:
+                    # Attendance was marked; a failed emotion insert must not undo that
+                    logger.error(f"Failed to record emotion for {result['student_id']}: {str(e)}")
+            
+            return result
+        
         except FaceNotDetectedException as e:
             logger.warning(f"Face not detected: {str(e)}")
             return {
@@ -198,7 +345,7 @@ class AttendanceService:
                 "confidence": 0.0
             }
         except Exception as e:
-            logger.error(f"Attendance verification failed: {str(e)}")
+            logger.error(f"Attendance + emotion verification failed: {str(e)}")
             return {
                 "success": False,
                 "message": f"Verification error: {str(e)}",
@@ -213,6 +360,9 @@ class AttendanceService:
         """
         Verify multiple students from multiple images
         
+        All faces are embedded together with batched forward passes, then each
+        embedding is matched and marked individually.
+        
         Args:
             images_base64: List of base64 encoded images
             class_id: Class session identifier
@@ -230,9 +380,28 @@ class AttendanceService:
             "processing_time": 0.0
         }
         
+        # Decode and validate all images first (invalid ones count as unidentified)
+        images = []
         for idx, image_b64 in enumerate(images_base64):
             try:
-                verification = await self.verify_attendance(image_b64, class_id)
+                image = self.image_service.base64_to_image(image_b64)
+                images.append(image if self.image_service.validate_image(image) else None)
+            except Exception as e:
+                logger.error(f"Failed to decode image {idx}: {str(e)}")
+                images.append(None)
+        
+        valid_indices = [idx for idx, image in enumerate(images) if image is not None]
+        embeddings = await self.face_service.batch_generate_embeddings(
+            [images[idx] for idx in valid_indices]
+        )
+        results["unidentified_count"] += len(images) - len(valid_indices)
+        
+        for idx, embedding in zip(valid_indices, embeddings):
+            if embedding is None:
+                results["unidentified_count"] += 1
+                continue
+            try:
+                verification = await self._verify_embedding(embedding, class_id)
                 
                 if verification["success"]:
                     results["students_identified"].append(verification)
@@ -251,6 +420,99 @@ class AttendanceService:
         
         return results
     
+    async def verify_group_photo(
+        self,
+        image_base64: str,
+        class_id: str
+    ) -> Dict[str, Any]:
+        """
+        Mark attendance for every recognized student in one classroom photo
+        
+        All faces are detected and embedded together, matched against the
+        gallery in one matrix operation, assigned one-to-one to students and
+        written with a single bulk insert.
+        
+        Args:
+            image_base64: Base64 encoded group photo
+            class_id: Class session identifier
+        
+        Returns:
+            Dict with per-face results and summary counts
+        """
+        start_time = datetime.utcnow()
+        
+        image = self.image_service.base64_to_image(image_base64)
+        if not self.image_service.validate_image(image):
+            raise FaceNotDetectedException("Invalid or too small image")
+        
+        group = await self.face_service.embed_group_photo(image)
+        faces = group["faces"]
+        if not faces:
+            raise FaceNotDetectedException()
+        
+        # Una sola consulta de hora de inicio y curso para toda la foto
+        class_session = await self._get_class_session(class_id)
+        
+        # Umbral de producción: con N rostros por foto un umbral laxo multiplica los falsos aceptados
+        candidates = await self.student_crud.find_by_embeddings(
+            group["embeddings"],
+            threshold=settings.FACE_MATCH_THRESHOLD,
+            limit=GROUP_MATCH_CANDIDATES,
+            course_id=self._session_course_id(class_session)
+        )
+        assignments, conflicts = _assign_faces_to_students(candidates)
+        
+        class_start_time = self._session_start_time(class_session)
+        attendance_status = self._determine_attendance_status(class_start_time)
+        
+        matched_faces = sorted(assignments)
+        records = await self.attendance_crud.mark_attendance_bulk(
+            class_id,
+            [
+                {
+                    "student_id": assignments[idx][0]["student_id"],
+                    "status": attendance_status,
+                    "confidence": 1.0 - assignments[idx][1],
+                    "match_distance": assignments[idx][1]
+                }
+                for idx in matched_faces
+            ]
+        )
+        records_by_face = dict(zip(matched_faces, records))
+        
+        results = {
+            "class_id": class_id,
+            "faces_detected": len(faces),
+            "students_identified": [],
+            "unidentified_faces": [],
+            "conflicts_resolved": conflicts,
+            "processing_time": 0.0
+        }
+        for idx, face in enumerate(faces):
+            if idx not in assignments:
+                results["unidentified_faces"].append(face)
+                continue
+            student_record, distance = assignments[idx]
+            record = records_by_face[idx]
+            results["students_identified"].append({
+                "student_id": student_record["student_id"],
+                "student_name": student_record["name"],
+                "already_registered": record["already_registered"],
+                "status": record.get("status", attendance_status),
+                "confidence": 1.0 - distance,
+                "match_distance": distance,
+                "timestamp": record.get("timestamp"),
+                **face
+            })
+        results["unidentified_count"] = len(results["unidentified_faces"])
+        results["processing_time"] = (datetime.utcnow() - start_time).total_seconds()
+        
+        logger.info(
+            f"Group photo attendance: {len(assignments)}/{len(faces)} faces identified "
+            f"({conflicts} conflicts resolved) in {results['processing_time']:.2f}s"
+        )
+        return results
+    
     async def get_class_attendance_report(self, class_id: str) -> Dict[str, Any]:
         """
         Get attendance report for a class session
@@ -0,0 +1,200 @@
+"""
+Smart Classroom AI - Rotating Code Stream
+Pushes each class's rotating code to the teacher screens (Server-Sent Events)
+at the slot boundaries instead of having them poll /qr/code/{class_id}
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.qr_service import RotatingCodeService, CODE_ROTATION_MINUTES
+
+
+# Tamaño de la cola de cada conexión: solo importa el código más reciente
+STREAM_QUEUE_SIZE = 1
+
+# Comentario SSE que mantiene viva la conexión a través de proxies
+HEARTBEAT_EVENT = ": keepalive\n\n"
+
+# Reintento de EventSource (ms) cuando el servidor cierra el stream
+RECONNECT_MILLISECONDS = 1000
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class RotatingCodeBroadcaster:
+    """
+    Single scheduler for the rotating code streams of every class
+
+    Codes of all classes change on the same epoch-aligned slots
+    (RotatingCodeService._get_current_time_slot), so one timer, sleeping
+    until the next boundary, serves every subscribed class: at each boundary
+    the new code is computed once per class and put in its subscribers'
+    queues. Between boundaries a connection is only a socket and a parked
+    queue; the timer runs while there is at least one subscriber.
+
+    Each stream ends after ``max_seconds`` and EventSource reconnects on its
+    own: uvicorn waits for open connections before running the lifespan
+    shutdown, so streams must not outlive a deploy.
+    """
+
+    def __init__(self, heartbeat_seconds: Optional[int] = None, max_seconds: Optional[int] = None):
+        self.heartbeat_seconds = (
+            settings.CODE_STREAM_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+        )
+        self.max_seconds = settings.CODE_STREAM_MAX_SECONDS if max_seconds is None else max_seconds
+        self._code_service: Optional[RotatingCodeService] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.rotations = 0
+        self.events_sent = 0
+        self.stale_dropped = 0
+
+    @property
+    def code_service(self) -> RotatingCodeService:
+        if self._code_service is None:
+            self._code_service = RotatingCodeService()
+        return self._code_service
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def code_event(self, class_id: str) -> str:
+        """SSE message with the current code of a class"""
+        return format_sse("code", {"class_id": class_id, **self.code_service.get_current_code(class_id)})
+
+    def subscribe(self, class_id: str) -> asyncio.Queue:
+        """Register a connection; it receives the current code right away"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(class_id, set()).add(queue)
+        self._push(queue, self.code_event(class_id))
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, class_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(class_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[class_id]
+
+    async def stream(self, class_id: str) -> AsyncIterator[str]:
+        """SSE body of one connection (ends on client disconnect, shutdown or after max_seconds)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_seconds if self.max_seconds > 0 else None
+        queue = self.subscribe(class_id)
+        try:
+            yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+            while True:
+                if deadline is None:
+                    message = await queue.get()
+                else:
+                    try:
+                        message = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(class_id, queue)
+
+    def _push(self, queue: asyncio.Queue, message: Optional[str]) -> None:
+        """Enqueue without blocking; a slow client skips straight to the newest message"""
+        if queue.full():
+            queue.get_nowait()
+            self.stale_dropped += 1
+        queue.put_nowait(message)
+        self.events_sent += 1
+
+    def _rotate(self) -> None:
+        """New slot: one code computation per class, fanned out to its connections"""
+        self.rotations += 1
+        for class_id, queues in list(self._subscribers.items()):
+            message = self.code_event(class_id)
+            for queue in list(queues):
+                self._push(queue, message)
+
+    def _heartbeat(self) -> None:
+        for queues in list(self._subscribers.values()):
+            for queue in list(queues):
+                if queue.empty():
+                    self._push(queue, HEARTBEAT_EVENT)
+
+    async def _run(self) -> None:
+        slot = self.code_service._get_current_time_slot()
+        next_heartbeat = time.time() + self.heartbeat_seconds
+        while self._subscribers:
+            boundary = (slot + 1) * CODE_ROTATION_MINUTES * 60
+            deadline = min(boundary, next_heartbeat) if self.heartbeat_seconds > 0 else boundary
+            await asyncio.sleep(max(0.0, deadline - time.time()))
+
+            current_slot = self.code_service._get_current_time_slot()
+            if current_slot != slot:
+                slot = current_slot
+                self._rotate()
+                next_heartbeat = time.time() + self.heartbeat_seconds
+            elif self.heartbeat_seconds > 0 and time.time() >= next_heartbeat:
+                self._heartbeat()
+                next_heartbeat = time.time() + self.heartbeat_seconds
+            # Si despertó un instante antes del límite, vuelve a dormir lo que falta
+        self._task = None
+
+    async def stop(self) -> None:
+        """Cancel the timer and end the open streams"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        closed = self.connections
+        for queues in list(self._subscribers.values()):
+            for queue in list(queues):
+                self._push(queue, None)
+        if closed:
+            logger.info(f"Closed {closed} rotating code streams")
+
+    def stats(self) -> Dict[str, Any]:
+        """Open streams and scheduler counters"""
+        return {
+            "running": self.running,
+            "classes": len(self._subscribers),
+            "connections": self.connections,
+            "rotation_minutes": CODE_ROTATION_MINUTES,
+            "heartbeat_seconds": self.heartbeat_seconds,
+            "max_seconds": self.max_seconds,
+            "rotations": self.rotations,
+            "events_sent": self.events_sent,
+            "stale_dropped": self.stale_dropped
+        }
+
+
+# ============================================================================
+# INSTANCIA GLOBAL
+# ============================================================================
+
+_code_broadcaster: Optional[RotatingCodeBroadcaster] = None
+
+
+def get_code_broadcaster() -> RotatingCodeBroadcaster:
+    """Get the process-wide rotating code broadcaster (Singleton)"""
+    global _code_broadcaster
+    if _code_broadcaster is None:
+        _code_broadcaster = RotatingCodeBroadcaster()
+    return _code_broadcaster
@@ -71,7 +71,7 @@ class EnrollmentService:
                 logger.warning(f"Failed to upload photo for {student_id}, continuing without URL")
             
             # Generate embedding
-            embedding = self.face_service.generate_embedding(image)
+            embedding = await self.face_service.generate_embedding_async(image)
             
             # Save to database
             student_record = await self.student_crud.create(
@@ -151,7 +151,7 @@ class EnrollmentService:
                 raise FaceNotDetectedException("Invalid image")
             
             # Generate new embedding
-            new_embedding = self.face_service.generate_embedding(image)
+            new_embedding = await self.face_service.generate_embedding_async(image)
             
             # Update database
             await self.student_crud.update(
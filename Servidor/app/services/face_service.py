@@ -8,18 +8,160 @@ import cv2
 import numpy as np
 import base64
 import io
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from PIL import Image
 from deepface import DeepFace
+from deepface.modules import preprocessing
 from app.core.config import settings
 from app.core.logger import logger
-from app.core.constants import EmotionType
+from app.core.constants import EmotionType, EMOTION_SCORE_ORDER
 from app.core.exceptions import (
     FaceNotDetectedException,
     MultipleFacesDetectedException,
     FaceRecognitionFailedException,
     InvalidImageException
 )
+from app.services.inference_executor import InferenceExecutor
+
+
+# Orden de salida del modelo de emociones de DeepFace
+EMOTION_LABELS = list(EMOTION_SCORE_ORDER)
+
+
+# ============================================================================
+# BATCHED INFERENCE HELPERS
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def _build_deepface_model(task: str, model_name: str):
+    """Build (or reuse) a DeepFace model client, across DeepFace API versions"""
+    try:
+        return DeepFace.build_model(task=task, model_name=model_name)
+    except TypeError:
+        # DeepFace < 0.0.90 does not accept the task argument
+        return DeepFace.build_model(model_name=model_name)
+
+
+def _keras_model(model_client):
+    """Return the underlying Keras model of a DeepFace client"""
+    return getattr(model_client, "model", model_client)
+
+
+def _model_input_size(model_client) -> Tuple[int, int]:
+    """(height, width) expected by a DeepFace model"""
+    shape = _keras_model(model_client).input_shape
+    return int(shape[1]), int(shape[2])
+
+
+def _detect_primary_face(
+    image: np.ndarray,
+    detector: str,
+    enforce_detection: bool = True
+) -> np.ndarray:
+    """
+    Detect and align the first face in an image
+    
+    Returns:
+        Aligned face crop (RGB, float in [0, 1]) as produced by DeepFace
+    
+    Raises:
+        FaceNotDetectedException: If no face found
+        MultipleFacesDetectedException: If multiple faces found and multi-face is disabled
+    """
+    try:
+        faces = DeepFace.extract_faces(
+            img_path=image,
+            detector_backend=detector,
+            enforce_detection=enforce_detection,
+            align=True
+        )
+    except ValueError as e:
+        if "Face could not be detected" in str(e):
+            raise FaceNotDetectedException()
+        raise FaceRecognitionFailedException(str(e))
+    
+    if not faces:
+        raise FaceNotDetectedException()
+    if len(faces) > 1 and not settings.ENABLE_MULTI_FACE_DETECTION:
+        raise MultipleFacesDetectedException()
+    
+    return faces[0]["face"]
+
+
+def _detect_all_faces(image: np.ndarray, detector: str) -> List[Dict[str, Any]]:
+    """
+    Detect and align every face in an image (group photo)
+    
+    Returns:
+        DeepFace detections ({"face", "facial_area", "confidence"}); empty if none found
+    """
+    try:
+        faces = DeepFace.extract_faces(
+            img_path=image,
+            detector_backend=detector,
+            enforce_detection=False,
+            align=True
+        )
+    except ValueError as e:
+        raise FaceRecognitionFailedException(str(e))
+    
+    # Sin enforce_detection DeepFace devuelve la imagen completa con confianza 0
+    # cuando no encuentra rostros
+    return [face for face in faces if face.get("confidence", 0) > 0]
+
+
+def _recognition_input(face: np.ndarray, target_size: Tuple[int, int]) -> np.ndarray:
+    """Preprocess an aligned face exactly like DeepFace.represent does"""
+    img = face[:, :, ::-1]  # RGB -> BGR
+    img = preprocessing.resize_image(img=img, target_size=target_size)
+    img = preprocessing.normalize_input(img=img, normalization="base")
+    return img[0]
+
+
+def _emotion_input(face: np.ndarray) -> np.ndarray:
+    """Preprocess an aligned face exactly like DeepFace.analyze(actions=['emotion']) does"""
+    img = face[:, :, ::-1]  # RGB -> BGR
+    img = preprocessing.resize_image(img=img, target_size=(224, 224))[0]
+    gray = cv2.cvtColor(img.astype(np.float32), cv2.COLOR_BGR2GRAY)
+    gray = cv2.resize(gray, (48, 48))
+    return np.expand_dims(gray, axis=-1)
+
+
+def _forward_in_batches(
+    model_client,
+    inputs: List[np.ndarray],
+    batch_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Run a model over preprocessed inputs, one forward pass per mini-batch
+    
+    Returns:
+        Array with one output row per input
+    """
+    batch_size = max(1, batch_size or settings.BATCH_SIZE)
+    keras_model = _keras_model(model_client)
+    outputs = []
+    for start in range(0, len(inputs), batch_size):
+        batch = np.stack(inputs[start:start + batch_size]).astype(np.float32)
+        result = keras_model(batch, training=False)
+        outputs.append(result.numpy() if hasattr(result, "numpy") else np.asarray(result))
+    return np.concatenate(outputs, axis=0)
+
+
+def _emotion_result(probabilities: np.ndarray) -> Dict[str, Any]:
+    """Convert raw emotion probabilities to the analyze_emotion() result format"""
+    total = float(np.sum(probabilities)) or 1.0
+    emotions = {
+        label: float(100 * probabilities[i] / total)
+        for i, label in enumerate(EMOTION_LABELS)
+    }
+    dominant = EMOTION_LABELS[int(np.argmax(probabilities))]
+    return {
+        "dominant_emotion": _map_emotion_to_classroom(dominant),
+        "confidence": emotions[dominant],
+        "all_emotions": emotions
+    }
 
 
 class FaceRecognitionService:
@@ -93,6 +235,10 @@ class FaceRecognitionService:
             self.logger.error(f"Embedding generation failed: {str(e)}")
             raise FaceRecognitionFailedException(str(e))
     
+    async def generate_embedding_async(self, image: np.ndarray) -> List[float]:
+        """Run generate_embedding() in the inference pool without blocking the event loop"""
+        return await inference_executor.run(_worker_generate_embedding, image)
+    
     def detect_faces(self, image: np.ndarray) -> List[Dict[str, Any]]:
         """
         Detect all faces in image
@@ -157,28 +303,108 @@ class FaceRecognitionService:
         """Check if distance indicates a match"""
         return distance < settings.FACE_MATCH_THRESHOLD
     
+    def embed_faces(
+        self,
+        faces: List[np.ndarray],
+        batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Embed already detected and aligned faces with batched forward passes
+        
+        Args:
+            faces: Aligned face crops (RGB, float in [0, 1])
+            batch_size: Faces per forward pass (default: settings.BATCH_SIZE)
+        
+        Returns:
+            (n, dim) float32 matrix of embeddings
+        """
+        if not faces:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        model_client = _build_deepface_model("facial_recognition", self.model)
+        target_size = _model_input_size(model_client)
+        inputs = [_recognition_input(face, target_size) for face in faces]
+        embeddings = _forward_in_batches(model_client, inputs, batch_size)
+        return embeddings.astype(np.float32)
+    
+    def embed_group_photo_sync(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Detect every face in one image and embed them all in batched forward passes
+        
+        Args:
+            image: Input image (e.g. a wide classroom photo)
+        
+        Returns:
+            {"faces": [{"facial_area", "detection_confidence"}], "embeddings": (n, dim) float32 matrix}
+        """
+        detections = _detect_all_faces(image, self.detector)
+        self.logger.info(f"Detected {len(detections)} face(s) in group photo")
+        return {
+            "faces": [
+                {
+                    "facial_area": detection.get("facial_area", {}),
+                    "detection_confidence": float(detection.get("confidence", 0.0))
+                }
+                for detection in detections
+            ],
+            "embeddings": self.embed_faces([detection["face"] for detection in detections])
+        }
+    
+    async def embed_group_photo(self, image: np.ndarray) -> Dict[str, Any]:
+        """Run embed_group_photo_sync() in the inference pool"""
+        return await inference_executor.run(_worker_embed_group_photo, image)
+    
     async def batch_generate_embeddings(
         self,
-        images: List[np.ndarray]
+        images: List[np.ndarray],
+        batch_size: Optional[int] = None
     ) -> List[Optional[List[float]]]:
         """
         Generate embeddings for multiple images
         
+        Faces are detected and aligned per image, then all crops are embedded
+        together, one forward pass per mini-batch of ``batch_size`` faces.
+        The whole batch runs in one inference worker.
+        
         Args:
             images: List of input images
+            batch_size: Faces per forward pass (default: settings.BATCH_SIZE)
         
         Returns:
             List of embeddings (None for failed images)
         """
-        embeddings = []
+        return await inference_executor.run(_worker_batch_generate_embeddings, images, batch_size)
+    
+    def batch_generate_embeddings_sync(
+        self,
+        images: List[np.ndarray],
+        batch_size: Optional[int] = None
+    ) -> List[Optional[List[float]]]:
+        """Blocking implementation of batch_generate_embeddings()"""
+        embeddings: List[Optional[List[float]]] = [None] * len(images)
+        faces = []
+        face_indices = []
+        
         for idx, image in enumerate(images):
             try:
-                embedding = self.generate_embedding(image)
-                embeddings.append(embedding)
+                faces.append(_detect_primary_face(image, self.detector))
+                face_indices.append(idx)
             except Exception as e:
                 self.logger.warning(f"Failed to process image {idx}: {str(e)}")
-                embeddings.append(None)
         
+        if not faces:
+            return embeddings
+        
+        try:
+            vectors = self.embed_faces(faces, batch_size)
+        except Exception as e:
+            self.logger.error(f"Batched embedding generation failed: {str(e)}")
+            return embeddings
+        
+        for idx, vector in zip(face_indices, vectors):
+            embeddings[idx] = vector.tolist()
+        
+        self.logger.info(f"Batch embeddings: {len(faces)}/{len(images)} faces embedded")
         return embeddings
 
 
@@ -243,6 +469,10 @@ class EmotionAnalysisService:
             self.logger.error(f"Emotion analysis failed: {str(e)}")
             raise FaceRecognitionFailedException(f"Emotion analysis error: {str(e)}")
     
+    async def analyze_emotion_async(self, image: np.ndarray) -> Dict[str, Any]:
+        """Run analyze_emotion() in the inference pool without blocking the event loop"""
+        return await inference_executor.run(_worker_analyze_emotion, image)
+    
     def _map_emotion(self, deepface_emotion: str) -> str:
         """
         Map DeepFace emotion to our custom classroom emotions
@@ -262,27 +492,78 @@ class EmotionAnalysisService:
         
         return emotion_mapping.get(deepface_emotion.lower(), EmotionType.NEUTRAL.value)
     
+    def classify_faces(
+        self,
+        faces: List[np.ndarray],
+        batch_size: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Classify emotions of already detected and aligned faces in batches
+        
+        Args:
+            faces: Aligned face crops (RGB, float in [0, 1])
+            batch_size: Faces per forward pass (default: settings.BATCH_SIZE)
+        
+        Returns:
+            One analyze_emotion()-style result per face
+        """
+        if not faces:
+            return []
+        
+        model_client = _build_deepface_model("facial_attribute", "Emotion")
+        inputs = [_emotion_input(face) for face in faces]
+        probabilities = _forward_in_batches(model_client, inputs, batch_size)
+        return [_emotion_result(row) for row in probabilities]
+    
     async def batch_analyze_emotions(
         self,
-        images: List[np.ndarray]
+        images: List[np.ndarray],
+        batch_size: Optional[int] = None
     ) -> List[Optional[Dict[str, Any]]]:
         """
         Analyze emotions for multiple images
         
+        Faces are detected per image, then classified together, one forward
+        pass per mini-batch of ``batch_size`` faces. The whole batch runs in
+        one inference worker.
+        
         Args:
             images: List of input images
+            batch_size: Faces per forward pass (default: settings.BATCH_SIZE)
         
         Returns:
-            List of emotion analysis results
+            List of emotion analysis results (None for failed images)
         """
-        results = []
+        return await inference_executor.run(_worker_batch_analyze_emotions, images, batch_size)
+    
+    def batch_analyze_emotions_sync(
+        self,
+        images: List[np.ndarray],
+        batch_size: Optional[int] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Blocking implementation of batch_analyze_emotions()"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        faces = []
+        face_indices = []
+        
         for idx, image in enumerate(images):
             try:
-                emotion = self.analyze_emotion(image)
-                results.append(emotion)
+                faces.append(_detect_primary_face(image, self.detector))
+                face_indices.append(idx)
             except Exception as e:
                 self.logger.warning(f"Failed to analyze emotion for image {idx}: {str(e)}")
-                results.append(None)
+        
+        if not faces:
+            return results
+        
+        try:
+            emotions = self.classify_faces(faces, batch_size)
+        except Exception as e:
+            self.logger.error(f"Batched emotion analysis failed: {str(e)}")
+            return results
+        
+        for idx, emotion in zip(face_indices, emotions):
+            results[idx] = emotion
         
         return results
 
@@ -333,6 +614,7 @@ async def get_face_embedding(image_base64: str) -> List[float]:
     Recibe una imagen en Base64, detecta la cara y devuelve el vector (embedding).
     
     Esta es la función principal que debes usar desde tus endpoints.
+    La inferencia corre en el pool de procesos, sin bloquear el event loop.
     
     Args:
         image_base64: Imagen codificada en Base64
@@ -345,6 +627,11 @@ async def get_face_embedding(image_base64: str) -> List[float]:
         FaceNotDetectedException: Si no se detecta ningún rostro
         FaceRecognitionFailedException: Si falla el procesamiento
     """
+    return await inference_executor.run(_get_face_embedding_sync, image_base64)
+
+
+def _get_face_embedding_sync(image_base64: str) -> List[float]:
+    """Implementación bloqueante de get_face_embedding() (corre en el worker)"""
     try:
         # 1. Convertir texto a imagen real
         img = load_image_from_base64(image_base64)
@@ -383,6 +670,8 @@ async def analyze_face_emotion(image_base64: str) -> Dict[str, Any]:
     """
     Analiza la emoción dominante en la imagen.
     
+    La inferencia corre en el pool de procesos, sin bloquear el event loop.
+    
     Args:
         image_base64: Imagen codificada en Base64
     
@@ -394,6 +683,11 @@ async def analyze_face_emotion(image_base64: str) -> Dict[str, Any]:
             "all_emotions": {"happy": 89.2, "sad": 5.1, ...}
         }
     """
+    return await inference_executor.run(_analyze_face_emotion_sync, image_base64)
+
+
+def _analyze_face_emotion_sync(image_base64: str) -> Dict[str, Any]:
+    """Implementación bloqueante de analyze_face_emotion() (corre en el worker)"""
     try:
         img = load_image_from_base64(image_base64)
         
@@ -445,6 +739,96 @@ def _map_emotion_to_classroom(deepface_emotion: str) -> str:
     return emotion_mapping.get(deepface_emotion.lower(), EmotionType.NEUTRAL.value)
 
 
+# ============================================================================
+# PIPELINE FUSIONADO (detectar una vez -> reconocimiento + emoción)
+# ============================================================================
+
+def analyze_frame_sync(image: np.ndarray) -> Dict[str, Any]:
+    """
+    Detecta y alinea el rostro UNA sola vez y alimenta el mismo recorte
+    al modelo de reconocimiento y al de emociones.
+    
+    Args:
+        image: Imagen BGR ya decodificada
+    
+    Returns:
+        {"embedding": [...], "emotion": {dominant_emotion, confidence, all_emotions}}
+    
+    Raises:
+        FaceNotDetectedException: Si no se detecta ningún rostro
+        MultipleFacesDetectedException: Si hay varios rostros y multi-face está deshabilitado
+    """
+    face = _detect_primary_face(image, settings.FACE_DETECTOR_BACKEND)
+    embedding = FaceRecognitionService().embed_faces([face], batch_size=1)[0]
+    emotion = None
+    if settings.ENABLE_EMOTION_ANALYSIS:
+        emotion = EmotionAnalysisService().classify_faces([face], batch_size=1)[0]
+    return {
+        "embedding": embedding.tolist(),
+        "emotion": emotion
+    }
+
+
+async def analyze_frame(image: np.ndarray) -> Dict[str, Any]:
+    """Versión asíncrona de analyze_frame_sync() (corre en el pool de inferencia)"""
+    return await inference_executor.run(analyze_frame_sync, image)
+
+
+# ============================================================================
+# INFERENCE POOL (workers con modelos pre-cargados)
+# ============================================================================
+
+def warm_up_models() -> None:
+    """
+    Pre-carga los modelos de reconocimiento, detección y emociones.
+    
+    Se ejecuta una vez al crear cada worker del pool, así la primera petición
+    no paga el costo de cargar TensorFlow y los pesos.
+    """
+    for task, model_name in (
+        ("facial_recognition", settings.FACE_RECOGNITION_MODEL),
+        ("face_detector", settings.FACE_DETECTOR_BACKEND),
+        ("facial_attribute", "Emotion"),
+    ):
+        try:
+            _build_deepface_model(task, model_name)
+        except Exception as e:
+            logger.warning(f"No se pudo pre-cargar {model_name}: {str(e)}")
+    logger.info("🧠 Worker de inferencia listo (modelos en memoria)")
+
+
+# Funciones de nivel de módulo: el pool necesita poder serializarlas (pickle)
+
+def _worker_generate_embedding(image: np.ndarray) -> List[float]:
+    return FaceRecognitionService().generate_embedding(image)
+
+
+def _worker_batch_generate_embeddings(
+    images: List[np.ndarray],
+    batch_size: Optional[int]
+) -> List[Optional[List[float]]]:
+    return FaceRecognitionService().batch_generate_embeddings_sync(images, batch_size)
+
+
+def _worker_embed_group_photo(image: np.ndarray) -> Dict[str, Any]:
+    return FaceRecognitionService().embed_group_photo_sync(image)
+
+
+def _worker_analyze_emotion(image: np.ndarray) -> Dict[str, Any]:
+    return EmotionAnalysisService().analyze_emotion(image)
+
+
+def _worker_batch_analyze_emotions(
+    images: List[np.ndarray],
+    batch_size: Optional[int]
+) -> List[Optional[Dict[str, Any]]]:
+    return EmotionAnalysisService().batch_analyze_emotions_sync(images, batch_size)
+
+
+# Instancia global del pool (se inicia en el lifespan de main.py)
+inference_executor = InferenceExecutor(initializer=warm_up_models)
+
+
 # ============================================================================
 # CLASES LEGACY (Mantener compatibilidad con código existente)
 # ============================================================================
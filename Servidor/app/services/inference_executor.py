@@ -0,0 +1,133 @@
+"""
+Smart Classroom AI - Inference Executor
+Warm process pool that keeps DeepFace/TensorFlow work off the asyncio event loop
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.logger import logger
+
+
+def _ping() -> bool:
+    """No-op task used to force worker spawn (and model preload) at startup"""
+    return True
+
+
+class InferenceExecutor:
+    """
+    Process pool for CPU-bound model inference
+
+    Workers are spawned (not forked, TensorFlow is not fork-safe) and run
+    ``initializer`` once so that models are already in memory when the first
+    request arrives. If the pool is disabled or breaks, tasks run in the
+    default thread pool instead so the event loop is never blocked.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        initializer: Optional[Callable[[], None]] = None,
+        latency_window: int = 256
+    ):
+        self.max_workers = max_workers or settings.MAX_WORKERS
+        self.initializer = initializer
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        # Metrics
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._latencies = deque(maxlen=latency_window)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ENABLE_INFERENCE_POOL and self.max_workers > 0
+
+    def start(self, warm_up: bool = True) -> None:
+        """Create the pool and optionally spawn every worker right away"""
+        if not self.enabled or self._pool is not None:
+            return
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer
+        )
+        logger.info(f"🧵 Inference pool started with {self.max_workers} worker(s)")
+
+        if warm_up:
+            # Workers spawn lazily on submit; one ping per worker preloads them all
+            for _ in range(self.max_workers):
+                self._pool.submit(_ping)
+
+    def shutdown(self) -> None:
+        """Stop the pool, cancelling queued tasks"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("Inference pool stopped")
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run ``fn(*args)`` in a worker process and await its result
+
+        ``fn`` must be a module-level function so it can be pickled.
+        """
+        loop = asyncio.get_running_loop()
+        if self.enabled and self._pool is None:
+            self.start(warm_up=False)
+
+        self._pending += 1
+        self._submitted += 1
+        start = time.perf_counter()
+        try:
+            pool = self._pool
+            if pool is not None:
+                try:
+                    result = await loop.run_in_executor(pool, fn, *args)
+                    self._completed += 1
+                    return result
+                except BrokenProcessPool:
+                    # Only the first task to notice a broken pool replaces it
+                    if self._pool is pool:
+                        logger.error("Inference pool broken, restarting it")
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        self._pool = None
+                        self.start(warm_up=False)
+            result = await loop.run_in_executor(None, fn, *args)
+            self._completed += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._latencies.append(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and per-task latency metrics"""
+        latencies = np.array(self._latencies, dtype=np.float64)
+        has_samples = latencies.size > 0
+        return {
+            "mode": "process_pool" if self._pool is not None else "thread",
+            "workers": self.max_workers if self._pool is not None else 0,
+            "pending": self._pending,
+            "queue_depth": max(0, self._pending - self.max_workers) if self._pool is not None else self._pending,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "latency_ms": {
+                "samples": int(latencies.size),
+                "avg": round(float(latencies.mean()) * 1000, 1) if has_samples else None,
+                "p50": round(float(np.percentile(latencies, 50)) * 1000, 1) if has_samples else None,
+                "p95": round(float(np.percentile(latencies, 95)) * 1000, 1) if has_samples else None,
+                "max": round(float(latencies.max()) * 1000, 1) if has_samples else None
+            }
+        }
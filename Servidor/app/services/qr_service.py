@@ -4,14 +4,19 @@ Generates QR codes and rotating verification codes for attendance
 """
 import secrets
 import hashlib
+import hmac
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, Any, Optional, List
 import base64
 import io
 import qrcode
 from qrcode.constants import ERROR_CORRECT_H
+from app.core.config import settings
 from app.core.logger import logger
-from app.db.supabase_client import get_supabase
+from app.core.cache import TTLCache
+from app.db.supabase_client import get_async_supabase
+from app.db.crud import get_class_session_crud
 
 # Ecuador timezone (UTC-5)
 ECUADOR_TZ = timezone(timedelta(hours=-5))
@@ -19,22 +24,98 @@ ECUADOR_TZ = timezone(timedelta(hours=-5))
 # Code rotation interval (in minutes)
 CODE_ROTATION_MINUTES = 2
 
+# Filas de qr_tokens por token: toda la clase escanea el mismo QR en segundos
+qr_token_cache = TTLCache(
+    ttl_seconds=settings.QR_TOKEN_CACHE_SECONDS,
+    max_entries=1024,
+    name="qr_tokens"
+)
+
+# Formato de los tokens firmados: "<payload base64url>.<HMAC base64url>"
+SIGNED_TOKEN_VERSION = "1"
+SIGNED_TOKEN_SIGNATURE_BYTES = 16
+
+
+@lru_cache(maxsize=None)
+def _signing_key(purpose: str) -> bytes:
+    """Per-purpose key derived from settings.SECRET_KEY"""
+    return hmac.new(settings.SECRET_KEY.encode(), purpose.encode(), hashlib.sha256).digest()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def is_signed_token(token: str) -> bool:
+    """Signed tokens carry a '.' separator; legacy random tokens are plain hex"""
+    return "." in token
+
+
+def sign_token(class_id: str, period_number: int, issued_at: int, expires_at: int) -> str:
+    """
+    Build a stateless QR token
+    
+    The payload (class_id, period, issue and expiry epoch seconds) is signed
+    with HMAC-SHA256 so the token can be validated without the qr_tokens table.
+    """
+    payload = f"{SIGNED_TOKEN_VERSION}|{class_id}|{period_number}|{issued_at}|{expires_at}".encode()
+    signature = hmac.new(_signing_key("qr-token"), payload, hashlib.sha256).digest()
+    return f"{_b64encode(payload)}.{_b64encode(signature[:SIGNED_TOKEN_SIGNATURE_BYTES])}"
+
+
+def verify_signed_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Check a signed token's HMAC (constant time) and decode its payload
+    
+    Returns:
+        class_id, period_number, issued_at and expires_at (epoch seconds),
+        or None if the token is malformed or the signature does not match.
+        Expiry is checked by the caller.
+    """
+    try:
+        payload_part, signature_part = token.split(".", 1)
+        payload = _b64decode(payload_part)
+        signature = _b64decode(signature_part)
+    except (ValueError, TypeError):
+        return None
+    
+    expected = hmac.new(_signing_key("qr-token"), payload, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected[:SIGNED_TOKEN_SIGNATURE_BYTES]):
+        return None
+    
+    try:
+        version, rest = payload.decode().split("|", 1)
+        class_id, period_number, issued_at, expires_at = rest.rsplit("|", 3)
+        if version != SIGNED_TOKEN_VERSION:
+            return None
+        return {
+            "class_id": class_id,
+            "period_number": int(period_number),
+            "issued_at": int(issued_at),
+            "expires_at": int(expires_at)
+        }
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 
 class RotatingCodeService:
     """Service for generating rotating verification codes"""
     
     def __init__(self):
-        self.client = get_supabase()
+        self.client = get_async_supabase()
     
     def _generate_code(self, class_id: str, time_slot: int) -> str:
         """
         Generate a deterministic 6-digit code based on class_id and time slot
         This ensures the same code is generated for the same time window
         """
-        # Use a secret key + class_id + time_slot to generate code
-        secret_key = "smart_classroom_2026"  # In production, use environment variable
-        data = f"{secret_key}:{class_id}:{time_slot}"
-        hash_value = hashlib.sha256(data.encode()).hexdigest()
+        # HMAC of class_id + time_slot with a key derived from SECRET_KEY
+        data = f"{class_id}:{time_slot}"
+        hash_value = hmac.new(_signing_key("rotating-code"), data.encode(), hashlib.sha256).hexdigest()
         # Take first 6 digits from hash (converted to numbers)
         code = str(int(hash_value[:8], 16) % 1000000).zfill(6)
         return code
@@ -87,9 +168,10 @@ class RotatingCodeService:
         # Previous code (grace period)
         previous_code = self._generate_code(class_id, time_slot - 1)
         
-        if submitted_code == current_code:
+        submitted_code = str(submitted_code)
+        if hmac.compare_digest(submitted_code, current_code):
             return {"valid": True, "message": "Código válido"}
-        elif submitted_code == previous_code:
+        elif hmac.compare_digest(submitted_code, previous_code):
             return {"valid": True, "message": "Código válido (período de gracia)"}
         else:
             return {"valid": False, "message": "Código inválido o expirado"}
@@ -99,11 +181,11 @@ class QRService:
     """Service for QR code generation and token management"""
     
     def __init__(self):
-        self.client = get_supabase()
+        self.client = get_async_supabase()
         self.code_service = RotatingCodeService()
     
     def _generate_token(self, class_id: str, period_number: int) -> str:
-        """Generate a unique token for a class period"""
+        """Generate a unique random token for a class period (legacy format, QR_SIGNED_TOKENS=False)"""
         random_bytes = secrets.token_bytes(16)
         timestamp = datetime.now(ECUADOR_TZ).isoformat()
         data = f"{class_id}:{period_number}:{timestamp}:{random_bytes.hex()}"
@@ -127,9 +209,6 @@ class QRService:
                     "message": f"Clase {class_id} no encontrada"
                 }
             
-            # Generate unique token
-            token = self._generate_token(class_id, period_number)
-            
             # Get current rotating code
             code_info = self.code_service.get_current_code(class_id)
             
@@ -139,7 +218,18 @@ class QRService:
             now = datetime.now(ECUADOR_TZ)
             expires_at = max(end_time, now + timedelta(hours=24))  # At least 24 hours validity
             
-            # Store token
+            # Generate unique token (signed tokens are validated without the database)
+            if settings.QR_SIGNED_TOKENS:
+                token = sign_token(
+                    class_id,
+                    period_number,
+                    issued_at=int(now.timestamp()),
+                    expires_at=int(expires_at.timestamp())
+                )
+            else:
+                token = self._generate_token(class_id, period_number)
+            
+            # Store token (signed tokens only for the record)
             await self._store_token(
                 token=token,
                 class_id=class_id,
@@ -200,12 +290,7 @@ class QRService:
     async def _get_class_info(self, class_id: str) -> Optional[Dict[str, Any]]:
         """Get class session info"""
         try:
-            response = self.client.table("class_sessions")\
-                .select("*")\
-                .eq("class_id", class_id)\
-                .execute()
-            
-            return response.data[0] if response.data else None
+            return await get_class_session_crud().get(class_id)
         except Exception as e:
             logger.error(f"Error getting class info: {str(e)}")
             return None
@@ -228,32 +313,67 @@ class QRService:
                 "created_at": datetime.now(ECUADOR_TZ).isoformat()
             }
             
-            self.client.table("qr_tokens").upsert(
+            await self.client.table("qr_tokens").upsert(
                 data,
                 on_conflict="token"
             ).execute()
+            if not is_signed_token(token):
+                qr_token_cache.set(token, data)
             
             return True
         except Exception as e:
             logger.error(f"Error storing token: {str(e)}")
             return False
     
+    async def _fetch_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Active qr_tokens row (errors propagate, so they are not cached)"""
+        response = await self.client.table("qr_tokens")\
+            .select("*")\
+            .eq("token", token)\
+            .eq("is_active", True)\
+            .execute()
+        return response.data[0] if response.data else None
+    
+    async def _get_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Token row through qr_token_cache (QR_TOKEN_CACHE_SECONDS, 0 = no cache)"""
+        if settings.QR_TOKEN_CACHE_SECONDS <= 0:
+            return await self._fetch_token(token)
+        return await qr_token_cache.get_or_load(token, lambda: self._fetch_token(token))
+    
+    def _verify_signed(self, token: str) -> Optional[Dict[str, Any]]:
+        """Signed token claims shaped like a qr_tokens row, None if the signature is invalid"""
+        claims = verify_signed_token(token)
+        if claims is None:
+            return None
+        return {
+            "class_id": claims["class_id"],
+            "period_number": claims["period_number"],
+            "expires_at": datetime.fromtimestamp(claims["expires_at"], ECUADOR_TZ).isoformat(),
+            "created_at": datetime.fromtimestamp(claims["issued_at"], ECUADOR_TZ).isoformat()
+        }
+    
     async def validate_token(self, token: str) -> Dict[str, Any]:
-        """Validate a QR token"""
+        """
+        Validate a QR token
+        
+        Signed tokens are checked with their HMAC alone; legacy tokens read
+        the qr_tokens row. Both, and the class info, go through in-memory
+        caches, so repeated validations of the same QR cost no queries.
+        Tokens are rejected once the class has ended (end_time of the class
+        session, which end_class moves up when a class is ended early).
+        """
         try:
-            response = self.client.table("qr_tokens")\
-                .select("*")\
-                .eq("token", token)\
-                .eq("is_active", True)\
-                .execute()
+            if is_signed_token(token):
+                token_data = self._verify_signed(token)
+            else:
+                token_data = await self._get_token(token)
             
-            if not response.data:
+            if not token_data:
                 return {
                     "valid": False,
                     "message": "Token inválido o expirado"
                 }
             
-            token_data = response.data[0]
             expires_at = datetime.fromisoformat(token_data['expires_at'].replace('Z', '+00:00'))
             now = datetime.now(ECUADOR_TZ)
             
@@ -265,6 +385,24 @@ class QRService:
             
             # Get class info
             class_info = await self._get_class_info(token_data['class_id'])
+            if not class_info:
+                # La clase se eliminó (el token en caché puede sobrevivirla hasta su TTL)
+                return {
+                    "valid": False,
+                    "message": "La clase de este código QR ya no existe"
+                }
+            
+            # El token dura al menos 24 h, pero no sirve después del fin de la clase
+            # (también si se terminó antes de tiempo: end_time pasa a ser esa hora)
+            if class_info.get('end_time'):
+                end_time = datetime.fromisoformat(class_info['end_time'].replace('Z', '+00:00'))
+                if end_time.tzinfo is None:
+                    end_time = end_time.replace(tzinfo=ECUADOR_TZ)
+                if now >= end_time:
+                    return {
+                        "valid": False,
+                        "message": "La clase de este código QR ya finalizó"
+                    }
             
             return {
                 "valid": True,
@@ -286,7 +424,7 @@ class ClassPeriodService:
     """Service for managing class periods/hours"""
     
     def __init__(self):
-        self.client = get_supabase()
+        self.client = get_async_supabase()
     
     def calculate_periods(
         self,
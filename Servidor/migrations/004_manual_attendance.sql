@@ -18,6 +18,7 @@ CREATE INDEX IF NOT EXISTS ix_attendance_period ON attendance(period);
 
 -- Create unique constraint to prevent duplicate attendance for same student/class/period
 -- Note: This may fail if duplicates already exist. Run cleanup first if needed.
+-- 005_attendance_upsert.sql removes duplicates and creates this index.
 -- CREATE UNIQUE INDEX IF NOT EXISTS ix_attendance_unique ON attendance(student_id, class_id, period);
 
 -- Comment: verification_method values: 'facial', 'qr', 'manual'
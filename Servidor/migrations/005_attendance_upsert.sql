@@ -0,0 +1,96 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Idempotent Attendance Upsert
+-- One attendance row per (student_id, class_id, period), written in one round trip
+-- ==============================================================================
+
+-- Requires 004_manual_attendance.sql (period, verification_method, updated_at)
+
+-- 1. Existing rows without period belong to period 1
+UPDATE attendance SET period = 1 WHERE period IS NULL;
+
+ALTER TABLE attendance ALTER COLUMN period SET DEFAULT 1;
+ALTER TABLE attendance ALTER COLUMN period SET NOT NULL;
+
+-- 2. Remove duplicates, keeping the first registration of each student/class/period
+DELETE FROM attendance a
+USING (
+    SELECT id,
+           ROW_NUMBER() OVER (
+               PARTITION BY student_id, class_id, period
+               ORDER BY timestamp ASC NULLS LAST, id ASC
+           ) AS rn
+    FROM attendance
+) d
+WHERE a.id = d.id
+  AND d.rn > 1;
+
+-- 3. Unique index (was commented out in 004 because of the duplicates above)
+CREATE UNIQUE INDEX IF NOT EXISTS ix_attendance_unique ON attendance(student_id, class_id, period);
+
+-- ==============================================================================
+-- RPC FUNCTION: upsert_attendance
+-- Insert attendance atomically; concurrent submissions are arbitrated by the
+-- unique index instead of a SELECT-then-INSERT race.
+--   p_overwrite = FALSE: keep the existing row (facial / QR verification)
+--   p_overwrite = TRUE:  update status of the existing row (manual attendance)
+-- Returns the row and whether it already existed.
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION upsert_attendance(
+    p_student_id VARCHAR(50),
+    p_class_id VARCHAR(100),
+    p_period INTEGER DEFAULT 1,
+    p_status VARCHAR(20) DEFAULT 'present',
+    p_confidence FLOAT DEFAULT NULL,
+    p_match_distance FLOAT DEFAULT NULL,
+    p_verification_method VARCHAR(20) DEFAULT 'facial',
+    p_overwrite BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    row_data JSONB,
+    already_registered BOOLEAN
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_record JSONB;
+    v_existed BOOLEAN;
+BEGIN
+    IF p_overwrite THEN
+        -- xmax = 0 only for freshly inserted tuples
+        INSERT INTO attendance (student_id, class_id, period, status, timestamp, confidence, match_distance, verification_method)
+        VALUES (p_student_id, p_class_id, p_period, p_status, NOW(), p_confidence, p_match_distance, p_verification_method)
+        ON CONFLICT (student_id, class_id, period) DO UPDATE
+            SET status = EXCLUDED.status,
+                verification_method = EXCLUDED.verification_method,
+                updated_at = NOW()
+        RETURNING to_jsonb(attendance.*), (attendance.xmax <> 0) INTO v_record, v_existed;
+
+        RETURN QUERY SELECT v_record, v_existed;
+        RETURN;
+    END IF;
+
+    INSERT INTO attendance (student_id, class_id, period, status, timestamp, confidence, match_distance, verification_method)
+    VALUES (p_student_id, p_class_id, p_period, p_status, NOW(), p_confidence, p_match_distance, p_verification_method)
+    ON CONFLICT (student_id, class_id, period) DO NOTHING
+    RETURNING to_jsonb(attendance.*) INTO v_record;
+
+    IF v_record IS NOT NULL THEN
+        RETURN QUERY SELECT v_record, FALSE;
+        RETURN;
+    END IF;
+
+    SELECT to_jsonb(a.*) INTO v_record
+    FROM attendance a
+    WHERE a.student_id = p_student_id
+      AND a.class_id = p_class_id
+      AND a.period = p_period;
+
+    RETURN QUERY SELECT v_record, TRUE;
+END;
+$$;
+
+-- GRANT EXECUTE ON FUNCTION upsert_attendance TO anon, authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
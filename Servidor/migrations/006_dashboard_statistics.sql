@@ -0,0 +1,42 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Dashboard Statistics RPC
+-- Counts computed in the database instead of downloading whole tables
+-- ==============================================================================
+
+-- ==============================================================================
+-- RPC FUNCTION: get_dashboard_statistics
+-- Returns only counts; rates are derived from them in the API
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION get_dashboard_statistics(
+    p_positive_emotions TEXT[]
+)
+RETURNS TABLE (
+    total_students BIGINT,
+    total_classes BIGINT,
+    active_classes BIGINT,
+    total_attendances BIGINT,
+    unique_attendances BIGINT,
+    total_emotions BIGINT,
+    positive_emotions BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*) FROM students),
+        (SELECT COUNT(*) FROM class_sessions),
+        (SELECT COUNT(*) FROM class_sessions WHERE end_time IS NULL),
+        (SELECT COUNT(*) FROM attendance),
+        (SELECT COUNT(*) FROM (SELECT DISTINCT student_id, class_id FROM attendance) u),
+        (SELECT COUNT(*) FROM emotion_events),
+        (SELECT COUNT(*) FROM emotion_events WHERE dominant_emotion = ANY(p_positive_emotions));
+$$;
+
+-- Supports the DISTINCT (student_id, class_id) count with an index-only scan
+CREATE INDEX IF NOT EXISTS ix_attendance_student_class ON attendance(student_id, class_id);
+
+-- GRANT EXECUTE ON FUNCTION get_dashboard_statistics TO anon, authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
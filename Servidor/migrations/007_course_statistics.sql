@@ -0,0 +1,73 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Course Statistics RPC
+-- Per-session attendance / emotion counts for a course in one query
+-- ==============================================================================
+
+-- course_id lives in class_sessions.metadata (no dedicated column)
+CREATE INDEX IF NOT EXISTS ix_class_sessions_course_id ON class_sessions ((metadata->>'course_id'));
+CREATE INDEX IF NOT EXISTS ix_emotion_events_class_id ON emotion_events(class_id);
+
+-- ==============================================================================
+-- RPC FUNCTION: get_course_session_statistics
+-- One row per class session of the course, counts grouped by class_id
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION get_course_session_statistics(
+    p_course_id TEXT,
+    p_positive_emotions TEXT[]
+)
+RETURNS TABLE (
+    class_id VARCHAR(100),
+    class_name VARCHAR(100),
+    start_time TIMESTAMP,
+    end_time TIMESTAMP,
+    total_attendances BIGINT,
+    present_count BIGINT,
+    late_count BIGINT,
+    total_emotions BIGINT,
+    positive_emotions BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH sessions AS (
+        SELECT cs.class_id, cs.class_name, cs.start_time, cs.end_time
+        FROM class_sessions cs
+        WHERE cs.metadata->>'course_id' = p_course_id
+    ),
+    att AS (
+        SELECT a.class_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE a.status = 'present') AS present,
+               COUNT(*) FILTER (WHERE a.status = 'late') AS late
+        FROM attendance a
+        WHERE a.class_id IN (SELECT s.class_id FROM sessions s)
+        GROUP BY a.class_id
+    ),
+    emo AS (
+        SELECT e.class_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE e.dominant_emotion = ANY(p_positive_emotions)) AS positive
+        FROM emotion_events e
+        WHERE e.class_id IN (SELECT s.class_id FROM sessions s)
+        GROUP BY e.class_id
+    )
+    SELECT s.class_id,
+           s.class_name,
+           s.start_time,
+           s.end_time,
+           COALESCE(att.total, 0),
+           COALESCE(att.present, 0),
+           COALESCE(att.late, 0),
+           COALESCE(emo.total, 0),
+           COALESCE(emo.positive, 0)
+    FROM sessions s
+    LEFT JOIN att ON att.class_id = s.class_id
+    LEFT JOIN emo ON emo.class_id = s.class_id
+    ORDER BY s.start_time;
+$$;
+
+-- GRANT EXECUTE ON FUNCTION get_course_session_statistics TO anon, authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
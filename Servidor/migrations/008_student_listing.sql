@@ -0,0 +1,22 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Student Roster Listing
+-- Keyset pagination on (enrolled_at, id) without transferring embeddings
+-- ==============================================================================
+
+-- Computed column: PostgREST exposes it as `has_embedding` in select lists
+-- (e.g. select=student_id,name,has_embedding), so the vector never leaves the DB
+CREATE OR REPLACE FUNCTION has_embedding(students)
+RETURNS BOOLEAN
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT $1.face_embedding IS NOT NULL;
+$$;
+
+-- Keyset cursor order
+CREATE INDEX IF NOT EXISTS ix_students_enrolled_at_id ON students(enrolled_at, id);
+CREATE INDEX IF NOT EXISTS ix_students_active_enrolled_at_id ON students(enrolled_at, id) WHERE is_active = TRUE;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
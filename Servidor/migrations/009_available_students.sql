@@ -0,0 +1,64 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Available Students RPC
+-- Active students not enrolled in a course (anti-join), with prefix search
+-- ==============================================================================
+
+-- NOT EXISTS probe per student
+CREATE INDEX IF NOT EXISTS ix_enrollments_course_student ON enrollments(course_id, student_id);
+
+-- Prefix search on name (case-insensitive) and on cédula
+CREATE INDEX IF NOT EXISTS ix_students_lower_name ON students (lower(name) text_pattern_ops) WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS ix_students_student_id_pattern ON students (student_id text_pattern_ops) WHERE is_active = TRUE;
+
+-- ==============================================================================
+-- RPC FUNCTION: get_available_students
+-- One page ordered by name; total_count is the number of matches before paging
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION get_available_students(
+    p_course_id UUID,
+    p_search TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 100,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    student_id TEXT,
+    name TEXT,
+    email TEXT,
+    photo_url TEXT,
+    total_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH prefix AS (
+        -- Escapar comodines de LIKE en el texto de búsqueda
+        SELECT replace(replace(replace(lower(trim(COALESCE(p_search, ''))), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+    )
+    SELECT s.student_id::TEXT,
+           s.name::TEXT,
+           s.email::TEXT,
+           s.photo_url::TEXT,
+           COUNT(*) OVER ()
+    FROM students s, prefix p
+    WHERE s.is_active = TRUE
+      AND NOT EXISTS (
+          SELECT 1
+          FROM enrollments e
+          WHERE e.course_id = p_course_id
+            AND e.student_id = s.student_id
+      )
+      AND (
+          p.pattern = '%'
+          OR lower(s.name) LIKE p.pattern
+          OR s.student_id LIKE p.pattern
+      )
+    ORDER BY s.name, s.student_id
+    LIMIT p_limit
+    OFFSET p_offset;
+$$;
+
+-- GRANT EXECUTE ON FUNCTION get_available_students TO anon, authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
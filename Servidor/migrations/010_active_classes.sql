@@ -0,0 +1,15 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Active Class Sessions
+-- Indexes for the time-window filter used by /classes/active
+--   start_time <= now AND (end_time IS NULL OR end_time > now)
+-- ==============================================================================
+
+-- Open-ended sessions (no end_time) that already started
+CREATE INDEX IF NOT EXISTS ix_class_sessions_open_start ON class_sessions(start_time) WHERE end_time IS NULL;
+
+-- Sessions still running: range scan on end_time, start_time checked from the index
+CREATE INDEX IF NOT EXISTS ix_class_sessions_end_start ON class_sessions(end_time, start_time);
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
@@ -0,0 +1,118 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Cascade Delete RPCs
+-- Delete classes / students and their dependent rows in one transaction
+-- ==============================================================================
+
+CREATE INDEX IF NOT EXISTS ix_emotion_events_student_id ON emotion_events(student_id);
+CREATE INDEX IF NOT EXISTS ix_enrollments_student_id ON enrollments(student_id);
+
+-- ==============================================================================
+-- RPC FUNCTION: delete_classes_cascade
+-- Deletes attendance, emotion events and QR tokens, then the class sessions.
+-- Returns how many rows were deleted from each table.
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION delete_classes_cascade(
+    p_class_ids TEXT[]
+)
+RETURNS TABLE (
+    classes_deleted BIGINT,
+    attendance_deleted BIGINT,
+    emotion_events_deleted BIGINT,
+    qr_tokens_deleted BIGINT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_classes BIGINT;
+    v_attendance BIGINT;
+    v_emotions BIGINT;
+    v_tokens BIGINT;
+BEGIN
+    DELETE FROM attendance WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_attendance = ROW_COUNT;
+
+    DELETE FROM emotion_events WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_emotions = ROW_COUNT;
+
+    DELETE FROM qr_tokens WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_tokens = ROW_COUNT;
+
+    DELETE FROM class_sessions WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_classes = ROW_COUNT;
+
+    RETURN QUERY SELECT v_classes, v_attendance, v_emotions, v_tokens;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION delete_class_cascade(
+    p_class_id TEXT
+)
+RETURNS TABLE (
+    classes_deleted BIGINT,
+    attendance_deleted BIGINT,
+    emotion_events_deleted BIGINT,
+    qr_tokens_deleted BIGINT
+)
+LANGUAGE sql
+AS $$
+    SELECT * FROM delete_classes_cascade(ARRAY[p_class_id]);
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: delete_students_cascade
+-- Deletes attendance, emotion events and enrollments, then the students.
+-- Returns how many rows were deleted from each table.
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION delete_students_cascade(
+    p_student_ids TEXT[]
+)
+RETURNS TABLE (
+    students_deleted BIGINT,
+    attendance_deleted BIGINT,
+    emotion_events_deleted BIGINT,
+    enrollments_deleted BIGINT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_students BIGINT;
+    v_attendance BIGINT;
+    v_emotions BIGINT;
+    v_enrollments BIGINT;
+BEGIN
+    DELETE FROM attendance WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_attendance = ROW_COUNT;
+
+    DELETE FROM emotion_events WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_emotions = ROW_COUNT;
+
+    DELETE FROM enrollments WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_enrollments = ROW_COUNT;
+
+    DELETE FROM students WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_students = ROW_COUNT;
+
+    RETURN QUERY SELECT v_students, v_attendance, v_emotions, v_enrollments;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION delete_student_cascade(
+    p_student_id TEXT
+)
+RETURNS TABLE (
+    students_deleted BIGINT,
+    attendance_deleted BIGINT,
+    emotion_events_deleted BIGINT,
+    enrollments_deleted BIGINT
+)
+LANGUAGE sql
+AS $$
+    SELECT * FROM delete_students_cascade(ARRAY[p_student_id]);
+$$;
+
+-- GRANT EXECUTE ON FUNCTION delete_classes_cascade, delete_class_cascade TO authenticated;
+-- GRANT EXECUTE ON FUNCTION delete_students_cascade, delete_student_cascade TO authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
@@ -0,0 +1,311 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Per-Minute Emotion Rollup
+-- (class_id, student_id, minute, emotion) -> event count and confidence sum,
+-- maintained on insert so summaries never scan raw emotion_events
+-- ==============================================================================
+
+-- ==============================================================================
+-- TABLE: emotion_minute_rollup
+-- ==============================================================================
+CREATE TABLE IF NOT EXISTS emotion_minute_rollup (
+    class_id VARCHAR(100) NOT NULL,
+    student_id VARCHAR(50) NOT NULL,
+    minute TIMESTAMP NOT NULL,
+    dominant_emotion VARCHAR(20) NOT NULL,
+    event_count INTEGER NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (class_id, student_id, minute, dominant_emotion)
+);
+
+-- Class timeline / summary (the primary key already serves per-student reads)
+CREATE INDEX IF NOT EXISTS ix_emotion_rollup_class_minute ON emotion_minute_rollup(class_id, minute);
+CREATE INDEX IF NOT EXISTS ix_emotion_rollup_student ON emotion_minute_rollup(student_id);
+
+-- ==============================================================================
+-- TRIGGER: one aggregated upsert per INSERT statement (batched inserts from the
+-- write-behind buffer touch each bucket once)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION emotion_rollup_on_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO emotion_minute_rollup (class_id, student_id, minute, dominant_emotion, event_count, confidence_sum)
+    SELECT n.class_id,
+           n.student_id,
+           date_trunc('minute', n.detected_at),
+           n.dominant_emotion,
+           COUNT(*),
+           COALESCE(SUM(n.confidence), 0)
+    FROM new_events n
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (class_id, student_id, minute, dominant_emotion) DO UPDATE
+        SET event_count = emotion_minute_rollup.event_count + EXCLUDED.event_count,
+            confidence_sum = emotion_minute_rollup.confidence_sum + EXCLUDED.confidence_sum;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_emotion_rollup_insert ON emotion_events;
+CREATE TRIGGER trg_emotion_rollup_insert
+    AFTER INSERT ON emotion_events
+    REFERENCING NEW TABLE AS new_events
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION emotion_rollup_on_insert();
+
+-- ==============================================================================
+-- COMPACTION: rebuild the rollup of one class (or all) from the raw events
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION rebuild_emotion_rollup(
+    p_class_id TEXT DEFAULT NULL
+)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rows BIGINT;
+BEGIN
+    DELETE FROM emotion_minute_rollup
+    WHERE p_class_id IS NULL OR class_id = p_class_id;
+
+    INSERT INTO emotion_minute_rollup (class_id, student_id, minute, dominant_emotion, event_count, confidence_sum)
+    SELECT e.class_id,
+           e.student_id,
+           date_trunc('minute', e.detected_at),
+           e.dominant_emotion,
+           COUNT(*),
+           COALESCE(SUM(e.confidence), 0)
+    FROM emotion_events e
+    WHERE p_class_id IS NULL OR e.class_id = p_class_id
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+    RETURN v_rows;
+END;
+$$;
+
+-- Backfill existing events
+SELECT rebuild_emotion_rollup();
+
+-- ==============================================================================
+-- RPC FUNCTION: get_class_emotion_summary
+-- Per-emotion totals of a class, optionally restricted to a time window
+-- (window edges are rounded to whole minutes)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION get_class_emotion_summary(
+    p_class_id TEXT,
+    p_start TIMESTAMP DEFAULT NULL,
+    p_end TIMESTAMP DEFAULT NULL
+)
+RETURNS TABLE (
+    dominant_emotion VARCHAR(20),
+    event_count BIGINT,
+    confidence_sum DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT r.dominant_emotion,
+           SUM(r.event_count)::BIGINT,
+           SUM(r.confidence_sum)
+    FROM emotion_minute_rollup r
+    WHERE r.class_id = p_class_id
+      AND (p_start IS NULL OR r.minute >= date_trunc('minute', p_start))
+      AND (p_end IS NULL OR r.minute <= p_end)
+    GROUP BY r.dominant_emotion
+    ORDER BY 2 DESC;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: get_emotion_timeline
+-- Per-minute, per-emotion counts of a class (or of one student in it)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION get_emotion_timeline(
+    p_class_id TEXT,
+    p_student_id TEXT DEFAULT NULL,
+    p_start TIMESTAMP DEFAULT NULL,
+    p_end TIMESTAMP DEFAULT NULL
+)
+RETURNS TABLE (
+    minute TIMESTAMP,
+    dominant_emotion VARCHAR(20),
+    event_count BIGINT,
+    confidence_sum DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT r.minute,
+           r.dominant_emotion,
+           SUM(r.event_count)::BIGINT,
+           SUM(r.confidence_sum)
+    FROM emotion_minute_rollup r
+    WHERE r.class_id = p_class_id
+      AND (p_student_id IS NULL OR r.student_id = p_student_id)
+      AND (p_start IS NULL OR r.minute >= date_trunc('minute', p_start))
+      AND (p_end IS NULL OR r.minute <= p_end)
+    GROUP BY r.minute, r.dominant_emotion
+    ORDER BY r.minute, r.dominant_emotion;
+$$;
+
+-- ==============================================================================
+-- Dashboard and course statistics read emotion counts from the rollup
+-- (replaces the versions from 006 / 007, same signatures)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION get_dashboard_statistics(
+    p_positive_emotions TEXT[]
+)
+RETURNS TABLE (
+    total_students BIGINT,
+    total_classes BIGINT,
+    active_classes BIGINT,
+    total_attendances BIGINT,
+    unique_attendances BIGINT,
+    total_emotions BIGINT,
+    positive_emotions BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*) FROM students),
+        (SELECT COUNT(*) FROM class_sessions),
+        (SELECT COUNT(*) FROM class_sessions WHERE end_time IS NULL),
+        (SELECT COUNT(*) FROM attendance),
+        (SELECT COUNT(*) FROM (SELECT DISTINCT student_id, class_id FROM attendance) u),
+        (SELECT COALESCE(SUM(event_count), 0)::BIGINT FROM emotion_minute_rollup),
+        (SELECT COALESCE(SUM(event_count), 0)::BIGINT FROM emotion_minute_rollup WHERE dominant_emotion = ANY(p_positive_emotions));
+$$;
+
+CREATE OR REPLACE FUNCTION get_course_session_statistics(
+    p_course_id TEXT,
+    p_positive_emotions TEXT[]
+)
+RETURNS TABLE (
+    class_id VARCHAR(100),
+    class_name VARCHAR(100),
+    start_time TIMESTAMP,
+    end_time TIMESTAMP,
+    total_attendances BIGINT,
+    present_count BIGINT,
+    late_count BIGINT,
+    total_emotions BIGINT,
+    positive_emotions BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH sessions AS (
+        SELECT cs.class_id, cs.class_name, cs.start_time, cs.end_time
+        FROM class_sessions cs
+        WHERE cs.metadata->>'course_id' = p_course_id
+    ),
+    att AS (
+        SELECT a.class_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE a.status = 'present') AS present,
+               COUNT(*) FILTER (WHERE a.status = 'late') AS late
+        FROM attendance a
+        WHERE a.class_id IN (SELECT s.class_id FROM sessions s)
+        GROUP BY a.class_id
+    ),
+    emo AS (
+        SELECT r.class_id,
+               SUM(r.event_count) AS total,
+               SUM(r.event_count) FILTER (WHERE r.dominant_emotion = ANY(p_positive_emotions)) AS positive
+        FROM emotion_minute_rollup r
+        WHERE r.class_id IN (SELECT s.class_id FROM sessions s)
+        GROUP BY r.class_id
+    )
+    SELECT s.class_id,
+           s.class_name,
+           s.start_time,
+           s.end_time,
+           COALESCE(att.total, 0),
+           COALESCE(att.present, 0),
+           COALESCE(att.late, 0),
+           COALESCE(emo.total, 0)::BIGINT,
+           COALESCE(emo.positive, 0)::BIGINT
+    FROM sessions s
+    LEFT JOIN att ON att.class_id = s.class_id
+    LEFT JOIN emo ON emo.class_id = s.class_id
+    ORDER BY s.start_time;
+$$;
+
+-- ==============================================================================
+-- Cascade deletes (011) also remove the rollup rows of the deleted classes/students
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION delete_classes_cascade(
+    p_class_ids TEXT[]
+)
+RETURNS TABLE (
+    classes_deleted BIGINT,
+    attendance_deleted BIGINT,
+    emotion_events_deleted BIGINT,
+    qr_tokens_deleted BIGINT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_classes BIGINT;
+    v_attendance BIGINT;
+    v_emotions BIGINT;
+    v_tokens BIGINT;
+BEGIN
+    DELETE FROM attendance WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_attendance = ROW_COUNT;
+
+    DELETE FROM emotion_events WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_emotions = ROW_COUNT;
+    DELETE FROM emotion_minute_rollup WHERE class_id = ANY(p_class_ids);
+
+    DELETE FROM qr_tokens WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_tokens = ROW_COUNT;
+
+    DELETE FROM class_sessions WHERE class_id = ANY(p_class_ids);
+    GET DIAGNOSTICS v_classes = ROW_COUNT;
+
+    RETURN QUERY SELECT v_classes, v_attendance, v_emotions, v_tokens;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION delete_students_cascade(
+    p_student_ids TEXT[]
+)
+RETURNS TABLE (
+    students_deleted BIGINT,
+    attendance_deleted BIGINT,
+    emotion_events_deleted BIGINT,
+    enrollments_deleted BIGINT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_students BIGINT;
+    v_attendance BIGINT;
+    v_emotions BIGINT;
+    v_enrollments BIGINT;
+BEGIN
+    DELETE FROM attendance WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_attendance = ROW_COUNT;
+
+    DELETE FROM emotion_events WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_emotions = ROW_COUNT;
+    DELETE FROM emotion_minute_rollup WHERE student_id = ANY(p_student_ids);
+
+    DELETE FROM enrollments WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_enrollments = ROW_COUNT;
+
+    DELETE FROM students WHERE student_id = ANY(p_student_ids);
+    GET DIAGNOSTICS v_students = ROW_COUNT;
+
+    RETURN QUERY SELECT v_students, v_attendance, v_emotions, v_enrollments;
+END;
+$$;
+
+-- GRANT EXECUTE ON FUNCTION get_class_emotion_summary, get_emotion_timeline TO anon, authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
@@ -0,0 +1,51 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Compact Emotion Scores
+-- emotion_events.emotion_scores: JSON text -> SMALLINT[7] in a fixed order
+-- (angry, disgust, fear, happy, sad, surprise, neutral), each score stored in
+-- hundredths of a percent (0-10000). ~14 bytes of payload instead of ~150.
+-- ==============================================================================
+
+-- Converts one legacy JSON value; malformed rows become NULL instead of
+-- aborting the whole ALTER
+CREATE OR REPLACE FUNCTION emotion_scores_json_to_array(p_scores TEXT)
+RETURNS SMALLINT[]
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+    v_json JSONB;
+BEGIN
+    IF p_scores IS NULL OR btrim(p_scores) = '' THEN
+        RETURN NULL;
+    END IF;
+    v_json := p_scores::JSONB;
+    IF jsonb_typeof(v_json) <> 'object' THEN
+        RETURN NULL;
+    END IF;
+    RETURN ARRAY(
+        SELECT LEAST(GREATEST(round(COALESCE((v_json->>k)::NUMERIC, 0) * 100), 0), 10000)::SMALLINT
+        FROM unnest(ARRAY['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']) WITH ORDINALITY AS o(k, i)
+        ORDER BY o.i
+    );
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$;
+
+-- Rewrites the table once; existing rows are converted in place
+ALTER TABLE emotion_events
+    ALTER COLUMN emotion_scores TYPE SMALLINT[]
+    USING emotion_scores_json_to_array(emotion_scores);
+
+ALTER TABLE emotion_events
+    DROP CONSTRAINT IF EXISTS emotion_scores_size_check;
+ALTER TABLE emotion_events
+    ADD CONSTRAINT emotion_scores_size_check CHECK (
+        emotion_scores IS NULL OR cardinality(emotion_scores) = 7
+    );
+
+DROP FUNCTION emotion_scores_json_to_array(TEXT);
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
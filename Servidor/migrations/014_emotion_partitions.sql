@@ -0,0 +1,172 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Monthly Partitions for emotion_events
+-- Range partitioning on detected_at: hot queries only touch the current
+-- months and old months are dropped whole (after archiving) instead of
+-- being DELETEd row by row, so index sizes stay flat semester over semester
+-- ==============================================================================
+
+-- ==============================================================================
+-- FUNCTION: ensure_emotion_partitions
+-- Creates the monthly partitions from p_from's month up to p_months_ahead
+-- months after the current one (idempotent, run by the maintenance task)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION ensure_emotion_partitions(
+    p_months_ahead INTEGER DEFAULT 2,
+    p_from TIMESTAMP DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', COALESCE(p_from, NOW()::TIMESTAMP));
+    v_last TIMESTAMP := date_trunc('month', NOW()::TIMESTAMP) + make_interval(months => p_months_ahead);
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        v_name := 'emotion_events_p' || to_char(v_month, 'YYYYMM');
+        IF to_regclass(v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF emotion_events FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, v_month + INTERVAL '1 month'
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+-- ==============================================================================
+-- MIGRATION: copy the existing rows into the partitioned table
+-- (indexes and the rollup trigger are added after the bulk copy; the rollup
+-- already holds these rows)
+-- ==============================================================================
+ALTER TABLE emotion_events RENAME TO emotion_events_unpartitioned;
+
+CREATE TABLE emotion_events (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    student_id VARCHAR(50) NOT NULL REFERENCES students(student_id) ON DELETE CASCADE,
+    class_id VARCHAR(100) NOT NULL,
+    dominant_emotion VARCHAR(20) NOT NULL,
+    confidence FLOAT NOT NULL,
+    emotion_scores SMALLINT[],
+    detected_at TIMESTAMP DEFAULT NOW() NOT NULL,
+
+    CONSTRAINT emotion_type_check CHECK (
+        dominant_emotion IN ('happy', 'sad', 'angry', 'fear', 'surprise', 'neutral', 'disgust', 'bored', 'sleepy', 'attentive')
+    ),
+    CONSTRAINT emotion_scores_size_check CHECK (
+        emotion_scores IS NULL OR cardinality(emotion_scores) = 7
+    )
+) PARTITION BY RANGE (detected_at);
+
+SELECT ensure_emotion_partitions(
+    2,
+    (SELECT MIN(detected_at) FROM emotion_events_unpartitioned)
+);
+
+INSERT INTO emotion_events (id, student_id, class_id, dominant_emotion, confidence, emotion_scores, detected_at)
+SELECT id, student_id, class_id, dominant_emotion, confidence, emotion_scores, detected_at
+FROM emotion_events_unpartitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('emotion_events', 'id'),
+    COALESCE((SELECT MAX(id) FROM emotion_events), 0) + 1,
+    false
+);
+
+DROP TABLE emotion_events_unpartitioned;
+
+-- La clave primaria de una tabla particionada debe incluir la columna de partición
+ALTER TABLE emotion_events ADD PRIMARY KEY (id, detected_at);
+
+-- Partitioned indexes (created on every current and future partition)
+CREATE INDEX IF NOT EXISTS ix_emotion_class_timestamp ON emotion_events(class_id, detected_at);
+CREATE INDEX IF NOT EXISTS ix_emotion_student_class ON emotion_events(student_id, class_id);
+
+-- Rollup trigger from 012 (transition tables are allowed on the partitioned root)
+DROP TRIGGER IF EXISTS trg_emotion_rollup_insert ON emotion_events;
+CREATE TRIGGER trg_emotion_rollup_insert
+    AFTER INSERT ON emotion_events
+    REFERENCING NEW TABLE AS new_events
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION emotion_rollup_on_insert();
+
+-- ==============================================================================
+-- RPC FUNCTION: list_emotion_partitions
+-- Partitions of emotion_events with their month range, oldest first
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION list_emotion_partitions()
+RETURNS TABLE (
+    partition_name TEXT,
+    range_start TIMESTAMP,
+    range_end TIMESTAMP,
+    estimated_rows BIGINT,
+    total_bytes BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT c.relname::TEXT,
+           (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::TIMESTAMP,
+           (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::TIMESTAMP,
+           GREATEST(c.reltuples, 0)::BIGINT,
+           pg_total_relation_size(c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'emotion_events'::regclass
+    ORDER BY 2;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: drop_emotion_partition
+-- Re-summarizes the partition's month into emotion_minute_rollup, then
+-- detaches and drops it. Called after the raw rows have been archived.
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION drop_emotion_partition(
+    p_partition_name TEXT
+)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_start TIMESTAMP;
+    v_end TIMESTAMP;
+    v_rows BIGINT;
+BEGIN
+    SELECT p.range_start, p.range_end
+    INTO v_start, v_end
+    FROM list_emotion_partitions() p
+    WHERE p.partition_name = p_partition_name;
+
+    IF v_start IS NULL THEN
+        RAISE EXCEPTION 'Unknown emotion_events partition: %', p_partition_name;
+    END IF;
+
+    -- The rollup must stay the source of truth once the raw rows are gone
+    DELETE FROM emotion_minute_rollup
+    WHERE minute >= v_start AND minute < v_end;
+
+    EXECUTE format(
+        'INSERT INTO emotion_minute_rollup (class_id, student_id, minute, dominant_emotion, event_count, confidence_sum)
+         SELECT class_id, student_id, date_trunc(''minute'', detected_at), dominant_emotion, COUNT(*), COALESCE(SUM(confidence), 0)
+         FROM %I
+         GROUP BY 1, 2, 3, 4',
+        p_partition_name
+    );
+
+    EXECUTE format('SELECT COUNT(*) FROM %I', p_partition_name) INTO v_rows;
+    EXECUTE format('ALTER TABLE emotion_events DETACH PARTITION %I', p_partition_name);
+    EXECUTE format('DROP TABLE %I', p_partition_name);
+
+    RETURN v_rows;
+END;
+$$;
+
+-- GRANT EXECUTE ON FUNCTION ensure_emotion_partitions, list_emotion_partitions, drop_emotion_partition TO service_role;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
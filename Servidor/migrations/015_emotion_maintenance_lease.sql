@@ -0,0 +1,59 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Emotion Maintenance Lease
+-- Every API instance runs the emotion maintenance task; only the holder of
+-- this lease archives and drops old partitions
+-- ==============================================================================
+
+-- ==============================================================================
+-- TABLE: emotion_maintenance_lease (a single row)
+-- ==============================================================================
+CREATE TABLE IF NOT EXISTS emotion_maintenance_lease (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    holder TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- ==============================================================================
+-- RPC FUNCTION: acquire_emotion_maintenance_lease
+-- Takes or renews the lease; TRUE if p_holder holds it for the next p_seconds
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION acquire_emotion_maintenance_lease(
+    p_holder TEXT,
+    p_seconds INTEGER DEFAULT 3600
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_holder TEXT;
+BEGIN
+    INSERT INTO emotion_maintenance_lease (id, holder, expires_at)
+    VALUES (TRUE, p_holder, NOW() + make_interval(secs => p_seconds))
+    ON CONFLICT (id) DO UPDATE
+        SET holder = EXCLUDED.holder,
+            expires_at = EXCLUDED.expires_at
+        WHERE emotion_maintenance_lease.holder = EXCLUDED.holder
+           OR emotion_maintenance_lease.expires_at < NOW()
+    RETURNING holder INTO v_holder;
+
+    RETURN v_holder IS NOT NULL;
+END;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: release_emotion_maintenance_lease
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION release_emotion_maintenance_lease(
+    p_holder TEXT
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    DELETE FROM emotion_maintenance_lease WHERE holder = p_holder;
+$$;
+
+-- GRANT EXECUTE ON FUNCTION acquire_emotion_maintenance_lease, release_emotion_maintenance_lease TO service_role;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
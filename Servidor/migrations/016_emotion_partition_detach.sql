@@ -0,0 +1,253 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Safer emotion_events Partition Maintenance
+-- 1. A DEFAULT partition catches rows of months without a partition, so
+--    inserts never fail if the maintenance task stops running
+-- 2. Old months are detached first and archived from the detached table;
+--    rows can no longer arrive between the archive and the DROP
+-- ==============================================================================
+
+-- ==============================================================================
+-- DEFAULT PARTITION
+-- ==============================================================================
+CREATE TABLE IF NOT EXISTS emotion_events_default PARTITION OF emotion_events DEFAULT;
+
+-- ==============================================================================
+-- FUNCTION: ensure_emotion_partitions (replaces 014)
+-- Also creates the months that have rows in the DEFAULT partition, moving
+-- those rows into their new partition. They are inserted into the partition
+-- directly, so the rollup trigger on emotion_events does not count them twice.
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION ensure_emotion_partitions(
+    p_months_ahead INTEGER DEFAULT 2,
+    p_from TIMESTAMP DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', LEAST(
+        COALESCE(p_from, NOW()::TIMESTAMP),
+        COALESCE((SELECT MIN(detected_at) FROM emotion_events_default), NOW()::TIMESTAMP)
+    ));
+    v_last TIMESTAMP := date_trunc('month', NOW()::TIMESTAMP) + make_interval(months => p_months_ahead);
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        v_name := 'emotion_events_p' || to_char(v_month, 'YYYYMM');
+        IF to_regclass(v_name) IS NULL THEN
+            IF EXISTS (
+                SELECT 1 FROM emotion_events_default
+                WHERE detected_at >= v_month AND detected_at < v_month + INTERVAL '1 month'
+            ) THEN
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE emotion_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                    v_name
+                );
+                EXECUTE format(
+                    'WITH moved AS (
+                         DELETE FROM emotion_events_default
+                         WHERE detected_at >= %L AND detected_at < %L
+                         RETURNING id, student_id, class_id, dominant_emotion, confidence, emotion_scores, detected_at
+                     )
+                     INSERT INTO %I (id, student_id, class_id, dominant_emotion, confidence, emotion_scores, detected_at)
+                     SELECT * FROM moved',
+                    v_month, v_month + INTERVAL '1 month', v_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE emotion_events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    v_name, v_month, v_month + INTERVAL '1 month'
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF emotion_events FOR VALUES FROM (%L) TO (%L)',
+                    v_name, v_month, v_month + INTERVAL '1 month'
+                );
+            END IF;
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: list_emotion_partitions (replaces 014, skips DEFAULT)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION list_emotion_partitions()
+RETURNS TABLE (
+    partition_name TEXT,
+    range_start TIMESTAMP,
+    range_end TIMESTAMP,
+    estimated_rows BIGINT,
+    total_bytes BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT c.relname::TEXT,
+           (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::TIMESTAMP,
+           (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::TIMESTAMP,
+           GREATEST(c.reltuples, 0)::BIGINT,
+           pg_total_relation_size(c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'emotion_events'::regclass
+      AND pg_get_expr(c.relpartbound, c.oid) <> 'DEFAULT'
+    ORDER BY 2;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: detach_emotion_partition
+-- Re-summarizes the month into emotion_minute_rollup, then detaches the
+-- partition and renames it emotion_events_detached_pYYYYMM. Returns the new
+-- name, or NULL if the partition is no longer attached.
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION detach_emotion_partition(
+    p_partition_name TEXT
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_start TIMESTAMP;
+    v_end TIMESTAMP;
+    v_detached TEXT := replace(p_partition_name, 'emotion_events_p', 'emotion_events_detached_p');
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('emotion_events_partitions'));
+
+    SELECT p.range_start, p.range_end
+    INTO v_start, v_end
+    FROM list_emotion_partitions() p
+    WHERE p.partition_name = p_partition_name;
+
+    IF v_start IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- Bloquea inserciones en el mes mientras se reconstruye el rollup
+    EXECUTE format('LOCK TABLE %I IN SHARE MODE', p_partition_name);
+
+    -- The rollup must stay the source of truth once the raw rows are gone
+    DELETE FROM emotion_minute_rollup
+    WHERE minute >= v_start AND minute < v_end;
+
+    EXECUTE format(
+        'INSERT INTO emotion_minute_rollup (class_id, student_id, minute, dominant_emotion, event_count, confidence_sum)
+         SELECT class_id, student_id, date_trunc(''minute'', detected_at), dominant_emotion, COUNT(*), COALESCE(SUM(confidence), 0)
+         FROM %I
+         GROUP BY 1, 2, 3, 4',
+        p_partition_name
+    );
+
+    EXECUTE format('ALTER TABLE emotion_events DETACH PARTITION %I', p_partition_name);
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', p_partition_name, v_detached);
+
+    RETURN v_detached;
+END;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: list_detached_emotion_partitions
+-- Detached months waiting to be archived (also the ones left by an
+-- interrupted run), with their exact row count
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION list_detached_emotion_partitions()
+RETURNS TABLE (
+    table_name TEXT,
+    row_count BIGINT
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOR v_table IN
+        SELECT c.relname::TEXT
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relkind = 'r'
+          AND c.relname ~ '^emotion_events_detached_p[0-9]{6}$'
+        ORDER BY c.relname
+    LOOP
+        table_name := v_table;
+        EXECUTE format('SELECT COUNT(*) FROM %I', v_table) INTO row_count;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: read_detached_emotion_rows
+-- One page of a detached month in id order (keyset pagination)
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION read_detached_emotion_rows(
+    p_table_name TEXT,
+    p_after_id BIGINT DEFAULT 0,
+    p_limit INTEGER DEFAULT 1000
+)
+RETURNS SETOF emotion_events
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+    IF p_table_name !~ '^emotion_events_detached_p[0-9]{6}$' THEN
+        RAISE EXCEPTION 'Not a detached emotion_events partition: %', p_table_name;
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT id, student_id, class_id, dominant_emotion, confidence, emotion_scores, detected_at
+         FROM %I
+         WHERE id > $1
+         ORDER BY id
+         LIMIT $2',
+        p_table_name
+    ) USING p_after_id, p_limit;
+END;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: drop_detached_emotion_partition
+-- Drops a detached month only if it still has the archived row count
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION drop_detached_emotion_partition(
+    p_table_name TEXT,
+    p_expected_rows BIGINT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rows BIGINT;
+BEGIN
+    IF p_table_name !~ '^emotion_events_detached_p[0-9]{6}$' THEN
+        RAISE EXCEPTION 'Not a detached emotion_events partition: %', p_table_name;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('emotion_events_partitions'));
+
+    IF to_regclass(p_table_name) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('SELECT COUNT(*) FROM %I', p_table_name) INTO v_rows;
+    IF v_rows <> p_expected_rows THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('DROP TABLE %I', p_table_name);
+    RETURN TRUE;
+END;
+$$;
+
+-- Replaced by detach_emotion_partition + drop_detached_emotion_partition
+DROP FUNCTION IF EXISTS drop_emotion_partition(TEXT);
+
+-- GRANT EXECUTE ON FUNCTION detach_emotion_partition, list_detached_emotion_partitions, read_detached_emotion_rows, drop_detached_emotion_partition TO service_role;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
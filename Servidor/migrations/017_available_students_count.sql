@@ -0,0 +1,92 @@
+-- ==============================================================================
+-- SMART CLASSROOM AI - Available Students Count
+-- Number of matches of get_available_students (009), independent of the page
+-- requested, so the total stays right when the offset is past the last row.
+-- get_available_students no longer returns total_count: the COUNT(*) OVER ()
+-- window built every match before LIMIT/OFFSET on each page
+-- ==============================================================================
+
+-- ==============================================================================
+-- RPC FUNCTION: get_available_students (replaces 009, without total_count)
+-- One page ordered by name
+-- ==============================================================================
+-- El tipo de retorno cambia: CREATE OR REPLACE no basta
+DROP FUNCTION IF EXISTS get_available_students(UUID, TEXT, INTEGER, INTEGER);
+
+CREATE FUNCTION get_available_students(
+    p_course_id UUID,
+    p_search TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 100,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    student_id TEXT,
+    name TEXT,
+    email TEXT,
+    photo_url TEXT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH prefix AS (
+        -- Escapar comodines de LIKE en el texto de búsqueda
+        SELECT replace(replace(replace(lower(trim(COALESCE(p_search, ''))), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+    )
+    SELECT s.student_id::TEXT,
+           s.name::TEXT,
+           s.email::TEXT,
+           s.photo_url::TEXT
+    FROM students s, prefix p
+    WHERE s.is_active = TRUE
+      AND NOT EXISTS (
+          SELECT 1
+          FROM enrollments e
+          WHERE e.course_id = p_course_id
+            AND e.student_id = s.student_id
+      )
+      AND (
+          p.pattern = '%'
+          OR lower(s.name) LIKE p.pattern
+          OR s.student_id LIKE p.pattern
+      )
+    ORDER BY s.name, s.student_id
+    LIMIT p_limit
+    OFFSET p_offset;
+$$;
+
+-- ==============================================================================
+-- RPC FUNCTION: count_available_students
+-- ==============================================================================
+CREATE OR REPLACE FUNCTION count_available_students(
+    p_course_id UUID,
+    p_search TEXT DEFAULT NULL
+)
+RETURNS BIGINT
+LANGUAGE sql
+STABLE
+AS $$
+    WITH prefix AS (
+        -- Escapar comodines de LIKE en el texto de búsqueda
+        SELECT replace(replace(replace(lower(trim(COALESCE(p_search, ''))), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+    )
+    SELECT COUNT(*)
+    FROM students s, prefix p
+    WHERE s.is_active = TRUE
+      AND NOT EXISTS (
+          SELECT 1
+          FROM enrollments e
+          WHERE e.course_id = p_course_id
+            AND e.student_id = s.student_id
+      )
+      AND (
+          p.pattern = '%'
+          OR lower(s.name) LIKE p.pattern
+          OR s.student_id LIKE p.pattern
+      );
+$$;
+
+-- GRANT EXECUTE ON FUNCTION get_available_students, count_available_students TO anon, authenticated;
+
+-- ==============================================================================
+-- RUN THIS IN SUPABASE SQL EDITOR
+-- ==============================================================================
@@ -0,0 +1,154 @@
+"""
+Smart Classroom AI - /qr/verify-code Burst Load Test
+Simulates a whole class checking in with the rotating code within a few
+seconds and reports latency percentiles
+
+Uso (con el servidor corriendo):
+    python scripts/loadtest_verify_code.py --class-id MAT101-20260316 --course-id <uuid>
+    python scripts/loadtest_verify_code.py --class-id MAT101-20260316 --cedulas cedulas.txt --window 30
+
+The QR token is generated through /qr/generate unless --token is given, and
+the current code is read from /qr/code/{class_id}. Part of the students
+submit twice (--repeat) to exercise the already-registered path.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import httpx
+import numpy as np
+
+
+async def _fetch_course_cedulas(client: httpx.AsyncClient, course_id: str) -> List[str]:
+    response = await client.get(f"/enrollments/course/{course_id}")
+    response.raise_for_status()
+    return [student["student_id"] for student in response.json()["data"]["students"]]
+
+
+async def _generate_token(client: httpx.AsyncClient, class_id: str, period: int) -> str:
+    response = await client.post("/qr/generate", json={"class_id": class_id, "period_number": period})
+    response.raise_for_status()
+    return response.json()["data"]["token"]
+
+
+async def _current_code(client: httpx.AsyncClient, class_id: str) -> str:
+    response = await client.get(f"/qr/code/{class_id}")
+    response.raise_for_status()
+    return response.json()["data"]["code"]
+
+
+async def _submit(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    delay: float,
+    payload: Dict[str, str],
+    repeat: bool
+) -> Dict[str, Any]:
+    """One student's check-in at ``delay`` seconds into the burst"""
+    await asyncio.sleep(delay)
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/qr/verify-code", json=payload)
+            latency = time.perf_counter() - start
+            body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            if response.status_code != 200:
+                outcome = f"http_{response.status_code}"
+            elif body.get("already_registered"):
+                outcome = "already_registered"
+            else:
+                outcome = "registered"
+        except httpx.HTTPError as e:
+            latency = time.perf_counter() - start
+            outcome = type(e).__name__
+    return {"latency": latency, "outcome": outcome, "repeat": repeat}
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 / max in milliseconds"""
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    values = np.array(latencies, dtype=np.float64) * 1000
+    return {
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "p99": round(float(np.percentile(values, 99)), 1),
+        "max": round(float(values.max()), 1)
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        if args.cedulas:
+            with open(args.cedulas, encoding="utf-8") as f:
+                cedulas = [line.strip() for line in f if line.strip()]
+        elif args.course_id:
+            cedulas = await _fetch_course_cedulas(client, args.course_id)
+        else:
+            raise SystemExit("Provide --cedulas or --course-id")
+        if args.students:
+            cedulas = cedulas[:args.students]
+        if not cedulas:
+            raise SystemExit("No students to simulate")
+
+        token = args.token or await _generate_token(client, args.class_id, args.period)
+        code = await _current_code(client, args.class_id)
+
+        rng = random.Random(args.seed)
+        submissions = [(cedula, False) for cedula in cedulas]
+        submissions += [(cedula, True) for cedula in rng.sample(cedulas, int(len(cedulas) * args.repeat))]
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        print(
+            f"Burst: {len(submissions)} submissions ({len(cedulas)} students, "
+            f"{len(submissions) - len(cedulas)} repeats) over {args.window}s against {args.base_url}"
+        )
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            _submit(
+                client,
+                semaphore,
+                rng.uniform(0, args.window) if not repeat else rng.uniform(args.window / 2, args.window),
+                {"token": token, "cedula": cedula, "code": code},
+                repeat
+            )
+            for cedula, repeat in submissions
+        ])
+        elapsed = time.perf_counter() - start
+
+    outcomes = Counter(result["outcome"] for result in results)
+    print(f"\nCompleted in {elapsed:.1f}s")
+    print("Outcomes: " + ", ".join(f"{name}={count}" for name, count in outcomes.most_common()))
+    print("\nLatency (ms)        p50      p95      p99      max")
+    for label, subset in (
+        ("all", results),
+        ("first submission", [r for r in results if not r["repeat"]]),
+        ("repeat", [r for r in results if r["repeat"]])
+    ):
+        stats = _percentiles([r["latency"] for r in subset])
+        if stats["p50"] is None:
+            continue
+        print(f"{label:<17} {stats['p50']:>8} {stats['p95']:>8} {stats['p99']:>8} {stats['max']:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Burst load test for POST /qr/verify-code")
+    parser.add_argument("--base-url", default="http://localhost:8080/api/v1")
+    parser.add_argument("--class-id", required=True, help="class_sessions.class_id of a live class")
+    parser.add_argument("--course-id", help="Simulate the students enrolled in this course")
+    parser.add_argument("--cedulas", help="File with one student cédula per line")
+    parser.add_argument("--students", type=int, default=0, help="Limit the number of students (0 = all)")
+    parser.add_argument("--token", help="Existing QR token (default: generate one)")
+    parser.add_argument("--period", type=int, default=1)
+    parser.add_argument("--window", type=float, default=30.0, help="Seconds over which the class submits")
+    parser.add_argument("--repeat", type=float, default=0.2, help="Fraction of students that submit twice")
+    parser.add_argument("--concurrency", type=int, default=100, help="Max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=2026)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()